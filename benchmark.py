@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Title: Xip2exe Benchmarks
+Times SFX builds and extraction on synthetic payloads and writes the results
+as JSON, so runs can be compared across commits.
+
+Runs headless. Builds need PyInstaller and are skipped without it; extraction
+drives the generated extractor's code directly, so it also runs on Linux.
+
+Usage: python benchmark.py [--scale 0.1] [--output results.json] [--skip-build]
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import zipfile
+import platform
+import tempfile
+import argparse
+import subprocess
+import importlib.util
+
+import main
+
+# name -> (description, generator); generators take (directory, scale, rng)
+PAYLOADS = {}
+
+def payload(name, description):
+    def register(func):
+        PAYLOADS[name] = (description, func)
+        return func
+    return register
+
+def compressible_bytes(rng, size):
+    """Text-like data that deflates roughly 3:1"""
+    words = [bytes(rng.choice(b'abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 10)))
+             for _ in range(512)]
+    block = b' '.join(rng.choice(words) for _ in range(16 * 1024))
+    return (block * (size // len(block) + 1))[:size]
+
+@payload('tiny_files', "many files of 0.5-2 KB")
+def make_tiny_files(directory, scale, rng):
+    data = compressible_bytes(rng, 64 * 1024)
+    for i in range(max(int(20000 * scale), 1)):
+        folder = os.path.join(directory, f"dir{i % 100:03d}")
+        os.makedirs(folder, exist_ok=True)
+        offset = rng.randrange(0, len(data) - 2048)
+        with open(os.path.join(folder, f"file{i:05d}.txt"), 'wb') as f:
+            f.write(data[offset:offset + rng.randint(512, 2048)])
+
+@payload('huge_files', "a few large compressible files")
+def make_huge_files(directory, scale, rng):
+    size = max(int(128 * 1024 * 1024 * scale), 1024 * 1024)
+    data = compressible_bytes(rng, 4 * 1024 * 1024)
+    for i in range(3):
+        with open(os.path.join(directory, f"huge{i}.bin"), 'wb') as f:
+            for offset in range(0, size, len(data)):
+                f.write(data[:min(len(data), size - offset)])
+
+@payload('incompressible', "random data that doesn't compress")
+def make_incompressible(directory, scale, rng):
+    size = max(int(32 * 1024 * 1024 * scale), 256 * 1024)
+    for i in range(4):
+        with open(os.path.join(directory, f"random{i}.bin"), 'wb') as f:
+            f.write(rng.randbytes(size))
+
+@payload('deep_tree', "small files in deeply nested folders")
+def make_deep_tree(directory, scale, rng):
+    data = compressible_bytes(rng, 64 * 1024)
+    for branch in range(max(int(100 * scale), 1)):
+        path = os.path.join(directory, f"branch{branch:03d}")
+        for depth in range(24):
+            path = os.path.join(path, f"level{depth:02d}")
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, "data.txt"), 'wb') as f:
+                f.write(data[:rng.randint(256, 8192)])
+
+def zip_directory(directory, zip_path):
+    """Deflate every file under directory into zip_path; returns (files, uncompressed bytes)"""
+    files = total = 0
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        for root, _, names in os.walk(directory):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                zf.write(path, os.path.relpath(path, directory))
+                files += 1
+                total += os.path.getsize(path)
+    return files, total
+
+def load_extractor(work_dir):
+    """Import the script the builder would compile, as a module"""
+    script_path = os.path.join(work_dir, "extractor.py")
+    with open(script_path, 'w', encoding='utf-8') as f:
+        f.write(main.SFXBuilder({})._generate_extractor_script())
+    spec = importlib.util.spec_from_file_location("xip2exe_extractor", script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench_extract(extractor, zip_path, work_dir, files, total_bytes, workers):
+    """Append the payload to a dummy stub and unpack it with the extractor's own code.
+
+    Times a full extraction and an incremental re-run over the result.
+    """
+    stub_path = os.path.join(work_dir, "stub.bin")
+    with open(stub_path, 'wb') as f:
+        f.write(b'\0' * 4096)
+    sfx_path = os.path.join(work_dir, "sfx.exe")
+    main.SFXBuilder({}, status_callback=lambda text, percent: None)._assemble_from_stub(
+        stub_path, zip_path, {}, sfx_path)
+
+    _, payload_offset, payload_size, *_ = extractor.find_appended_payload(sfx_path)
+    open_payload = lambda: extractor.PayloadSegment(sfx_path, payload_offset, payload_size)
+    with zipfile.ZipFile(zip_path) as zf:
+        plan = main.make_extraction_plan(zf.infolist())
+    extract_path = os.path.join(work_dir, "out")
+    shutil.rmtree(extract_path, ignore_errors=True)
+
+    def timed_run(mode, incremental):
+        started = time.perf_counter()
+        stats = extractor.extract_payload(open_payload, extract_path, workers, incremental=incremental, plan=plan)
+        seconds = time.perf_counter() - started
+        return {
+            'mode': mode,
+            'workers': workers,
+            'seconds': round(seconds, 3),
+            'files_written': stats['files'],
+            'files_skipped': stats['skipped'],
+            'mb_per_s': round(total_bytes / (1024 * 1024) / seconds, 1),
+            'files_per_s': round(files / seconds, 1),
+        }
+
+    results = [timed_run('full', False)]
+    # An untimed pass records the manifest the incremental re-run compares against
+    extractor.extract_payload(open_payload, extract_path, workers, incremental=True, plan=plan)
+    results.append(timed_run('incremental_rerun', True))
+    shutil.rmtree(extract_path, ignore_errors=True)
+    return results
+
+def bench_build(zip_path, work_dir, options):
+    """Cold build (empty cache) then a warm one reusing the cached stub"""
+    try:
+        import PyInstaller  # noqa: F401
+    except ImportError:
+        return {'skipped': "PyInstaller is not installed"}
+
+    # A private cache root, so the cold build really is cold
+    old_cache = os.environ.get('LOCALAPPDATA')
+    os.environ['LOCALAPPDATA'] = os.path.join(work_dir, "cache")
+    results = {}
+    try:
+        for run in ('cold', 'warm'):
+            builder = main.SFXBuilder(dict(options, zip_file=zip_path,
+                                           output_exe=os.path.join(work_dir, f"{run}.exe")),
+                                      status_callback=lambda text, percent: None)
+            builder.validate()
+            started = time.perf_counter()
+            builder.build()
+            results[run] = {
+                'seconds': round(time.perf_counter() - started, 3),
+                'phases': {phase: round(seconds, 3) for phase, seconds in sorted(builder.timings.items())},
+                'size': os.path.getsize(builder.options['output_exe']),
+                'stub': builder.stub_report,
+            }
+    finally:
+        if old_cache is None:
+            os.environ.pop('LOCALAPPDATA', None)
+        else:
+            os.environ['LOCALAPPDATA'] = old_cache
+    return results
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_benchmarks(names, scale=1.0, workers=(1, 0), build=True, build_options=None, seed=1):
+    """Run the benchmarks for each named payload and return the results as a dict"""
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'scale': scale,
+        'payloads': {},
+    }
+    with tempfile.TemporaryDirectory(prefix="xip2exe_bench_") as root:
+        extractor = load_extractor(root)
+        for name in names:
+            description, generate = PAYLOADS[name]
+            work_dir = os.path.join(root, name)
+            source_dir = os.path.join(work_dir, "source")
+            os.makedirs(source_dir)
+
+            print(f"{name}: generating {description}...", flush=True)
+            generate(source_dir, scale, random.Random(seed))
+            zip_path = os.path.join(work_dir, "payload.zip")
+            files, total_bytes = zip_directory(source_dir, zip_path)
+            shutil.rmtree(source_dir)
+
+            entry = {'files': files, 'bytes': total_bytes, 'zip_bytes': os.path.getsize(zip_path), 'extract': []}
+            for count in workers:
+                entry['extract'].extend(bench_extract(extractor, zip_path, work_dir, files, total_bytes, count))
+            if build:
+                print(f"{name}: building...", flush=True)
+                entry['build'] = bench_build(zip_path, work_dir, build_options or {})
+            results['payloads'][name] = entry
+    return results
+
+def print_summary(results):
+    print(f"\n{'Payload':<16} {'Files':>7} {'MB':>8}  {'Mode':<18} {'Workers':>7} {'MB/s':>8} {'Files/s':>9}")
+    for name, entry in results['payloads'].items():
+        for run in entry['extract']:
+            print(f"{name:<16} {entry['files']:>7} {entry['bytes'] / (1024 * 1024):>8.1f}  "
+                  f"{run['mode']:<18} {run['workers'] or 'auto':>7} {run['mb_per_s']:>8.1f} {run['files_per_s']:>9.1f}")
+        build = entry.get('build')
+        if build and 'skipped' not in build:
+            for run, data in build.items():
+                phases = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in data['phases'].items())
+                print(f"{'':<16} {run} build {data['seconds']:.2f}s ({phases})")
+        elif build:
+            print(f"{'':<16} build skipped: {build['skipped']}")
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark Xip2exe builds and extraction.")
+    parser.add_argument('--payloads', nargs='+', choices=list(PAYLOADS), default=list(PAYLOADS),
+                        help="Synthetic payloads to run (default: all)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Multiply payload sizes and file counts by this (e.g. 0.1 for a quick run)")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 0],
+                        help="Extraction thread counts to try; 0 = one per CPU (default: 1 0)")
+    parser.add_argument('--skip-build', action='store_true', help="Only benchmark extraction")
+    parser.add_argument('--build-options', metavar='JSON', default='{}',
+                        help="Extra SFXBuilder options for the builds, e.g. '{\"slim_stub\": true}'")
+    parser.add_argument('--output', metavar='FILE', help="Write the results as JSON to FILE")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.payloads, scale=args.scale, workers=args.workers,
+                             build=not args.skip_build, build_options=json.loads(args.build_options))
+    print_summary(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,701 @@
+"""
+The Xip2exe window, a Tk front end to SFXBuilder.
+
+main.main() imports this module only when it opens the window, so the
+headless modes (--batch, --serve and the build workers) never load tkinter.
+"""
+
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+from main import (PAYLOAD_CODECS, BuildCancelled, BuildServerClient, SFXBuilder, ZipIndex, load_zip_index,
+                  scan_source_folder)
+
+class SelfExtractingEXECreator:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Self-Extracting EXE Creator")
+        self.root.geometry("600x720")
+        self.root.resizable(True, True)
+        
+        # Variables
+        self.zip_file_path = tk.StringVar()  # A ZIP file or a source folder
+        self.include_patterns_var = tk.StringVar()
+        self.exclude_patterns_var = tk.StringVar()
+        self.output_exe_path = tk.StringVar()
+        self.extract_folder = tk.StringVar(value="%TEMP%\\SysUpdate")  # Default to Windows temp directory
+        self.run_after_extract = tk.StringVar()
+        self.delete_after_run = tk.BooleanVar(value=False)
+        self.show_console = tk.BooleanVar(value=True)
+        self.require_admin = tk.BooleanVar(value=False)
+        self.inherit_admin = tk.BooleanVar(value=True)
+        self.icon_file_path = tk.StringVar()
+        self.upx_enabled_var = tk.BooleanVar(value=False)
+        self.upx_path_var = tk.StringVar()
+        self.use_stub_cache = tk.BooleanVar(value=True)
+        self.incremental_extract = tk.BooleanVar(value=False)
+        self.remove_stale_files = tk.BooleanVar(value=False)
+        self.recompress_var = tk.StringVar(value="none")
+        self.recompress_level_var = tk.StringVar()
+        self.slim_stub = tk.BooleanVar(value=False)
+        self.run_timeout_var = tk.StringVar(value="300")
+        self.run_log_var = tk.StringVar()
+        self.telemetry_file_var = tk.StringVar()
+        self.telemetry_url_var = tk.StringVar()
+        self.delta_base_path = tk.StringVar()
+        self.dedupe_payload = tk.BooleanVar(value=False)
+        self.verify_hashes = tk.BooleanVar(value=False)
+        self.volume_size_var = tk.StringVar()
+        self.launch_early = tk.BooleanVar(value=False)
+        self.priority_paths_var = tk.StringVar()
+        self.background_cleanup = tk.BooleanVar(value=False)
+        
+        self.setup_ui()
+        
+    def setup_ui(self):
+        # Main frame
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # Configure grid weights
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        
+        row = 0
+        
+        # Title
+        title_label = ttk.Label(main_frame, text="Self-Extracting EXE Creator", 
+                               font=('TkDefaultFont', 16, 'bold'))
+        title_label.grid(row=row, column=0, columnspan=3, pady=(0, 20))
+        row += 1
+        
+        # ZIP file or source folder selection
+        ttk.Label(main_frame, text="Source ZIP/Folder:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(main_frame, textvariable=self.zip_file_path, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        source_buttons = ttk.Frame(main_frame)
+        source_buttons.grid(row=row, column=2, padx=(0, 0))
+        ttk.Button(source_buttons, text="Browse", command=self.browse_zip_file).grid(row=0, column=0)
+        ttk.Button(source_buttons, text="Folder", command=self.browse_source_folder).grid(row=0, column=1, padx=(5, 0))
+        row += 1
+        
+        # Which files of a source folder to pack
+        ttk.Label(main_frame, text="Include:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.grid(row=row, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0))
+        ttk.Entry(filter_frame, textvariable=self.include_patterns_var, width=20).grid(row=0, column=0)
+        ttk.Label(filter_frame, text="Exclude:").grid(row=0, column=1, padx=(10, 5))
+        ttk.Entry(filter_frame, textvariable=self.exclude_patterns_var, width=24).grid(row=0, column=2, sticky=(tk.W, tk.E))
+        row += 1
+        
+        help_text9 = ttk.Label(main_frame, text="Folders only: paths or globs separated by ; (e.g. *.pdb;tests); empty includes all", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text9.grid(row=row, column=1, sticky=tk.W, padx=(5, 0))
+        row += 1
+        
+        # Output EXE path
+        ttk.Label(main_frame, text="Output EXE File:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(main_frame, textvariable=self.output_exe_path, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        ttk.Button(main_frame, text="Browse", command=self.browse_output_exe).grid(row=row, column=2, padx=(0, 0))
+        row += 1
+        
+        # Options, one tab per area, so the window stays a usable size
+        notebook = ttk.Notebook(main_frame)
+        notebook.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(15, 0))
+        main_frame.rowconfigure(row, weight=1)
+        row += 1
+        
+        extraction_tab = self._add_options_tab(notebook, "Extraction")
+        launch_tab = self._add_options_tab(notebook, "Launch")
+        build_tab = self._add_options_tab(notebook, "Build")
+        
+        # Extraction tab
+        tab_row = 0
+        
+        # Extract folder
+        ttk.Label(extraction_tab, text="Extract to Folder:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(extraction_tab, textvariable=self.extract_folder, width=50).grid(row=tab_row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        ttk.Button(extraction_tab, text="Browse", command=self.browse_extract_folder).grid(row=tab_row, column=2, padx=(0, 0))
+        tab_row += 1
+        
+        # Help text for extract folder
+        help_text = ttk.Label(extraction_tab, text="Use '.' for current directory, '%TEMP%\\folder' for temp, or specify a path", 
+                             font=('TkDefaultFont', 8), foreground='gray')
+        help_text.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        # Run after extract
+        ttk.Label(extraction_tab, text="Run After Extract:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(extraction_tab, textvariable=self.run_after_extract, width=50).grid(row=tab_row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        ttk.Button(extraction_tab, text="Browse", command=self.browse_run_file).grid(row=tab_row, column=2, padx=(0, 0))
+        tab_row += 1
+        
+        # Help text for run after extract
+        help_text2 = ttk.Label(extraction_tab, text="Relative path to file within the ZIP (e.g., 'setup.exe' or 'bin/myapp.exe')", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text2.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        # Checkboxes
+        ttk.Checkbutton(extraction_tab, text="Delete extracted files after program finishes", 
+                       variable=self.delete_after_run).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(extraction_tab, text="Delete in the background (exit without waiting)", 
+                       variable=self.background_cleanup).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, padx=(20, 0), pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(extraction_tab, text="Show console window during extraction", 
+                       variable=self.show_console).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(extraction_tab, text="Skip unchanged files when re-extracting (incremental)", 
+                       variable=self.incremental_extract).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(extraction_tab, text="Remove files dropped since the previous extraction", 
+                       variable=self.remove_stale_files).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(extraction_tab, text="Verify files while extracting (SHA-256; rolls back if any is damaged)", 
+                       variable=self.verify_hashes).grid(row=tab_row, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        # Launch tab
+        tab_row = 0
+        
+        # Launched program's timeout and output log
+        ttk.Label(launch_tab, text="Run Timeout (s):").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        run_frame = ttk.Frame(launch_tab)
+        run_frame.grid(row=tab_row, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0))
+        ttk.Entry(run_frame, textvariable=self.run_timeout_var, width=8).grid(row=0, column=0)
+        ttk.Label(run_frame, text="Output Log:").grid(row=0, column=1, padx=(10, 5))
+        ttk.Entry(run_frame, textvariable=self.run_log_var, width=30).grid(row=0, column=2, sticky=(tk.W, tk.E))
+        tab_row += 1
+        
+        help_text5 = ttk.Label(launch_tab, text="0 = no time limit; the log path may use variables like %TEMP%", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text5.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        ttk.Checkbutton(launch_tab, text="Launch as soon as the program is extracted; extract the rest meanwhile", 
+                       variable=self.launch_early).grid(row=tab_row, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Label(launch_tab, text="Needed First:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(launch_tab, textvariable=self.priority_paths_var, width=50).grid(row=tab_row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        tab_row += 1
+        
+        help_text8 = ttk.Label(launch_tab, text="Optional: files, folders or globs the program needs at startup, separated by ;", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text8.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        # Runtime telemetry
+        ttk.Label(launch_tab, text="Telemetry File:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        telemetry_frame = ttk.Frame(launch_tab)
+        telemetry_frame.grid(row=tab_row, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0))
+        ttk.Entry(telemetry_frame, textvariable=self.telemetry_file_var, width=22).grid(row=0, column=0)
+        ttk.Label(telemetry_frame, text="URL:").grid(row=0, column=1, padx=(10, 5))
+        ttk.Entry(telemetry_frame, textvariable=self.telemetry_url_var, width=24).grid(row=0, column=2, sticky=(tk.W, tk.E))
+        tab_row += 1
+        
+        ttk.Checkbutton(launch_tab, text="Require administrator privileges to run", 
+                       variable=self.require_admin).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(launch_tab, text="Pass admin privileges to launched program", 
+                       variable=self.inherit_admin).grid(row=tab_row, column=0, columnspan=2, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        # Build tab
+        tab_row = 0
+        
+        # Icon file selection
+        ttk.Label(build_tab, text="Application Icon:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(build_tab, textvariable=self.icon_file_path, width=50).grid(row=tab_row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        ttk.Button(build_tab, text="Browse", command=self.browse_icon_file).grid(row=tab_row, column=2, padx=(0, 0))
+        tab_row += 1
+        
+        # Help text for icon
+        help_text3 = ttk.Label(build_tab, text="Optional: Select .ico file for custom application icon", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text3.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        # UPX compression
+        self.upx_enabled_checkbutton = ttk.Checkbutton(build_tab, text="Compress EXE with UPX", variable=self.upx_enabled_var, command=self.toggle_upx_path)
+        self.upx_enabled_checkbutton.grid(row=tab_row, column=0, columnspan=3, sticky='w', padx=5, pady=2)
+        tab_row += 1
+        
+        self.upx_path_label = ttk.Label(build_tab, text="UPX Directory:")
+        self.upx_path_label.grid(row=tab_row, column=0, sticky='w', padx=5)
+        self.upx_path_entry = ttk.Entry(build_tab, textvariable=self.upx_path_var, width=50)
+        self.upx_path_entry.grid(row=tab_row, column=1, sticky='ew', padx=5)
+        self.upx_browse_button = ttk.Button(build_tab, text="Browse...", command=self.browse_upx_path)
+        self.upx_browse_button.grid(row=tab_row, column=2, sticky='w', padx=5)
+        tab_row += 1
+        
+        # Payload recompression
+        ttk.Label(build_tab, text="Recompress Payload:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        recompress_frame = ttk.Frame(build_tab)
+        recompress_frame.grid(row=tab_row, column=1, columnspan=2, sticky=tk.W, padx=(5, 0))
+        ttk.Combobox(recompress_frame, textvariable=self.recompress_var, state='readonly', width=12,
+                     values=["none"] + list(PAYLOAD_CODECS)).grid(row=0, column=0)
+        ttk.Label(recompress_frame, text="Level:").grid(row=0, column=1, padx=(10, 5))
+        ttk.Entry(recompress_frame, textvariable=self.recompress_level_var, width=5).grid(row=0, column=2)
+        ttk.Label(recompress_frame, text="Volume Size (MB):").grid(row=0, column=3, padx=(10, 5))
+        ttk.Entry(recompress_frame, textvariable=self.volume_size_var, width=8).grid(row=0, column=4)
+        tab_row += 1
+        
+        help_text4 = ttk.Label(build_tab, text="Optional: repack the ZIP (deflate for folders); bigger payloads than the\n"
+                                               "volume size go into .001, .002... files next to the EXE", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text4.grid(row=tab_row, column=1, columnspan=2, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        # Delta package against a previous release
+        ttk.Label(build_tab, text="Previous Release:").grid(row=tab_row, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(build_tab, textvariable=self.delta_base_path, width=50).grid(row=tab_row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
+        ttk.Button(build_tab, text="Browse", command=self.browse_delta_base).grid(row=tab_row, column=2, padx=(0, 0))
+        tab_row += 1
+        
+        help_text6 = ttk.Label(build_tab, text="Optional: previous release ZIP or manifest; embeds only what changed", 
+                              font=('TkDefaultFont', 8), foreground='gray')
+        help_text6.grid(row=tab_row, column=1, sticky=tk.W, padx=(5, 0))
+        tab_row += 1
+        
+        ttk.Checkbutton(build_tab, text="Store identical files once (hardlinked when extracted)", 
+                       variable=self.dedupe_payload).grid(row=tab_row, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(build_tab, text="Reuse cached extractor stub (fast rebuilds)", 
+                       variable=self.use_stub_cache).grid(row=tab_row, column=0, columnspan=3, sticky=tk.W, pady=5)
+        tab_row += 1
+        
+        ttk.Checkbutton(build_tab, text="Slim extractor stub (no Tcl/Tk; smaller, faster startup)", 
+                       variable=self.slim_stub).grid(row=tab_row, column=0, columnspan=3, sticky=tk.W, pady=5)
+        
+        # Separator
+        ttk.Separator(main_frame, orient='horizontal').grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=20)
+        row += 1
+        
+        # Create and cancel buttons
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=row, column=0, columnspan=3, pady=10)
+        self.create_button = ttk.Button(button_frame, text="Create Self-Extracting EXE", 
+                                       command=self.create_exe, style='Accent.TButton')
+        self.create_button.grid(row=0, column=0, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_build, state='disabled')
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        row += 1
+        
+        # Progress bar
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        row += 1
+        
+        # Status label
+        self.status_label = ttk.Label(main_frame, text="Ready to create self-extracting EXE")
+        self.status_label.grid(row=row, column=0, columnspan=3, pady=5)
+        
+        self.toggle_upx_path() # Set initial state
+        
+    def _add_options_tab(self, notebook, title):
+        tab = ttk.Frame(notebook, padding="10")
+        tab.columnconfigure(1, weight=1)
+        notebook.add(tab, text=title)
+        return tab
+    
+    def browse_zip_file(self):
+        filename = filedialog.askopenfilename(
+            title="Select ZIP file",
+            filetypes=[("ZIP files", "*.zip"), ("All files", "*.*")]
+        )
+        if filename:
+            self.zip_file_path.set(filename)
+            # Auto-suggest output filename
+            if not self.output_exe_path.get():
+                base_name = os.path.splitext(os.path.basename(filename))[0]
+                output_path = os.path.join(os.path.dirname(filename), f"{base_name}_installer.exe")
+                self.output_exe_path.set(output_path)
+            # Index the ZIP in the background, so the file picker opens straight away
+            threading.Thread(target=self._index_zip_quietly, args=(filename,), daemon=True).start()
+    
+    def browse_source_folder(self):
+        folder = filedialog.askdirectory(title="Select folder to pack")
+        if folder:
+            self.zip_file_path.set(folder)
+            # Auto-suggest output filename
+            if not self.output_exe_path.get():
+                base_name = os.path.basename(os.path.normpath(folder))
+                self.output_exe_path.set(os.path.join(os.path.dirname(os.path.normpath(folder)),
+                                                      f"{base_name}_installer.exe"))
+    
+    def _split_patterns(self, var):
+        return [path.strip() for path in var.get().split(';') if path.strip()]
+    
+    def _index_zip_quietly(self, zip_path):
+        try:
+            load_zip_index(zip_path)
+        except Exception:
+            pass
+    
+    def browse_output_exe(self):
+        filename = filedialog.asksaveasfilename(
+            title="Save self-extracting EXE as",
+            defaultextension=".exe",
+            filetypes=[("Executable files", "*.exe"), ("All files", "*.*")]
+        )
+        if filename:
+            self.output_exe_path.set(filename)
+    
+    def browse_extract_folder(self):
+        folder = filedialog.askdirectory(title="Select extraction folder")
+        if folder:
+            self.extract_folder.set(folder)
+    
+    def browse_run_file(self):
+        zip_path = self.zip_file_path.get()
+        if not zip_path or not os.path.exists(zip_path):
+            messagebox.showinfo("Run After Extract", 
+                               "Select a ZIP file or folder first to pick from its contents, or enter the "
+                               "relative path to the file within the ZIP archive.\n\n"
+                               "Examples:\n"
+                               "• setup.exe\n"
+                               "• bin/myapp.exe\n"
+                               "• installer/install.bat")
+            return
+        
+        # Read the ZIP's central directory (or walk the folder) on a worker thread;
+        # large archives take a moment
+        self.status_label.config(text="Reading ZIP contents...")
+        result = queue.Queue()
+        include, exclude = self._split_patterns(self.include_patterns_var), self._split_patterns(self.exclude_patterns_var)
+        
+        def load():
+            try:
+                if os.path.isdir(zip_path):
+                    index = ZipIndex([info.filename for info in scan_source_folder(zip_path, include, exclude)])
+                else:
+                    index = load_zip_index(zip_path)
+                result.put((index, None))
+            except Exception as e:
+                result.put((None, e))
+        
+        threading.Thread(target=load, daemon=True).start()
+        self.root.after(50, self._open_zip_picker, result)
+    
+    def _open_zip_picker(self, result):
+        try:
+            index, error = result.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self._open_zip_picker, result)
+            return
+        self.status_label.config(text="Ready to create self-extracting EXE")
+        if error:
+            messagebox.showerror("Error", f"Could not read ZIP file or folder:\n{error}")
+            return
+        ZipFilePicker(self.root, index, self.run_after_extract.set, self.run_after_extract.get())
+    
+    def browse_icon_file(self):
+        filename = filedialog.askopenfilename(
+            title="Select icon file",
+            filetypes=[("Icon files", "*.ico"), ("All files", "*.*")]
+        )
+        if filename:
+            self.icon_file_path.set(filename)
+    
+    def browse_delta_base(self):
+        filename = filedialog.askopenfilename(
+            title="Select previous release ZIP or manifest",
+            filetypes=[("Releases", "*.zip *.json"), ("All files", "*.*")]
+        )
+        if filename:
+            self.delta_base_path.set(filename)
+    
+    def browse_upx_path(self):
+        dirpath = filedialog.askdirectory(title="Select UPX Directory")
+        if dirpath:
+            self.upx_path_var.set(dirpath)
+    
+    def toggle_upx_path(self):
+        state = 'normal' if self.upx_enabled_var.get() else 'disabled'
+        self.upx_path_entry.config(state=state)
+        self.upx_browse_button.config(state=state)
+        self.upx_path_label.config(state=state)
+    
+    def create_exe(self):
+        # Validate inputs
+        if not self.zip_file_path.get():
+            messagebox.showerror("Error", "Please select a ZIP file or source folder")
+            return
+        
+        if not self.output_exe_path.get():
+            messagebox.showerror("Error", "Please specify output EXE path")
+            return
+        
+        if not os.path.exists(self.zip_file_path.get()):
+            messagebox.showerror("Error", "ZIP file or folder does not exist")
+            return
+        
+        level = self.recompress_level_var.get().strip()
+        if level and not level.isdigit():
+            messagebox.showerror("Error", "Compression level must be a whole number")
+            return
+        
+        volume_size = self.volume_size_var.get().strip()
+        if volume_size and not volume_size.isdigit():
+            messagebox.showerror("Error", "Volume size must be a whole number of MB")
+            return
+        
+        if not self.run_timeout_var.get().strip().isdigit():
+            messagebox.showerror("Error", "Run timeout must be a whole number of seconds")
+            return
+        
+        if self.delta_base_path.get().strip() and not os.path.exists(self.delta_base_path.get().strip()):
+            messagebox.showerror("Error", "Previous release file does not exist")
+            return
+        
+        # Run the build on a worker thread; it reports back through a queue
+        # that the Tk main loop drains, so the window stays responsive
+        self.build_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        builder = SFXBuilder(self._collect_options(),
+                             status_callback=lambda text, percent: self.build_queue.put(('status', text, percent)),
+                             cancel_event=self.cancel_event)
+        
+        self.progress['value'] = 0
+        self.status_label.config(text="Creating self-extracting EXE...")
+        self.create_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        
+        self.build_thread = threading.Thread(target=self._run_build, args=(builder,), daemon=True)
+        self.build_thread.start()
+        self.root.after(100, self._poll_build_queue)
+    
+    def _collect_options(self):
+        """Snapshot the form into a plain options dict for SFXBuilder"""
+        source = self.zip_file_path.get()
+        is_folder = os.path.isdir(source)
+        return {
+            'zip_file': '' if is_folder else source,
+            'source_folder': source if is_folder else '',
+            'include_patterns': self._split_patterns(self.include_patterns_var) if is_folder else [],
+            'exclude_patterns': self._split_patterns(self.exclude_patterns_var) if is_folder else [],
+            'output_exe': self.output_exe_path.get(),
+            'extract_folder': self.extract_folder.get(),
+            'run_after_extract': self.run_after_extract.get(),
+            'delete_after_run': self.delete_after_run.get(),
+            'show_console': self.show_console.get(),
+            'require_admin': self.require_admin.get(),
+            'inherit_admin': self.inherit_admin.get(),
+            'icon_file': self.icon_file_path.get(),
+            'upx_enabled': self.upx_enabled_var.get(),
+            'upx_dir': self.upx_path_var.get(),
+            'use_stub_cache': self.use_stub_cache.get(),
+            'incremental_extract': self.incremental_extract.get(),
+            'remove_stale_files': self.remove_stale_files.get(),
+            'recompress': '' if self.recompress_var.get() == "none" else self.recompress_var.get(),
+            'recompress_level': int(self.recompress_level_var.get()) if self.recompress_level_var.get().strip() else None,
+            'slim_stub': self.slim_stub.get(),
+            'run_timeout': int(self.run_timeout_var.get()),
+            'run_log': self.run_log_var.get().strip(),
+            'telemetry_file': self.telemetry_file_var.get().strip(),
+            'telemetry_url': self.telemetry_url_var.get().strip(),
+            'delta_base': self.delta_base_path.get().strip(),
+            'dedupe_payload': self.dedupe_payload.get(),
+            'verify_hashes': self.verify_hashes.get(),
+            'volume_size_mb': int(self.volume_size_var.get().strip() or 0),
+            'launch_early': self.launch_early.get(),
+            'priority_paths': self._split_patterns(self.priority_paths_var),
+            'cleanup_mode': 'background' if self.background_cleanup.get() else 'parallel',
+        }
+    
+    def _run_build(self, builder):
+        """Worker thread body; never touches Tk directly"""
+        try:
+            builder.validate()
+            server = os.environ.get('XIP2EXE_BUILD_SERVER')
+            if server:
+                # Let the warm build server do the work instead of building in this process
+                client = BuildServerClient(server)
+                result = client.wait(client.submit(builder.options), builder.status_callback, builder.cancel_event)
+                if result['status'] == 'cancelled':
+                    raise BuildCancelled("Build cancelled")
+                if result['status'] != 'ok':
+                    raise Exception(result.get('error') or "Build failed")
+            else:
+                builder.build()
+            self.build_queue.put(('done', None, None))
+        except BuildCancelled:
+            self.build_queue.put(('cancelled', None, None))
+        except Exception as e:
+            self.build_queue.put(('error', str(e), None))
+    
+    def _poll_build_queue(self):
+        finished = False
+        try:
+            while True:
+                kind, text, percent = self.build_queue.get_nowait()
+                if kind == 'status':
+                    self.status_label.config(text=text)
+                    if percent is not None:
+                        self.progress['value'] = percent
+                    continue
+                
+                finished = True
+                self.create_button.config(state='normal')
+                self.cancel_button.config(state='disabled')
+                if kind == 'done':
+                    self.progress['value'] = 100
+                    self.status_label.config(text="Self-extracting EXE created successfully!")
+                    messagebox.showinfo("Success", f"Self-extracting EXE created:\n{self.output_exe_path.get()}")
+                elif kind == 'cancelled':
+                    self.progress['value'] = 0
+                    self.status_label.config(text="Build cancelled")
+                else:
+                    self.status_label.config(text="Error creating EXE")
+                    messagebox.showerror("Error", f"Failed to create EXE:\n{text}")
+                break
+        except queue.Empty:
+            pass
+        
+        if not finished:
+            self.root.after(100, self._poll_build_queue)
+    
+    def cancel_build(self):
+        if getattr(self, 'cancel_event', None) is not None:
+            self.cancel_event.set()
+            self.cancel_button.config(state='disabled')
+            self.status_label.config(text="Cancelling build...")
+    
+class ZipFilePicker:
+    """Dialog for choosing a file inside a ZIP, from its ZipIndex.
+    
+    Folders are filled in only when opened, and long listings and searches
+    are cut short, so it stays responsive on archives with hundreds of
+    thousands of entries. on_pick(path) is called with the chosen file.
+    """
+    
+    MAX_ITEMS = 2000  # Rows shown per folder or search
+    
+    def __init__(self, parent, index, on_pick, initial=''):
+        self.index = index
+        self.on_pick = on_pick
+        self.unfilled = set()  # Folders whose contents haven't been listed yet
+        self.search_job = None
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title("Select file to run after extracting")
+        self.window.geometry("520x560")
+        self.window.transient(parent)
+        
+        frame = ttk.Frame(self.window, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="Search:").grid(row=0, column=0, sticky=tk.W)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(frame, textvariable=self.search_var)
+        search_entry.grid(row=0, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=(5, 0))
+        self.search_var.trace_add('write', lambda *args: self._schedule_search())
+        
+        self.tree = ttk.Treeview(frame, show='tree', selectmode='browse')
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.grid(row=1, column=0, columnspan=2, sticky=(tk.N, tk.S, tk.W, tk.E), pady=5)
+        scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S), pady=5)
+        self.tree.bind('<<TreeviewOpen>>', self._on_open)
+        self.tree.bind('<Double-1>', self._on_double_click)
+        self.tree.bind('<Return>', lambda event: self._pick())
+        
+        self.info_label = ttk.Label(frame, font=('TkDefaultFont', 8), foreground='gray')
+        self.info_label.grid(row=2, column=0, columnspan=3, sticky=tk.W)
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=3, column=0, columnspan=3, sticky=tk.E, pady=(5, 0))
+        ttk.Button(button_frame, text="Select", command=self._pick).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=self.window.destroy).pack(side=tk.LEFT)
+        
+        frame.columnconfigure(1, weight=1)
+        frame.rowconfigure(1, weight=1)
+        
+        self._show_tree()
+        if initial:
+            self.search_var.set(initial)
+        search_entry.focus_set()
+    
+    # Row ids are the path prefixed with 'd:' for folders and 'f:' for files,
+    # so they never clash with the ids Tk gives the placeholder rows
+    def _fill_folder(self, folder):
+        """Insert the rows for folder's entries; folders get a placeholder child until opened"""
+        parent = 'd:' + folder if folder else ''
+        entries = self.index.list_folder(folder)
+        for name, is_folder in entries[:self.MAX_ITEMS]:
+            path = f"{folder}/{name}" if folder else name
+            if is_folder:
+                item = self.tree.insert(parent, tk.END, iid='d:' + path, text=name + '/')
+                self.tree.insert(item, tk.END, text="...")
+                self.unfilled.add(item)
+            else:
+                self.tree.insert(parent, tk.END, iid='f:' + path, text=name)
+        if len(entries) > self.MAX_ITEMS:
+            self.tree.insert(parent, tk.END, text=f"... {len(entries) - self.MAX_ITEMS} more; use Search to find them")
+    
+    def _show_tree(self):
+        self.tree.delete(*self.tree.get_children())
+        self.unfilled.clear()
+        self._fill_folder('')
+        self.info_label.config(text=f"{len(self.index.files)} files")
+    
+    def _on_open(self, event):
+        item = self.tree.focus()
+        if item in self.unfilled:
+            self.unfilled.discard(item)
+            self.tree.delete(*self.tree.get_children(item))
+            self._fill_folder(item[2:])
+    
+    def _schedule_search(self):
+        # Wait for a pause in typing before searching
+        if self.search_job:
+            self.window.after_cancel(self.search_job)
+        self.search_job = self.window.after(200, self._search)
+    
+    def _search(self):
+        self.search_job = None
+        text = self.search_var.get().strip()
+        if not text:
+            self._show_tree()
+            return
+        matches = self.index.search(text, limit=self.MAX_ITEMS + 1)
+        self.tree.delete(*self.tree.get_children())
+        self.unfilled.clear()
+        for path in matches[:self.MAX_ITEMS]:
+            self.tree.insert('', tk.END, iid='f:' + path, text=path)
+        if len(matches) > self.MAX_ITEMS:
+            self.info_label.config(text=f"Showing the first {self.MAX_ITEMS} matches; refine the search to see the rest")
+        else:
+            self.info_label.config(text=f"{len(matches)} matching files")
+        if len(matches) == 1:
+            self.tree.selection_set('f:' + matches[0])
+            self.tree.focus('f:' + matches[0])
+    
+    def _on_double_click(self, event):
+        # Double-clicking a folder just opens it
+        if self.tree.identify_row(event.y).startswith('f:'):
+            self._pick()
+    
+    def _pick(self):
+        selection = self.tree.selection()
+        if selection and selection[0].startswith('f:'):
+            self.on_pick(selection[0][2:])
+            self.window.destroy()
+
+def run():
+    """Open the main window and run until it is closed"""
+    root = tk.Tk()
+    SelfExtractingEXECreator(root)
+    root.mainloop()
@@ -10,391 +10,2642 @@ Date: 2025-07-25
 
 import os
 import sys
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
 import json
+import zipfile
+import zlib
+import bz2
 import shutil
 import tempfile
 import subprocess
+import hashlib
+import struct
+import time
+import platform
+import logging
+import threading
+import io
+import fnmatch
+import collections
+import itertools
+import bisect
+import heapq
+import multiprocessing
+import hmac
+import secrets
+import urllib.request
+import urllib.error
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
 from pathlib import Path
 
-class SelfExtractingEXECreator:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Self-Extracting EXE Creator")
-        self.root.geometry("600x650")
-        self.root.resizable(True, True)
-        
-        # Variables
-        self.zip_file_path = tk.StringVar()
-        self.output_exe_path = tk.StringVar()
-        self.extract_folder = tk.StringVar(value="%TEMP%\\SysUpdate")  # Default to Windows temp directory
-        self.run_after_extract = tk.StringVar()
-        self.delete_after_run = tk.BooleanVar(value=False)
-        self.show_console = tk.BooleanVar(value=True)
-        self.require_admin = tk.BooleanVar(value=False)
-        self.inherit_admin = tk.BooleanVar(value=True)
-        self.icon_file_path = tk.StringVar()
-        self.upx_enabled_var = tk.BooleanVar(value=False)
-        self.upx_path_var = tk.StringVar()
-        
-        self.setup_ui()
-        
-    def setup_ui(self):
-        # Main frame
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # Configure grid weights
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
-        main_frame.columnconfigure(1, weight=1)
-        
-        row = 0
-        
-        # Title
-        title_label = ttk.Label(main_frame, text="Self-Extracting EXE Creator", 
-                               font=('TkDefaultFont', 16, 'bold'))
-        title_label.grid(row=row, column=0, columnspan=3, pady=(0, 20))
-        row += 1
-        
-        # ZIP file selection
-        ttk.Label(main_frame, text="Source ZIP File:").grid(row=row, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(main_frame, textvariable=self.zip_file_path, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
-        ttk.Button(main_frame, text="Browse", command=self.browse_zip_file).grid(row=row, column=2, padx=(0, 0))
-        row += 1
-        
-        # Output EXE path
-        ttk.Label(main_frame, text="Output EXE File:").grid(row=row, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(main_frame, textvariable=self.output_exe_path, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
-        ttk.Button(main_frame, text="Browse", command=self.browse_output_exe).grid(row=row, column=2, padx=(0, 0))
-        row += 1
-        
-        # Separator
-        ttk.Separator(main_frame, orient='horizontal').grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=20)
-        row += 1
-        
-        # Extraction options label
-        ttk.Label(main_frame, text="Extraction Options", 
-                 font=('TkDefaultFont', 12, 'bold')).grid(row=row, column=0, columnspan=3, pady=(0, 10))
-        row += 1
-        
-        # Extract folder
-        ttk.Label(main_frame, text="Extract to Folder:").grid(row=row, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(main_frame, textvariable=self.extract_folder, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
-        ttk.Button(main_frame, text="Browse", command=self.browse_extract_folder).grid(row=row, column=2, padx=(0, 0))
-        row += 1
-        
-        # Help text for extract folder
-        help_text = ttk.Label(main_frame, text="Use '.' for current directory, '%TEMP%\\folder' for temp, or specify a path", 
-                             font=('TkDefaultFont', 8), foreground='gray')
-        help_text.grid(row=row, column=1, sticky=tk.W, padx=(5, 0))
-        row += 1
-        
-        # Run after extract
-        ttk.Label(main_frame, text="Run After Extract:").grid(row=row, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(main_frame, textvariable=self.run_after_extract, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
-        ttk.Button(main_frame, text="Browse", command=self.browse_run_file).grid(row=row, column=2, padx=(0, 0))
-        row += 1
-        
-        # Help text for run after extract
-        help_text2 = ttk.Label(main_frame, text="Relative path to file within the ZIP (e.g., 'setup.exe' or 'bin/myapp.exe')", 
-                              font=('TkDefaultFont', 8), foreground='gray')
-        help_text2.grid(row=row, column=1, sticky=tk.W, padx=(5, 0))
-        row += 1
-        
-        # Checkboxes
-        ttk.Checkbutton(main_frame, text="Delete extracted files after program finishes", 
-                       variable=self.delete_after_run).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
-        row += 1
-        
-        ttk.Checkbutton(main_frame, text="Show console window during extraction", 
-                       variable=self.show_console).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
-        row += 1
-        
-        ttk.Checkbutton(main_frame, text="Require administrator privileges to run", 
-                       variable=self.require_admin).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
-        row += 1
-        
-        ttk.Checkbutton(main_frame, text="Pass admin privileges to launched program", 
-                       variable=self.inherit_admin).grid(row=row, column=0, columnspan=2, sticky=tk.W, pady=5)
-        row += 1
-        
-        # Icon file selection
-        ttk.Label(main_frame, text="Application Icon:").grid(row=row, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(main_frame, textvariable=self.icon_file_path, width=50).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=(5, 5))
-        ttk.Button(main_frame, text="Browse", command=self.browse_icon_file).grid(row=row, column=2, padx=(0, 0))
-        row += 1
-        
-        # Help text for icon
-        help_text3 = ttk.Label(main_frame, text="Optional: Select .ico file for custom application icon", 
-                              font=('TkDefaultFont', 8), foreground='gray')
-        help_text3.grid(row=row, column=1, sticky=tk.W, padx=(5, 0))
-        row += 1
-        
-        # UPX compression
-        self.upx_enabled_checkbutton = ttk.Checkbutton(main_frame, text="Compress EXE with UPX", variable=self.upx_enabled_var, command=self.toggle_upx_path)
-        self.upx_enabled_checkbutton.grid(row=row, column=0, columnspan=3, sticky='w', padx=5, pady=2)
-        row += 1
-        
-        self.upx_path_label = ttk.Label(main_frame, text="UPX Directory:")
-        self.upx_path_label.grid(row=row, column=0, sticky='w', padx=5)
-        self.upx_path_entry = ttk.Entry(main_frame, textvariable=self.upx_path_var, width=50)
-        self.upx_path_entry.grid(row=row, column=1, sticky='ew', padx=5)
-        self.upx_browse_button = ttk.Button(main_frame, text="Browse...", command=self.browse_upx_path)
-        self.upx_browse_button.grid(row=row, column=2, sticky='w', padx=5)
-        row += 1
-        
-        # Separator
-        ttk.Separator(main_frame, orient='horizontal').grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=20)
-        row += 1
-        
-        # Create button
-        create_button = ttk.Button(main_frame, text="Create Self-Extracting EXE", 
-                                  command=self.create_exe, style='Accent.TButton')
-        create_button.grid(row=row, column=0, columnspan=3, pady=10)
-        row += 1
-        
-        # Progress bar
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
-        self.progress.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
-        row += 1
-        
-        # Status label
-        self.status_label = ttk.Label(main_frame, text="Ready to create self-extracting EXE")
-        self.status_label.grid(row=row, column=0, columnspan=3, pady=5)
-        
-        self.toggle_upx_path() # Set initial state
-        
-    def browse_zip_file(self):
-        filename = filedialog.askopenfilename(
-            title="Select ZIP file",
-            filetypes=[("ZIP files", "*.zip"), ("All files", "*.*")]
-        )
-        if filename:
-            self.zip_file_path.set(filename)
-            # Auto-suggest output filename
-            if not self.output_exe_path.get():
-                base_name = os.path.splitext(os.path.basename(filename))[0]
-                output_path = os.path.join(os.path.dirname(filename), f"{base_name}_installer.exe")
-                self.output_exe_path.set(output_path)
-    
-    def browse_output_exe(self):
-        filename = filedialog.asksaveasfilename(
-            title="Save self-extracting EXE as",
-            defaultextension=".exe",
-            filetypes=[("Executable files", "*.exe"), ("All files", "*.*")]
-        )
-        if filename:
-            self.output_exe_path.set(filename)
-    
-    def browse_extract_folder(self):
-        folder = filedialog.askdirectory(title="Select extraction folder")
-        if folder:
-            self.extract_folder.set(folder)
-    
-    def browse_run_file(self):
-        # This is a bit tricky since we need to show files within the ZIP
-        # For now, just let the user type the path
-        messagebox.showinfo("Run After Extract", 
-                           "Enter the relative path to the file within the ZIP archive.\n\n"
-                           "Examples:\n"
-                           "• setup.exe\n"
-                           "• bin/myapp.exe\n"
-                           "• installer/install.bat")
-    
-    def browse_icon_file(self):
-        filename = filedialog.askopenfilename(
-            title="Select icon file",
-            filetypes=[("Icon files", "*.ico"), ("All files", "*.*")]
-        )
-        if filename:
-            self.icon_file_path.set(filename)
-    
-    def browse_upx_path(self):
-        dirpath = filedialog.askdirectory(title="Select UPX Directory")
-        if dirpath:
-            self.upx_path_var.set(dirpath)
-    
-    def toggle_upx_path(self):
-        state = 'normal' if self.upx_enabled_var.get() else 'disabled'
-        self.upx_path_entry.config(state=state)
-        self.upx_browse_button.config(state=state)
-        self.upx_path_label.config(state=state)
-    
-    def create_exe(self):
-        # Validate inputs
-        if not self.zip_file_path.get():
-            messagebox.showerror("Error", "Please select a ZIP file")
-            return
-        
-        if not self.output_exe_path.get():
-            messagebox.showerror("Error", "Please specify output EXE path")
-            return
-        
-        if not os.path.exists(self.zip_file_path.get()):
-            messagebox.showerror("Error", "ZIP file does not exist")
+# Layout of the trailer written after the appended payload, config and plan of a
+# prebuilt-stub SFX: magic, payload offset, payload size, config offset, config size,
+# plan offset, plan size
+STUB_MAGIC = b'XIP2EXE\x00'
+STUB_TRAILER = struct.Struct('<8sQQQQQQ')
+
+# The extraction plan, hashes and duplicates grow with the file count, so they
+# are kept out of the config in a blob of their own (see pack_extraction_plan):
+# a header of magic, has-plan flag, total size, largest file and the member,
+# directory, hash and duplicate counts, then a zlib stream of one record per
+# member, the raw SHA-256 digests and a NUL-separated UTF-8 name table
+PLAN_MAGIC = b'XPLN'
+PLAN_HEADER = struct.Struct('<4sBQQIIII')
+PLAN_MEMBER = struct.Struct('<QQQHL')
+
+# PyInstaller's CArchive cookie; a patched copy is re-appended after our data
+# so the bootloader still finds its archive at the end of the file
+PYI_COOKIE_MAGIC = b'MEI\x0c\x0b\x0a\x0b\x0e'
+PYI_COOKIE = struct.Struct('!8sIIii64s')
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Windows won't start an EXE of 4 GB or more; bigger packages are split into
+# volumes of this size when no volume size is set
+MAX_EXE_SIZE = 0xFFFFFFFF
+DEFAULT_VOLUME_SIZE = 2 * 1024 * 1024 * 1024
+
+# Build options understood by SFXBuilder
+DEFAULT_OPTIONS = {
+    'zip_file': '',
+    'source_folder': '',  # Build from this folder instead of zip_file, compressing it straight into the EXE
+    'include_patterns': [],  # Source folder only: paths, folders or globs to pack; [] = everything
+    'exclude_patterns': [],  # Source folder only: paths, folders or globs to leave out
+    'output_exe': '',
+    'extract_folder': '%TEMP%\\SysUpdate',  # Default to Windows temp directory
+    'run_after_extract': '',
+    'delete_after_run': False,
+    'show_console': True,
+    'require_admin': False,
+    'inherit_admin': True,
+    'icon_file': '',
+    'upx_enabled': False,
+    'upx_dir': '',
+    'use_stub_cache': True,
+    'extract_workers': 0,  # Extraction threads in the generated EXE; 0 = one per CPU
+    'incremental_extract': False,
+    'remove_stale_files': False,
+    'recompress': '',  # '' keeps the ZIP as-is, otherwise a key of PAYLOAD_CODECS
+    'recompress_level': None,  # None = the codec's default level
+    'slim_stub': False,  # Leave Tcl/Tk and other unused stdlib packages out of the stub
+    'run_timeout': 300,  # Seconds the launched program may run; 0 = no limit
+    'run_log': '',  # Log file for the launched program's output; '' = don't keep it
+    'run_log_tail': 50,  # Output lines kept in memory for error messages
+    'telemetry_file': '',  # JSON Lines file the generated EXE appends a timing report to
+    'telemetry_url': '',  # Endpoint the generated EXE POSTs its timing report to
+    'delta_base': '',  # Previous release's ZIP or release manifest; embeds only what changed
+    'dedupe_payload': False,  # Store identical files once; the EXE hardlinks the copies
+    'verify_hashes': False,  # Embed per-file SHA-256 hashes; the EXE checks each file as it writes it
+    'launch_early': False,  # Start the program once it and priority_paths are extracted; the rest follows
+    'priority_paths': [],  # Paths, folders or globs in the ZIP the program needs before it starts
+    'volume_size_mb': 0,  # Split bigger payloads into the EXE plus .001, .002... files; 0 = only past 4 GB
+    'cleanup_mode': 'parallel',  # How delete_after_run deletes: 'parallel' or 'background'
+    'cleanup_retries': 5,  # Attempts per locked file before cleanup gives up on it
+    'cleanup_retry_delay': 0.5,  # Seconds before the first retry; grows with each attempt
+}
+
+CLEANUP_MODES = ('parallel', 'background')
+
+# Modules the extractor never needs; excluded from slim stubs. Message boxes
+# fall back to the native Windows dialog when Tk is left out.
+SLIM_EXCLUDES = [
+    'tkinter', '_tkinter', 'unittest', 'pydoc', 'doctest', 'pdb', 'difflib', 'sqlite3',
+    'asyncio', 'multiprocessing', 'distutils', 'setuptools', 'pkg_resources', 'lib2to3',
+    'xmlrpc', 'tomllib', 'curses', 'idlelib', 'turtle', 'turtledemo',
+]
+
+# Zstandard's method id in the ZIP specification; zipfile can't read or write it,
+# so the extractor decodes it itself
+ZIP_ZSTANDARD = 93
+
+# Codecs the payload can be recompressed with: name -> (ZIP method, default level)
+PAYLOAD_CODECS = {
+    'deflate': (zipfile.ZIP_DEFLATED, 6),
+    'bzip2': (zipfile.ZIP_BZIP2, 9),
+    'lzma': (zipfile.ZIP_LZMA, None),  # zipfile's LZMA format has no level setting
+    'zstd': (ZIP_ZSTANDARD, 10),
+}
+# The levels each codec accepts; None if it has no level setting
+PAYLOAD_CODEC_LEVELS = {
+    'deflate': (0, 9),
+    'bzip2': (1, 9),
+    'lzma': None,
+    'zstd': (1, 22),
+}
+
+# Recompression work is split into batches of roughly this much uncompressed data
+RECOMPRESS_BATCH_BYTES = 32 * 1024 * 1024
+RECOMPRESS_BATCH_FILES = 512
+# Members bigger than one copy chunk are stored if this much of their start doesn't compress
+COMPRESS_SAMPLE_BYTES = 1024 * 1024
+
+# Persistent PyInstaller work/stub cache limits
+CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+CACHE_MAX_AGE_DAYS = 30
+CACHE_LOCK_TIMEOUT = 600  # seconds
+CACHE_LOCK_HEARTBEAT = 30  # seconds between refreshes of a held lock's mtime
+
+# Local build server (--serve): port, and builds per warm worker before it's replaced
+BUILD_SERVER_PORT = 8765
+BUILD_WORKER_MAX_JOBS = 20
+BUILD_SERVER_KEEP_JOBS = 500  # Finished jobs kept for status queries
+
+# ZIP indexes kept in memory for the run-target picker and build validation
+ZIP_INDEX_CACHE_SIZE = 4
+
+# Build-location preflight: a location needs this much free space, and its
+# ranking is reused on the same host for this long
+PROBE_MIN_FREE_BYTES = 512 * 1024 * 1024
+PROBE_CACHE_MAX_AGE_DAYS = 7
+PROBE_TIMEOUT = 10  # seconds
+
+class BuildCancelled(Exception):
+    """Raised inside a running build once cancellation has been requested"""
+    pass
+
+class PyInstallerProgressHandler(logging.Handler):
+    """Turns PyInstaller's log messages into build phases and progress.
+    
+    Also the point where a cancelled build is interrupted: raising from emit()
+    unwinds PyInstaller at its next log call.
+    """
+    
+    # (message prefix, phase name, percent of the PyInstaller run)
+    PHASES = [
+        ("checking Analysis", "Analysis", 5),
+        ("Analyzing ", "Analysis", 10),
+        ("Processing module hooks", "Analysis", 30),
+        ("checking PYZ", "PYZ", 50),
+        ("Building PYZ", "PYZ", 55),
+        ("checking PKG", "PKG", 65),
+        ("Building PKG", "PKG", 70),
+        ("checking EXE", "EXE", 80),
+        ("Building EXE from", "EXE", 85),
+        ("Appending", "EXE", 90),
+    ]
+    
+    def __init__(self, builder, start, end):
+        super().__init__(logging.INFO)
+        self.builder = builder
+        self.start = start
+        self.end = end
+        self.percent = 0
+        self.phase = None
+        self.phase_started = None
+    
+    def emit(self, record):
+        if self.builder.cancel_event.is_set():
+            raise BuildCancelled("Build cancelled")
+        try:
+            message = record.getMessage()
+        except Exception:
             return
         
-        # Start progress
-        self.progress.start()
-        self.status_label.config(text="Creating self-extracting EXE...")
-        self.root.update()
+        phase, percent = None, self.percent
+        if message.startswith("Executing:") and "upx" in message.lower():
+            phase, percent = "UPX", max(self.percent, 75)
+        elif message.startswith("Building EXE from") and message.endswith("completed successfully."):
+            phase, percent = "EXE", 100
+        else:
+            for prefix, name, value in self.PHASES:
+                if message.startswith(prefix):
+                    phase, percent = name, value
+                    break
         
+        if phase and percent >= self.percent:
+            if phase != self.phase:
+                self.finish()
+                self.phase, self.phase_started = phase, time.perf_counter()
+            self.percent = percent
+            self.builder._report(f"PyInstaller: {phase}...",
+                                 self.start + (self.end - self.start) * percent / 100)
+    
+    def finish(self):
+        """Charge the time since the current phase began to the builder's timings"""
+        if self.phase:
+            self.builder._add_timing(f"pyinstaller_{self.phase.lower()}", time.perf_counter() - self.phase_started)
+            self.phase = None
+
+class SFXBuilder:
+    """Builds a self-extracting EXE from a dict of options (see DEFAULT_OPTIONS).
+    
+    Independent of Tk, so it can run on a worker thread. Status text and
+    progress (0-100) are passed to status_callback(text, percent), where
+    percent is None when unchanged.
+    """
+    
+    def __init__(self, options, status_callback=None, cancel_event=None):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options)
+        self.status_callback = status_callback
+        self.cancel_event = cancel_event or threading.Event()
+        self.payload_path = self.options['zip_file'] or None  # None = stream the source folder
+        self.source_infos = None  # Files to pack from source_folder, in payload order
+        self.payload_report = None
+        self.stub_report = None
+        self.delta = None  # Base check and deletion list for a delta package
+        self.delta_report = None
+        self.duplicates = None  # Path -> member holding the same contents
+        self.dedupe_report = None
+        self.hashes = None  # Path -> SHA-256 of every file, when verify_hashes is set
+        self.plan = None  # Extraction plan for the final payload (see make_extraction_plan)
+        self.volumes = []  # Sidecar volume files written next to the EXE
+        self.timings = {}  # Seconds spent in each build phase
+    
+    def _report(self, text, percent=None):
+        if self.status_callback:
+            self.status_callback(text, percent)
+        else:
+            print(text)
+    
+    def _check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise BuildCancelled("Build cancelled")
+    
+    def _add_timing(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0) + seconds
+    
+    @contextmanager
+    def _timed(self, phase):
+        """Add the time spent in the with-block to self.timings[phase]"""
+        started = time.perf_counter()
         try:
-            self._create_extractor()
-            self.progress.stop()
-            self.status_label.config(text="Self-extracting EXE created successfully!")
-            messagebox.showinfo("Success", f"Self-extracting EXE created:\n{self.output_exe_path.get()}")
-        except Exception as e:
-            self.progress.stop()
-            self.status_label.config(text="Error creating EXE")
-            messagebox.showerror("Error", f"Failed to create EXE:\n{str(e)}")
+            yield
+        finally:
+            self._add_timing(phase, time.perf_counter() - started)
+    
+    def validate(self):
+        """Raise ValueError if the options can't produce a build"""
+        unknown = set(self.options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown option(s): {', '.join(sorted(unknown))}")
+        if self.options['zip_file'] and self.options['source_folder']:
+            raise ValueError("Specify either a ZIP file or a source folder, not both")
+        if not self.options['zip_file'] and not self.options['source_folder']:
+            raise ValueError("No ZIP file or source folder specified")
+        if not self.options['output_exe']:
+            raise ValueError("No output EXE path specified")
+        if self.options['zip_file'] and not os.path.exists(self.options['zip_file']):
+            raise ValueError(f"ZIP file does not exist: {self.options['zip_file']}")
+        if self.options['source_folder'] and not os.path.isdir(self.options['source_folder']):
+            raise ValueError(f"Source folder does not exist: {self.options['source_folder']}")
+        if self.options['recompress'] and self.options['recompress'] not in PAYLOAD_CODECS:
+            raise ValueError(f"Unknown codec '{self.options['recompress']}'; "
+                             f"choose one of: {', '.join(PAYLOAD_CODECS)}")
+        self._validate_level()
+        if self.options['cleanup_mode'] not in CLEANUP_MODES:
+            raise ValueError(f"Unknown cleanup mode '{self.options['cleanup_mode']}'; "
+                             f"choose one of: {', '.join(CLEANUP_MODES)}")
+        if not isinstance(self.options['cleanup_retry_delay'], (int, float)) or self.options['cleanup_retry_delay'] < 0:
+            raise ValueError("cleanup_retry_delay must be a number of seconds, 0 or more")
+        for key in ('run_timeout', 'run_log_tail', 'cleanup_retries', 'volume_size_mb'):
+            if not isinstance(self.options[key], int) or self.options[key] < 0:
+                raise ValueError(f"{key} must be a whole number of 0 or more")
+        if self.options['delta_base'] and not os.path.exists(self.options['delta_base']):
+            raise ValueError(f"Delta base does not exist: {self.options['delta_base']}")
+        for key in ('priority_paths', 'include_patterns', 'exclude_patterns'):
+            if not isinstance(self.options[key], list) or not all(isinstance(path, str) for path in self.options[key]):
+                raise ValueError(f"{key} must be a list of paths or globs")
+        if self.options['run_after_extract']:
+            self._validate_run_target()
     
-    def _create_extractor(self):
+    def _validate_level(self):
+        """Check recompress_level against the range of the codec it will be used with"""
+        level = self.options['recompress_level']
+        # Source folders are always compressed, with deflate unless a codec is chosen
+        codec = self.options['recompress'] or ('deflate' if self.options['source_folder'] else None)
+        if level is None or codec is None:
+            return
+        levels = PAYLOAD_CODEC_LEVELS[codec]
+        if levels is None:
+            raise ValueError(f"{codec} has no compression levels; leave recompress_level empty")
+        if not isinstance(level, int) or isinstance(level, bool) or not levels[0] <= level <= levels[1]:
+            raise ValueError(f"recompress_level for {codec} must be a whole number from {levels[0]} to {levels[1]}")
+    
+    def _validate_run_target(self):
+        """Check that run_after_extract names a file in the payload, from the ZIP's central directory alone"""
+        target = self.options['run_after_extract']
+        if self.options['source_folder']:
+            index = ZipIndex([info.filename for info in self._scan_source_folder()])
+            source = "source folder"
+        else:
+            try:
+                index = load_zip_index(self.options['zip_file'])
+            except (OSError, zipfile.BadZipFile) as e:
+                raise ValueError(f"Can't read ZIP file {self.options['zip_file']}: {e}")
+            source = "ZIP file"
+        if index.find(target):
+            return
+        message = f"File to run after extracting is not in the {source}: {target}"
+        similar = index.search(target.replace('\\', '/').rstrip('/').rpartition('/')[2], limit=3)
+        if similar:
+            message += f" (did you mean {' or '.join(similar)}?)"
+        raise ValueError(message)
+    
+    def build(self):
         """Create the self-extracting executable"""
-        # Try different build strategies to avoid antivirus interference
-        strategies = [
-            ("User Temp Directory", self._build_in_user_temp),
-            ("Desktop Directory", self._build_in_desktop),
-            ("Custom Temp Directory", self._build_in_custom_temp)
-        ]
+        os.makedirs(os.path.dirname(os.path.abspath(self.options['output_exe'])), exist_ok=True)
+        try:
+            with tempfile.TemporaryDirectory(prefix="SFX_", suffix="_payload") as payload_dir:
+                if self.options['source_folder']:
+                    self._scan_source_folder()
+                    if self.options['delta_base'] or self.options['dedupe_payload']:
+                        # Both work from a finished ZIP, so pack one first instead of
+                        # streaming the folder into the EXE
+                        self.payload_path = os.path.join(payload_dir, "payload.zip")
+                        with self._timed('compress'), open(self.payload_path, 'wb') as out:
+                            self._pack_source_folder(out)
+                elif self.options['recompress']:
+                    self.payload_path = os.path.join(payload_dir, "payload.zip")
+                    with self._timed('recompress'):
+                        self._recompress_payload(self.options['zip_file'], self.payload_path, payload_dir)
+                
+                if self.options['delta_base']:
+                    delta_path = os.path.join(payload_dir, "delta.zip")
+                    with self._timed('delta'):
+                        self._make_delta_payload(self.options['delta_base'], self.payload_path, delta_path)
+                    self.payload_path = delta_path
+                
+                if self.options['verify_hashes'] and self.payload_path:
+                    with self._timed('hash'):
+                        self._hash_payload(self.payload_path)
+                
+                if self.options['dedupe_payload']:
+                    deduped_path = os.path.join(payload_dir, "deduped.zip")
+                    with self._timed('dedupe'):
+                        if self._dedupe_payload(self.payload_path, deduped_path):
+                            self.payload_path = deduped_path
+                
+                if self.payload_path:
+                    with self._timed('plan'), zipfile.ZipFile(self.payload_path) as zip_ref:
+                        self.plan = make_extraction_plan(zip_ref.infolist())
+                
+                stub_path = None
+                if self.options['use_stub_cache']:
+                    # Compile (or reuse) the generic extractor stub, then append the payload
+                    self._pyinstaller_progress = (0, 80)
+                    stub_path = self._get_cached_stub()
+                if stub_path:
+                    self._report("Appending payload to extractor stub...", 80)
+                    with self._timed('payload_append'):
+                        self._assemble_from_stub(stub_path, self.payload_path, self._get_config(),
+                                                 self.options['output_exe'], progress_range=(80, 100))
+                else:
+                    self._pyinstaller_progress = (0, 90)
+                    self._run_build_strategies()
+            self._report("Self-extracting EXE created successfully!", 100)
+        finally:
+            try:
+                self._evict_build_cache()
+            except Exception as e:
+                print(f"Build cache eviction failed: {e}")
+    
+    def _run_build_strategies(self, stub_path=None):
+        """Run PyInstaller, trying several build locations"""
+        # Try different build strategies to avoid antivirus interference,
+        # best-ranked location first
+        strategies = self._rank_build_strategies()
         
         last_error = None
-        for strategy_name, build_func in strategies:
+        for strategy_name, _, build_func in strategies:
             try:
-                self.status_label.config(text=f"Trying build strategy: {strategy_name}...")
-                self.root.update()
-                build_func()
+                self._report(f"Trying build strategy: {strategy_name}...")
+                build_func(stub_path)
+                self._remember_build_strategy(strategy_name)
                 return  # Success!
+            except BuildCancelled:
+                raise
             except Exception as e:
                 last_error = e
                 print(f"Strategy '{strategy_name}' failed: {e}")
                 continue
         
-        # If all strategies failed, raise the last error
+        # If all strategies failed, probe again next time and raise the last error
+        self._save_build_probes(None)
         raise last_error
     
-    def _build_in_user_temp(self):
-        """Build using user's temp directory"""
-        temp_base = os.path.expanduser("~/AppData/Local/Temp")
-        temp_dir = os.path.join(temp_base, f"SelfExtractingEXE_{os.getpid()}")
-        os.makedirs(temp_dir, exist_ok=True)
+    def _get_build_strategies(self):
+        """Build strategies in their default order, with the folder each one builds under"""
+        return [
+            ("User Temp Directory", os.path.expanduser("~/AppData/Local/Temp"), self._build_in_user_temp),
+            ("Desktop Directory", os.path.join(os.path.expanduser("~"), "Desktop"), self._build_in_desktop),
+            ("Custom Temp Directory", tempfile.gettempdir(), self._build_in_custom_temp)
+        ]
+    
+    def _rank_build_strategies(self):
+        """Order the build strategies best first, probing their folders unless this host has a recent ranking.
+        
+        Strategies whose probe failed are kept at the end as a last resort.
+        """
+        strategies = self._get_build_strategies()
+        names = [name for name, _, _ in strategies]
+        
+        entry = self._load_build_probes()
+        if entry and set(entry['order']) <= set(names):
+            order = entry['order']
+            print(f"Using cached build location ranking: {', '.join(order) or 'none passed'}")
+        else:
+            probes = {}
+            for name, base_dir, _ in strategies:
+                probes[name] = self._probe_build_location(base_dir)
+                print(f"Probed {name} ({base_dir}): "
+                      f"{'ok' if probes[name]['ok'] else 'failed'} in {probes[name]['ms']:.0f} ms "
+                      f"- {probes[name]['detail']}")
+            order = sorted((name for name in names if probes[name]['ok']), key=lambda name: probes[name]['ms'])
+            self._save_build_probes({'probed_at': time.time(), 'order': order, 'probes': probes})
+        
+        ranked = list(order) + [name for name in names if name not in order]
+        return sorted(strategies, key=lambda strategy: ranked.index(strategy[0]))
+    
+    def _probe_build_location(self, base_dir):
+        """Check in a few milliseconds that PyInstaller can work under base_dir"""
+        started = time.perf_counter()
+        probe_dir = None
+        try:
+            if not os.path.isdir(base_dir):
+                raise OSError("folder does not exist")
+            free = shutil.disk_usage(base_dir).free
+            if free < PROBE_MIN_FREE_BYTES:
+                raise OSError(f"only {free // (1024 * 1024)} MB free")
+            probe_dir = tempfile.mkdtemp(prefix="SFX_probe_", dir=base_dir)
+            
+            # Write an EXE, then reopen, rename and delete it at once, like
+            # PyInstaller does with its output. On-access scanners that lock
+            # fresh executables make this fail or stall
+            exe_path = os.path.join(probe_dir, "probe.exe")
+            with open(exe_path, 'wb') as f:
+                f.write(b'MZ' + bytes(64 * 1024))
+            with open(exe_path, 'r+b') as f:
+                f.write(b'MZ')
+            os.replace(exe_path, exe_path + '.old')
+            os.remove(exe_path + '.old')
+            scan_ms = (time.perf_counter() - started) * 1000
+            
+            # Run a trivial script to catch no-exec mounts and execution policies
+            if sys.platform == 'win32':
+                script = os.path.join(probe_dir, "probe.cmd")
+                with open(script, 'w') as f:
+                    f.write("@exit /b 0\n")
+                command = ['cmd', '/c', script]
+            else:
+                script = os.path.join(probe_dir, "probe.sh")
+                with open(script, 'w') as f:
+                    f.write("#!/bin/sh\nexit 0\n")
+                os.chmod(script, 0o755)
+                command = [script]
+            subprocess.run(command, capture_output=True, timeout=PROBE_TIMEOUT, check=True)
+            
+            return {'ok': True, 'ms': round((time.perf_counter() - started) * 1000, 1),
+                    'detail': f"{free // (1024 * 1024)} MB free, file test {scan_ms:.0f} ms"}
+        except (OSError, subprocess.SubprocessError) as e:
+            return {'ok': False, 'ms': round((time.perf_counter() - started) * 1000, 1), 'detail': str(e)}
+        finally:
+            if probe_dir:
+                shutil.rmtree(probe_dir, ignore_errors=True)
+    
+    def _load_build_probes(self):
+        """This host's cached build location ranking, if it is recent enough"""
+        path = os.path.join(self._get_cache_root(), "build_locations.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f).get(platform.node())
+        except (OSError, ValueError, AttributeError):
+            return None
+        if not entry or time.time() - entry.get('probed_at', 0) > PROBE_CACHE_MAX_AGE_DAYS * 86400:
+            return None
+        return entry
+    
+    def _save_build_probes(self, entry):
+        """Store (or, with None, forget) this host's build location ranking"""
+        path = os.path.join(self._get_cache_root(), "build_locations.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                hosts = json.load(f)
+        except (OSError, ValueError):
+            hosts = {}
+        if entry:
+            hosts[platform.node()] = entry
+        else:
+            hosts.pop(platform.node(), None)
+        
+        # Replace the file atomically; parallel batch jobs may save at the same time
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(hosts, f, indent=2)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: could not save build location ranking: {e}")
+    
+    def _remember_build_strategy(self, name):
+        """Move a strategy that just built successfully to the front of the cached ranking"""
+        entry = self._load_build_probes() or {'probed_at': time.time(), 'order': [], 'probes': {}}
+        if entry['order'][:1] != [name]:
+            entry['order'] = [name] + [other for other in entry['order'] if other != name]
+            self._save_build_probes(entry)
+    
+    def _build_in_user_temp(self, stub_path=None):
+        """Build using user's temp directory"""
+        temp_base = os.path.expanduser("~/AppData/Local/Temp")
+        temp_dir = os.path.join(temp_base, f"SelfExtractingEXE_{os.getpid()}")
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        try:
+            self._build_in_directory(temp_dir, stub_path)
+        finally:
+            # Clean up
+            try:
+                shutil.rmtree(temp_dir)
+            except:
+                pass
+    
+    def _build_in_desktop(self, stub_path=None):
+        """Build using desktop directory"""
+        desktop = os.path.join(os.path.expanduser("~"), "Desktop")
+        temp_dir = os.path.join(desktop, f"SelfExtractingEXE_Build_{os.getpid()}")
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        try:
+            self._build_in_directory(temp_dir, stub_path)
+        finally:
+            # Clean up
+            try:
+                shutil.rmtree(temp_dir)
+            except:
+                pass
+    
+    def _build_in_custom_temp(self, stub_path=None):
+        """Build using Python's tempfile with custom prefix"""
+        with tempfile.TemporaryDirectory(prefix="SFX_", suffix="_build") as temp_dir:
+            self._build_in_directory(temp_dir, stub_path)
+    
+    def _build_in_directory(self, temp_dir, stub_path=None):
+        """Build the extractor in the specified directory.
+        
+        PyInstaller only ever compiles the payload-independent extractor stub.
+        With stub_path it is moved there for reuse; otherwise the payload is
+        appended to it straight away to produce the output EXE.
+        """
+        work_entry = os.path.join(self._get_cache_root(), "work", self._get_work_key())
+        with self._locked_cache_entry(work_entry) as cache_dir:
+            # The script must keep the same path (and mtime) between builds for
+            # PyInstaller to reuse its cached analysis
+            script_dir = cache_dir or temp_dir
+            script_path = os.path.join(script_dir, "extractor.py")
+            if not os.path.exists(script_path):
+                with self._timed('script_generation'), open(script_path, 'w', encoding='utf-8') as f:
+                    f.write(self._generate_extractor_script())
+            
+            # Build into a private dist folder under a fixed name, then move the
+            # result into place, so a half-written EXE is never picked up
+            dist_dir = os.path.join(temp_dir, 'dist')
+            exe_name = 'extractor.exe' if sys.platform == 'win32' else 'extractor'
+            self._build_with_pyinstaller(temp_dir, script_path, dist_dir, cache_dir=cache_dir)
+            built_path = os.path.join(dist_dir, exe_name)
+        
+        if stub_path:
+            os.makedirs(os.path.dirname(stub_path), exist_ok=True)
+            os.replace(built_path, stub_path)
+            return
+        
+        self.stub_report = self._measure_stub(built_path)
+        self._report(format_stub_report(self.stub_report))
+        
+        self._report("Appending payload to extractor...", 90)
+        with self._timed('payload_append'):
+            self._assemble_from_stub(built_path, self.payload_path, self._get_config(),
+                                     self.options['output_exe'], progress_range=(90, 100))
+    
+    def _get_config(self):
+        """Collect the runtime configuration embedded in the generated EXE"""
+        return {
+            'extract_folder': self.options['extract_folder'],
+            'run_after_extract': self.options['run_after_extract'],
+            'delete_after_run': self.options['delete_after_run'],
+            'show_console': self.options['show_console'],
+            'require_admin': self.options['require_admin'],
+            'inherit_admin': self.options['inherit_admin'],
+            'extract_workers': self.options['extract_workers'],
+            'incremental_extract': self.options['incremental_extract'],
+            'remove_stale_files': self.options['remove_stale_files'],
+            'run_timeout': self.options['run_timeout'],
+            'run_log': self.options['run_log'],
+            'run_log_tail': self.options['run_log_tail'],
+            'telemetry_file': self.options['telemetry_file'],
+            'telemetry_url': self.options['telemetry_url'],
+            'delta': self.delta,
+            'launch_early': self.options['launch_early'],
+            'priority_paths': self.options['priority_paths'],
+            'cleanup_mode': self.options['cleanup_mode'],
+            'cleanup_retries': self.options['cleanup_retries'],
+            'cleanup_retry_delay': self.options['cleanup_retry_delay']
+        }
+    
+    def _get_cache_root(self):
+        """Per-user cache directory for build artifacts"""
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(base, "Xip2exe")
+    
+    def _get_pyinstaller_version(self):
+        try:
+            from importlib.metadata import version
+            return version('pyinstaller')
+        except Exception:
+            return 'unknown'
+    
+    def _get_work_key(self):
+        """Hash every input that affects PyInstaller's analysis of the extractor script"""
+        h = hashlib.sha256()
+        h.update(self._generate_extractor_script().encode('utf-8'))
+        h.update(sys.version.encode('utf-8'))
+        h.update(self._get_pyinstaller_version().encode('utf-8'))
+        h.update(b'console' if self.options['show_console'] else b'windowed')
+        h.update(b'admin' if self.options['require_admin'] else b'user')
+        if self.options['upx_enabled']:
+            h.update(b'upx:' + os.path.abspath(self.options['upx_dir']).encode('utf-8'))
+        if self.options['recompress'] == 'zstd':
+            h.update(b'zstandard')  # Bundled as a hidden import
+        if self.options['slim_stub']:
+            h.update(b'slim:' + ','.join(SLIM_EXCLUDES).encode('utf-8'))
+        return h.hexdigest()[:16]
+    
+    def _get_stub_key(self):
+        """Hash every input that changes the compiled stub (but not the payload)"""
+        h = hashlib.sha256(self._get_work_key().encode('utf-8'))
+        icon = self.options['icon_file']
+        if icon and os.path.exists(icon):
+            with open(icon, 'rb') as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        return h.hexdigest()[:16]
+    
+    @contextmanager
+    def _locked_cache_entry(self, entry_dir, is_dir=True):
+        """Take exclusive use of a build cache entry.
+        
+        Yields the entry path, or None if another build holds it for too
+        long, in which case the caller should build without the cache.
+        Entries that are single files (stubs) are not created here.
+        """
+        os.makedirs(entry_dir if is_dir else os.path.dirname(entry_dir), exist_ok=True)
+        lock_path = entry_dir + '.lock'
+        deadline = time.time() + CACHE_LOCK_TIMEOUT
+        locked = False
+        while not locked:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                os.close(fd)
+                locked = True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > CACHE_LOCK_TIMEOUT:
+                        os.remove(lock_path)  # Left behind by a crashed build
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    break
+                time.sleep(0.5)
+        
+        if not locked:
+            yield None
+            return
+        
+        # Keep the lock fresh while it's held, so a slow build isn't mistaken for a crashed one
+        released = threading.Event()
+        
+        def heartbeat():
+            while not released.wait(CACHE_LOCK_HEARTBEAT):
+                try:
+                    os.utime(lock_path)
+                except OSError:
+                    pass
+        
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            if os.path.exists(entry_dir):
+                os.utime(entry_dir)  # Mark as recently used for eviction
+            yield entry_dir
+        finally:
+            released.set()
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+    
+    def _get_path_size(self, path):
+        if os.path.isfile(path):
+            return os.path.getsize(path)
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
+    
+    def _evict_build_cache(self, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+        """Remove cache entries unused for max_age_days, then the least recently
+        used ones until the cache fits in max_bytes"""
+        entries = []
+        for subdir in ("work", "stubs"):
+            parent = os.path.join(self._get_cache_root(), subdir)
+            if not os.path.isdir(parent):
+                continue
+            for name in os.listdir(parent):
+                path = os.path.join(parent, name)
+                if name.endswith(('.lock', '.json')) or os.path.exists(path + '.lock'):
+                    continue  # In use by a running build, or a stub's report sidecar
+                try:
+                    entries.append((os.path.getmtime(path), self._get_path_size(path), path))
+                except OSError:
+                    continue
+        
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age_days * 86400
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= max_bytes:
+                break
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                    if os.path.exists(path + '.json'):
+                        os.remove(path + '.json')
+                total -= size
+            except OSError:
+                pass
+    
+    def _get_cached_stub(self):
+        """Return the path of a compiled extractor stub, building it on a cache miss.
+        
+        Returns None if another build holds the stub for too long; the caller
+        then builds without the cache.
+        """
+        exe_suffix = '.exe' if sys.platform == 'win32' else ''
+        stub_path = os.path.join(self._get_cache_root(), "stubs", f"stub-{self._get_stub_key()}{exe_suffix}")
+        # Parallel builds with the same options wait here for the first one's stub
+        with self._locked_cache_entry(stub_path, is_dir=False) as entry:
+            if entry is None:
+                self._report("Extractor stub cache is busy; building without it...")
+                return None
+            if os.path.isfile(stub_path):
+                self._report("Using cached extractor stub...")
+            else:
+                self._report("Compiling extractor stub (first build with these options)...", 0)
+                self._run_build_strategies(stub_path)
+                with open(stub_path + '.json', 'w', encoding='utf-8') as f:
+                    json.dump(self._measure_stub(stub_path), f, indent=2)
+        
+        self.stub_report = self._read_stub_report(stub_path)
+        if self.stub_report:
+            self._report(format_stub_report(self.stub_report))
+        return stub_path
+    
+    def _measure_stub(self, stub_path):
+        """Size and cold-start time of a freshly built stub"""
+        return {'stub_size': os.path.getsize(stub_path), 'slim': bool(self.options['slim_stub']),
+                'startup_ms': self._measure_startup(stub_path)}
+    
+    def _read_stub_report(self, stub_path):
+        """Report saved next to a cached stub when it was built"""
+        try:
+            with open(stub_path + '.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _measure_startup(self, exe_path, runs=3):
+        """Best-of-N wall time, in ms, for the stub to start and exit, or None if it can't run here"""
+        env = dict(os.environ, XIP2EXE_STARTUP_PROBE='1')
+        best = None
+        for _ in range(runs):
+            started = time.perf_counter()
+            try:
+                result = subprocess.run([exe_path], env=env, capture_output=True, timeout=60)
+            except (OSError, subprocess.SubprocessError):
+                return None
+            if result.returncode != 0:
+                return None
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return round(best, 1)
+    
+    def _recompress_payload(self, source_path, dest_path, work_dir):
+        """Repack the payload with the configured codec, compressing members in parallel.
+        
+        Each batch of members is compressed on a worker thread into its own part
+        file of raw ZIP entries (zlib, bz2, lzma and zstd all release the GIL);
+        the parts are then concatenated and given a fresh central directory.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        codec = self.options['recompress']
+        method, default_level = PAYLOAD_CODECS[codec]
+        level = self.options['recompress_level']
+        if level is None:
+            level = default_level
+        make_compressor(method, level)  # Fail early if the codec is unavailable
+        
+        with zipfile.ZipFile(source_path) as src:
+            infos = src.infolist()
+        batches = plan_recompress_batches(infos)
+        
+        self._report(f"Recompressing payload with {codec} ({len(infos)} members)...")
+        started = time.time()
+        done = [0]
+        done_lock = threading.Lock()
+        
+        def compress_batch(index, batch):
+            part_path = os.path.join(work_dir, f"part{index:05d}.bin")
+            entries = []
+            with zipfile.ZipFile(source_path) as src, open(part_path, 'wb') as part:
+                for info in batch:
+                    self._check_cancelled()
+                    entries.append(write_zip_entry(part, info, src, method, level))
+            with done_lock:
+                done[0] += len(batch)
+                self._report(f"Recompressing payload with {codec} ({done[0]}/{len(infos)} members)...")
+            return part_path, entries
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            parts = list(pool.map(compress_batch, range(len(batches)), batches))
+        
+        with open(dest_path, 'wb') as out:
+            entries = []
+            for part_path, part_entries in parts:
+                base = out.tell()
+                with open(part_path, 'rb', buffering=0) as part:
+                    self._copy_stream(part, out)
+                os.remove(part_path)
+                for entry in part_entries:
+                    entry.header_offset += base
+                    entries.append(entry)
+            write_zip_central_directory(out, entries)
+        
+        self.payload_report = measure_payload(source_path, dest_path)
+        self.payload_report.update({'codec': codec, 'level': level,
+                                    'seconds': round(time.time() - started, 2)})
+        self._report(format_payload_report(self.payload_report))
+    
+    def _scan_source_folder(self):
+        """The files to pack from source_folder, scanned once per build"""
+        if self.source_infos is None:
+            self._report("Scanning source folder...")
+            self.source_infos = scan_source_folder(self.options['source_folder'], self.options['include_patterns'],
+                                                   self.options['exclude_patterns'])
+            if not any(not info.is_dir() for info in self.source_infos):
+                raise ValueError(f"No files to pack in source folder: {self.options['source_folder']}")
+        return self.source_infos
+    
+    def _pack_source_folder(self, out, progress=None):
+        """Compress the source folder as ZIP entries on worker threads, writing them to out in order.
+        
+        Each batch of small files is compressed into its own in-memory buffer,
+        and only a couple of batches per thread run ahead of the one being
+        written. A big member is its own batch and is compressed straight into
+        out when its turn comes, with its sizes in a data descriptor, so the ZIP
+        is never written elsewhere, whole or in part. out only needs write() and
+        tell(). Hashes the files for verify_hashes while reading them.
+        progress(bytes) gets the source bytes done so far.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        codec = self.options['recompress'] or 'deflate'
+        method, default_level = PAYLOAD_CODECS[codec]
+        level = self.options['recompress_level']
+        if level is None:
+            level = default_level
+        make_compressor(method, level)  # Fail early if the codec is unavailable
+        
+        infos = self._scan_source_folder()
+        batches = plan_recompress_batches(infos)
+        hashes = None
+        if self.options['verify_hashes'] and self.payload_path is None:
+            # Streaming straight into the EXE, so this is the only time the files are read
+            hashes = self.hashes = {}
+        source = FolderSource(self.options['source_folder'], hashes)
+        source_bytes = sum(info.file_size for info in infos)
+        self._report(f"Compressing source folder with {codec} ({len(infos)} members)...")
+        started = time.time()
+        
+        def compress_batch(batch):
+            part = io.BytesIO()
+            entries = []
+            for info in batch:
+                self._check_cancelled()
+                entries.append(write_zip_entry(part, info, source, method, level))
+            part.seek(0)
+            return part, entries
+        
+        workers = os.cpu_count() or 1
+        pending = collections.deque()
+        remaining = iter(batches)
+        entries = []
+        done_files = done_bytes = 0
+        
+        def queue_batches(count):
+            for batch in itertools.islice(remaining, count):
+                big = len(batch) == 1 and batch[0].file_size >= RECOMPRESS_BATCH_BYTES
+                pending.append((batch, None if big else pool.submit(compress_batch, batch)))
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                queue_batches(2 * workers)
+                while pending:
+                    batch, future = pending.popleft()
+                    if future is None:
+                        # The workers carry on with the batches behind it meanwhile
+                        queue_batches(1)
+                        self._check_cancelled()
+                        entries.append(write_zip_entry(out, batch[0], source, method, level, descriptor=True))
+                    else:
+                        part, part_entries = future.result()
+                        queue_batches(1)
+                        base = out.tell()
+                        self._copy_stream(part, out)
+                        for entry in part_entries:
+                            entry.header_offset += base
+                            entries.append(entry)
+                    done_files += len(batch)
+                    done_bytes += sum(info.file_size for info in batch)
+                    if progress:
+                        progress(done_bytes)
+                    else:
+                        self._report(f"Compressing source folder with {codec} ({done_files}/{len(infos)} members)...")
+            finally:
+                for _, future in pending:
+                    if future:
+                        future.cancel()
+        write_zip_central_directory(out, entries)
+        if self.payload_path is None:
+            self.plan = make_extraction_plan(entries)
+        
+        self.payload_report = {'original_size': source_bytes, 'payload_size': out.tell(),
+                               'uncompressed_size': source_bytes, 'members': len(infos), 'codec': codec,
+                               'level': level, 'seconds': round(time.time() - started, 2)}
+        self._report(format_payload_report(self.payload_report))
+    
+    def _make_delta_payload(self, base_path, src, dest):
+        """Write the members of src that are new or changed since the base release to dest.
+        
+        Compressed data is copied as-is. Sets self.delta to what the extractor
+        needs: the size and CRC32 of every unchanged file, which it checks on
+        the installed copy first, and the files to delete.
+        """
+        self._report("Comparing with the previous release...")
+        base = load_release_manifest(base_path)
+        unchanged = {}
+        deleted = set(base)
+        added = changed = 0
+        with open(src, 'rb') as fp, zipfile.ZipFile(fp) as zip_ref, open(dest, 'wb') as out:
+            entries = []
+            for info in zip_ref.infolist():
+                self._check_cancelled()
+                if info.is_dir():
+                    entries.append(copy_zip_entry(out, fp, info))
+                    continue
+                deleted.discard(info.filename)
+                previous = base.get(info.filename)
+                if previous == [info.file_size, info.CRC]:
+                    unchanged[info.filename] = previous
+                    continue
+                if previous:
+                    changed += 1
+                else:
+                    added += 1
+                entries.append(copy_zip_entry(out, fp, info))
+            write_zip_central_directory(out, entries)
+        
+        self.delta = {'base': unchanged, 'delete': sorted(deleted)}
+        self.delta_report = {'added': added, 'changed': changed, 'deleted': len(deleted),
+                             'unchanged': len(unchanged), 'full_bytes': os.path.getsize(src),
+                             'delta_bytes': os.path.getsize(dest)}
+        self._report(f"Delta package: {added} added, {changed} changed, {len(deleted)} deleted, "
+                     f"{len(unchanged)} unchanged ({self.delta_report['delta_bytes'] / (1024 * 1024):.1f} MB "
+                     f"instead of {self.delta_report['full_bytes'] / (1024 * 1024):.1f} MB)")
+    
+    def _hash_payload(self, src):
+        """Set self.hashes to the SHA-256 of every file in src, hashing batches on worker threads.
+        
+        hashlib and zlib release the GIL, so each thread reads through its own
+        handle. The extractor checks each file against these as it writes it.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with zipfile.ZipFile(src) as zip_ref:
+            infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        batches = plan_recompress_batches(infos)
+        self._report(f"Hashing {len(infos)} file(s) for verification...")
+        
+        def hash_batch(batch):
+            hashes = {}
+            with zipfile.ZipFile(src) as zip_ref:
+                for info in batch:
+                    self._check_cancelled()
+                    digest = hashlib.sha256()
+                    for chunk in iter_member_data(zip_ref, info):
+                        digest.update(chunk)
+                    hashes[info.filename] = digest.hexdigest()
+            return hashes
+        
+        self.hashes = {}
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+            for hashes in pool.map(hash_batch, batches):
+                self.hashes.update(hashes)
+    
+    def _dedupe_payload(self, src, dest):
+        """Write src to dest with each distinct file's contents stored only once.
+        
+        Only members with the same size and CRC32 can be identical, so only
+        those are hashed (SHA-256) to confirm it, unless _hash_payload already
+        hashed everything. Sets self.duplicates to the
+        path -> stored member index. Returns False, writing nothing, if there
+        are no duplicates.
+        """
+        self._report("Looking for duplicate files...")
+        with open(src, 'rb') as fp, zipfile.ZipFile(fp) as zip_ref:
+            infos = zip_ref.infolist()
+            candidates = {}
+            for info in infos:
+                if not info.is_dir() and info.file_size:
+                    candidates.setdefault((info.file_size, info.CRC), []).append(info)
+            
+            duplicates = {}
+            for group in candidates.values():
+                if len(group) < 2:
+                    continue
+                stored = {}
+                for info in group:
+                    self._check_cancelled()
+                    if self.hashes:
+                        key = self.hashes[info.filename]
+                    else:
+                        digest = hashlib.sha256()
+                        for chunk in iter_member_data(zip_ref, info):
+                            digest.update(chunk)
+                        key = digest.hexdigest()
+                    if key in stored:
+                        duplicates[info.filename] = stored[key]
+                    else:
+                        stored[key] = info.filename
+            
+            if not duplicates:
+                self._report("No duplicate files found")
+                return False
+            
+            with open(dest, 'wb') as out:
+                entries = [copy_zip_entry(out, fp, info) for info in infos if info.filename not in duplicates]
+                write_zip_central_directory(out, entries)
+        
+        by_name = {info.filename: info for info in infos}
+        self.duplicates = duplicates
+        self.dedupe_report = {'duplicates': len(duplicates),
+                              'saved_bytes': sum(by_name[name].compress_size for name in duplicates),
+                              'saved_write_bytes': sum(by_name[name].file_size for name in duplicates)}
+        self._report(f"Stored {len(duplicates)} duplicate file(s) once, saving "
+                     f"{self.dedupe_report['saved_bytes'] / (1024 * 1024):.1f} MB of payload and "
+                     f"{self.dedupe_report['saved_write_bytes'] / (1024 * 1024):.1f} MB of extraction writes")
+        return True
+    
+    def _copy_stream(self, src, dst, progress=None, limit=None):
+        """Copy src to dst in large sequential chunks through one reusable buffer.
+        
+        Stops after limit bytes, if given. Returns the number of bytes copied;
+        the data is never held in memory whole.
+        """
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        copied = 0
+        while limit is None or copied < limit:
+            self._check_cancelled()
+            n = src.readinto(view if limit is None else view[:min(len(buffer), limit - copied)])
+            if not n:
+                break
+            dst.write(view[:n])
+            copied += n
+            if progress:
+                progress(copied)
+        return copied
+    
+    def _assemble_from_stub(self, stub_path, zip_path, config, output_path, progress_range=(0, 100)):
+        """Write stub + payload + config + plan + trailer to output_path.
+        
+        The payload is streamed in large chunks, so this costs little more than a file copy.
+        With zip_path None, the source folder is compressed straight into place instead.
+        A payload bigger than the volume size is split: the EXE carries the first
+        volume and the rest go to output.001, output.002... next to it, listed in
+        the config.
+        """
+        stub_size = os.path.getsize(stub_path)
+        if zip_path:
+            total = payload_bound = max(1, os.path.getsize(zip_path))
+        else:
+            # Members that don't shrink are stored, so the files plus their
+            # headers are as big as the payload can get
+            total = max(1, sum(info.file_size for info in self.source_infos))
+            payload_bound = total + sum(2 * len(info.filename.encode('utf-8')) + 200 for info in self.source_infos)
+        volume_size = self.options['volume_size_mb'] * 1024 * 1024
+        if not volume_size and stub_size + payload_bound + 64 * 1024 * 1024 > MAX_EXE_SIZE:
+            volume_size = DEFAULT_VOLUME_SIZE
+            self._report(f"The payload is too big for one EXE; splitting it into "
+                         f"{DEFAULT_VOLUME_SIZE // (1024 * 1024)} MB volumes")
+        
+        # Find PyInstaller's cookie at the end of the stub
+        with open(stub_path, 'rb') as f:
+            f.seek(max(0, stub_size - 4096))
+            tail = f.read()
+        cookie_index = tail.rfind(PYI_COOKIE_MAGIC)
+        cookie = None
+        if cookie_index >= 0 and cookie_index + PYI_COOKIE.size <= len(tail):
+            cookie = list(PYI_COOKIE.unpack_from(tail, cookie_index))
+            cookie_pos = stub_size - len(tail) + cookie_index
+            archive_start = cookie_pos + PYI_COOKIE.size - cookie[1]
+        
+        partial_path = output_path + '.partial'
+        writer = None
+        try:
+            with open(partial_path, 'wb') as out:
+                with open(stub_path, 'rb', buffering=0) as f:
+                    self._copy_stream(f, out)
+                
+                start, end = progress_range
+                
+                def progress(copied):
+                    self._report("Appending payload...", start + (end - start) * min(copied, total) / total)
+                
+                payload_offset = out.tell()
+                writer = VolumeWriter(out, os.path.splitext(output_path)[0], volume_size)
+                try:
+                    if zip_path:
+                        with open(zip_path, 'rb', buffering=0) as payload:
+                            self._copy_stream(payload, writer, progress)
+                    else:
+                        self._pack_source_folder(writer, progress)
+                finally:
+                    writer.close()
+                if writer.paths:
+                    config = dict(config, volumes=[[os.path.basename(path), size]
+                                                   for path, size in zip(writer.paths, writer.sizes)])
+                config_bytes = json.dumps(config, separators=(',', ':')).encode('utf-8')
+                
+                plan_bytes = pack_extraction_plan(self.plan, self.hashes, self.duplicates)
+                
+                config_offset = out.tell()
+                out.write(config_bytes)
+                out.write(plan_bytes)
+                out.write(STUB_TRAILER.pack(STUB_MAGIC, payload_offset, writer.first_size,
+                                            config_offset, len(config_bytes),
+                                            config_offset + len(config_bytes), len(plan_bytes)))
+                
+                # Re-append the cookie with the package length stretched over our data;
+                # otherwise the bootloader has to scan back through the whole payload
+                if cookie is not None:
+                    new_length = out.tell() + PYI_COOKIE.size - archive_start
+                    if new_length <= 0xFFFFFFFF:
+                        cookie[1] = new_length
+                        out.write(PYI_COOKIE.pack(*cookie))
+            
+            for path in writer.paths:
+                os.replace(path + '.partial', path)
+            os.replace(partial_path, output_path)
+        except BaseException:
+            for path in [partial_path] + [path + '.partial' for path in (writer.paths if writer else [])]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+        
+        # Volumes left over from an earlier, bigger build of the same EXE
+        volume_paths = writer.paths
+        index = len(volume_paths) + 1
+        stale = f"{os.path.splitext(output_path)[0]}.{index:03d}"
+        while os.path.isfile(stale):
+            os.remove(stale)
+            index += 1
+            stale = f"{os.path.splitext(output_path)[0]}.{index:03d}"
+        
+        self.volumes = volume_paths
+        if volume_paths:
+            self._report(f"Payload split into the EXE and {len(volume_paths)} volume file(s); "
+                         f"keep them next to {os.path.basename(output_path)}")
+    
+    def _generate_extractor_script(self):
+        """Generate the Python script that will be embedded in the EXE"""
+        return '''#!/usr/bin/env python3
+"""
+Self-Extracting Archive
+This script extracts embedded files and optionally runs a program.
+"""
+
+import os
+import sys
+import zipfile
+import zlib
+import hashlib
+import importlib
+import json
+import struct
+import time
+import threading
+from contextlib import contextmanager
+
+# Kept to what extraction itself needs: subprocess, shutil and the GUI toolkit
+# are imported only where they're used, so a slim build can leave Tcl/Tk out
+
+# When this script started running, for the startup timings in telemetry
+SCRIPT_STARTED_AT = time.time()
+
+# Trailer written by the builder after the appended payload, config and plan
+STUB_MAGIC = b'XIP2EXE\\x00'
+STUB_TRAILER = struct.Struct('<8sQQQQQQ')
+
+# Header and member records of the plan blob (see unpack_extraction_plan)
+PLAN_MAGIC = b'XPLN'
+PLAN_HEADER = struct.Struct('<4sBQQIIII')
+PLAN_MEMBER = struct.Struct('<QQQHL')
+
+class PayloadSegment:
+    """Read-only, seekable window onto a byte range of a file"""
+    
+    def __init__(self, path, offset, size):
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+    
+    def seekable(self):
+        return True
+    
+    def readable(self):
+        return True
+    
+    def tell(self):
+        return self._pos
+    
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self._pos
+        elif whence == 2:
+            pos += self._size
+        self._pos = max(0, pos)
+        return self._pos
+    
+    def read(self, n=-1):
+        remaining = self._size - self._pos
+        if n is None or n < 0 or n > remaining:
+            n = remaining
+        if n <= 0:
+            return b''
+        self._file.seek(self._offset + self._pos)
+        data = self._file.read(n)
+        self._pos += len(data)
+        return data
+    
+    def close(self):
+        self._file.close()
+
+class PayloadVolumes:
+    """A payload split across volumes, memory-mapped and read as one stream.
+    
+    segments lists (path, offset, size) for each volume in order. Every
+    volume is mapped once and shared by all readers from open(); data is only
+    paged in as it is read, and members may run across volume boundaries.
+    """
+    
+    def __init__(self, segments):
+        import mmap
+        self.maps = []
+        self.starts = []
+        self.size = 0
+        try:
+            for path, offset, size in segments:
+                if not os.path.isfile(path):
+                    raise Exception(f"Missing payload volume {os.path.basename(path)}: keep all the "
+                                    f"volume files next to {os.path.basename(segments[0][0])}")
+                if os.path.getsize(path) < offset + size:
+                    raise Exception(f"Payload volume {os.path.basename(path)} is incomplete")
+                with open(path, 'rb') as f:
+                    self.maps.append((mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), offset, size))
+                self.starts.append(self.size)
+                self.size += size
+        except BaseException:
+            self.close()
+            raise
+    
+    def open(self):
+        return VolumeReader(self)
+    
+    def close(self):
+        for volume, _, _ in self.maps:
+            volume.close()
+        self.maps = []
+
+class VolumeReader(PayloadSegment):
+    """Read-only, seekable stream over PayloadVolumes, with its own position"""
+    
+    def __init__(self, volumes):
+        self._volumes = volumes
+        self._size = volumes.size
+        self._pos = 0
+    
+    def read(self, n=-1):
+        import bisect
+        remaining = self._size - self._pos
+        if n is None or n < 0 or n > remaining:
+            n = remaining
+        parts = []
+        while n > 0:
+            index = bisect.bisect_right(self._volumes.starts, self._pos) - 1
+            volume, offset, size = self._volumes.maps[index]
+            start = offset + self._pos - self._volumes.starts[index]
+            take = min(n, size - (self._pos - self._volumes.starts[index]))
+            parts.append(volume[start:start + take])
+            self._pos += take
+            n -= take
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+    
+    def close(self):
+        pass
+
+def find_appended_payload(exe_path=None):
+    """Locate the payload appended by a prebuilt-stub build.
+    
+    Returns (exe_path, payload_offset, payload_size, config_offset, config_size,
+    plan_offset, plan_size), or None if the EXE has no payload appended.
+    """
+    if exe_path is None:
+        if not getattr(sys, 'frozen', False):
+            return None
+        exe_path = sys.executable
+    try:
+        with open(exe_path, 'rb') as f:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(max(0, size - 4096))
+            tail = f.read()
+    except OSError:
+        return None
+    index = tail.rfind(STUB_MAGIC)
+    if index < 0 or index + STUB_TRAILER.size > len(tail):
+        return None
+    _, *offsets = STUB_TRAILER.unpack_from(tail, index)
+    return (exe_path, *offsets)
+
+def unpack_extraction_plan(data):
+    """Read the blob the builder appends after the config.
+    
+    Returns (plan, hashes, duplicates), each None if the build didn't record it.
+    """
+    magic, has_plan, total_size, largest_file, member_count, directory_count, hash_count, duplicate_count = \\
+        PLAN_HEADER.unpack_from(data)
+    if magic != PLAN_MAGIC:
+        raise Exception("The extraction plan is damaged")
+    body = zlib.decompress(data[PLAN_HEADER.size:])
+    digests_start = member_count * PLAN_MEMBER.size
+    names_start = digests_start + hash_count * 32
+    names = body[names_start:].decode('utf-8').split('\\0') if names_start < len(body) else []
+    member_names = names[:member_count]
+    directories = names[member_count:member_count + directory_count]
+    hash_names = names[member_count + directory_count:member_count + directory_count + hash_count]
+    duplicate_names = names[len(names) - 2 * duplicate_count:len(names) - duplicate_count]
+    duplicate_sources = names[len(names) - duplicate_count:]
+    plan = None
+    if has_plan:
+        plan = {'total_size': total_size, 'largest_file': largest_file, 'directories': directories,
+                'members': [[name, *record] for name, record in
+                            zip(member_names, PLAN_MEMBER.iter_unpack(body[:digests_start]))]}
+    hashes = {name: body[digests_start + 32 * i:digests_start + 32 * (i + 1)].hex()
+              for i, name in enumerate(hash_names)} or None
+    duplicates = dict(zip(duplicate_names, duplicate_sources)) or None
+    return plan, hashes, duplicates
+
+# Members at least this large get a batch of their own; smaller ones are grouped
+# so thread hand-off doesn't dominate for payloads of many tiny files
+LARGE_MEMBER_SIZE = 8 * 1024 * 1024
+MAX_BATCH_FILES = 256
+WRITE_CHUNK_SIZE = 1024 * 1024
+COMPRESSED_CHUNK_SIZE = 256 * 1024
+
+# Files at least this large have their space reserved before they're written
+PREALLOCATE_MIN_SIZE = 1024 * 1024
+
+# Zstandard's method id in the ZIP specification
+ZIP_ZSTANDARD = 93
+
+# Written into the extract folder by incremental extraction
+EXTRACTION_MANIFEST = '.xip2exe_manifest.json'
+
+# Verified extraction writes each file under this suffix until all have passed
+PARTIAL_SUFFIX = '.xip2exe-partial'
+
+def member_target(extract_path, filename):
+    """Map a ZIP member name to a path under extract_path, sanitized like ZipFile.extract()"""
+    arcname = filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x not in invalid)
+    if os.path.sep == '\\\\':
+        # Characters Windows doesn't allow in file names, and trailing dots
+        table = str.maketrans(':<>|"?*', '_______')
+        arcname = os.path.sep.join(x.translate(table).rstrip('.') for x in arcname.split(os.path.sep))
+        arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x)
+    return os.path.join(extract_path, arcname)
+
+def member_decompressor(compress_type):
+    """Streaming decompressor for a ZIP compression method; None for stored members"""
+    if compress_type == zipfile.ZIP_STORED:
+        return None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        return zlib.decompressobj(-15)
+    if compress_type == zipfile.ZIP_BZIP2:
+        return importlib.import_module('bz2').BZ2Decompressor()
+    if compress_type == zipfile.ZIP_LZMA:
+        return zipfile.LZMADecompressor()
+    if compress_type == ZIP_ZSTANDARD:
+        # Imported by name so PyInstaller only bundles it when the builder asks for it
+        return importlib.import_module('zstandard').ZstdDecompressor().decompressobj()
+    raise NotImplementedError(f"Unsupported compression method {compress_type}")
+
+def copy_raw_member(fp, info, dest):
+    """Decompress a member into dest straight from its local header at info.header_offset.
+    
+    Needs no ZipFile, so it also handles Zstandard (ZIP method 93), which
+    zipfile can't open. The size and CRC-32 are checked against info.
+    """
+    if info.flag_bits & 0x1:
+        raise NotImplementedError(f"Encrypted ZIP members are not supported: {info.filename}")
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    if header[:4] != b'PK\\x03\\x04':
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename!r}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    position = info.header_offset + 30 + name_length + extra_length
+    remaining = info.compress_size
+    decompressor = member_decompressor(info.compress_type)
+    # Compressed reads are kept small, since a chunk may expand a lot
+    read_size = WRITE_CHUNK_SIZE if decompressor is None else COMPRESSED_CHUNK_SIZE
+    crc = size = 0
+    while remaining:
+        fp.seek(position)
+        chunk = fp.read(min(read_size, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename!r}")
+        position += len(chunk)
+        remaining -= len(chunk)
+        data = decompressor.decompress(chunk) if decompressor else chunk
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        dest.write(data)
+    if hasattr(decompressor, 'flush'):
+        data = decompressor.flush()
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+        dest.write(data)
+    if crc != info.CRC or size != info.file_size:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+
+def payload_members(open_payload, plan=None):
+    """ZipInfos for the payload's members, from the extraction plan embedded at build time if there is one.
+    
+    Without a plan, the payload's central directory is read instead.
+    """
+    if plan:
+        infos = [zipfile.ZipInfo(directory + '/') for directory in plan['directories']]
+        for name, header_offset, compress_size, file_size, compress_type, crc in plan['members']:
+            info = zipfile.ZipInfo(name)
+            info.header_offset, info.compress_size, info.file_size = header_offset, compress_size, file_size
+            info.compress_type, info.CRC = compress_type, crc
+            infos.append(info)
+        return infos
+    fp = open_payload()
+    try:
+        with zipfile.ZipFile(fp, 'r') as zip_ref:
+            return zip_ref.infolist()
+    finally:
+        fp.close()
+
+def check_free_space(extract_path, files, replacing=True):
+    """Raise before anything is written if the disk can't hold the (info, target) files.
+    
+    With replacing, the space of the existing files being overwritten counts as free.
+    """
+    import shutil
+    needed = sum(info.file_size for info, _ in files)
+    probe = os.path.abspath(extract_path)
+    while not os.path.isdir(probe) and os.path.dirname(probe) != probe:
+        probe = os.path.dirname(probe)
+    try:
+        free = shutil.disk_usage(probe).free
+    except OSError:
+        return
+    if needed <= free:
+        return
+    if replacing:
+        for _, target in files:
+            try:
+                needed -= os.path.getsize(target)
+            except OSError:
+                pass
+    if needed > free:
+        raise Exception(f"Not enough disk space to extract to {extract_path}: "
+                        f"{needed / (1024 * 1024):.1f} MB is needed but only {free / (1024 * 1024):.1f} MB is free")
+
+def preallocate(f, size):
+    """Reserve size bytes for a file about to be written, so it's laid out in one piece; best effort"""
+    try:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+    except OSError:
+        pass
+
+def plan_extraction_batches(files):
+    """Split (info, target) pairs into work batches, largest members first.
+    
+    Big members are scheduled first, each in its own batch, so they overlap with
+    everything else instead of starting last and stalling the pool. The small
+    ones are grouped in the order they're stored in, so each batch reads one
+    stretch of the payload front to back.
+    """
+    large = sorted((item for item in files if item[0].file_size >= LARGE_MEMBER_SIZE),
+                   key=lambda item: item[0].file_size, reverse=True)
+    batches = [[item] for item in large]
+    current, current_size = [], 0
+    for info, target in sorted(files, key=lambda item: item[0].header_offset):
+        if info.file_size >= LARGE_MEMBER_SIZE:
+            continue
+        current.append((info, target))
+        current_size += info.file_size
+        if current_size >= LARGE_MEMBER_SIZE or len(current) >= MAX_BATCH_FILES:
+            batches.append(current)
+            current, current_size = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+def load_extraction_manifest(extract_path):
+    """Member records left by the previous incremental extraction, if any"""
+    try:
+        with open(os.path.join(extract_path, EXTRACTION_MANIFEST), 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+def write_extraction_manifest(extract_path, files):
+    """Record size and CRC32 of each member, plus the size and mtime it has on disk"""
+    entries = {}
+    for info, target in files:
+        try:
+            st = os.stat(target)
+        except OSError:
+            continue
+        entries[info.filename] = [info.file_size, info.CRC, st.st_size, st.st_mtime_ns]
+    manifest_path = os.path.join(extract_path, EXTRACTION_MANIFEST)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': entries}, f, separators=(',', ':'))
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def is_unchanged(entry, info, target):
+    """True if target still holds exactly what this member would write.
+    
+    Size and CRC32 come from the central directory, so nothing is decompressed;
+    the on-disk size and mtime catch files modified since the last run.
+    """
+    if not entry:
+        return False
+    size, crc, disk_size, disk_mtime = entry
+    if size != info.file_size or crc != info.CRC:
+        return False
+    try:
+        st = os.stat(target)
+    except OSError:
+        return False
+    return st.st_size == disk_size and st.st_mtime_ns == disk_mtime
+
+def remove_stale_files(extract_path, previous, current_names):
+    """Delete files a previous extraction wrote that are no longer in the payload"""
+    removed = 0
+    for name in previous:
+        if name in current_names:
+            continue
+        target = member_target(extract_path, name)
+        try:
+            os.remove(target)
+            removed += 1
+        except OSError:
+            continue
+        # Prune directories the removal left empty
+        parent = os.path.dirname(target)
+        while os.path.normcase(parent) != os.path.normcase(extract_path) and parent.startswith(extract_path):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+    return removed
+
+def duplicate_entries(extract_path, infos, duplicates):
+    """(info, target, source target) for each duplicate path, described by the member it copies"""
+    by_name = {info.filename: info for info in infos}
+    entries = []
+    for name, source in sorted(duplicates.items()):
+        info = zipfile.ZipInfo(name, by_name[source].date_time)
+        info.file_size, info.CRC = by_name[source].file_size, by_name[source].CRC
+        entries.append((info, member_target(extract_path, name), member_target(extract_path, source)))
+    return entries
+
+def unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def link_or_copy(source, target):
+    """Hardlink target to source, or copy it where the filesystem can't link; True if linked"""
+    unlink_quietly(target)
+    try:
+        os.link(source, target)
+        return True
+    except OSError:
+        pass
+    with open(source, 'rb') as src, open(target, 'wb') as dest:
+        while True:
+            chunk = src.read(WRITE_CHUNK_SIZE)
+            if not chunk:
+                return False
+            dest.write(chunk)
+
+class IntegrityError(Exception):
+    """An extracted file doesn't match the hash recorded at build time"""
+
+class ExtractionStopped(Exception):
+    """Raised inside extract_payload once its stop event is set"""
+
+class HashingWriter:
+    """Wraps a file opened for writing, hashing (SHA-256) everything written through it"""
+    
+    def __init__(self, dest):
+        self.dest = dest
+        self.digest = hashlib.sha256()
+    
+    def write(self, data):
+        self.digest.update(data)
+        return self.dest.write(data)
+    
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+def extract_payload(open_payload, extract_path, workers=0, incremental=False, remove_stale=False,
+                    duplicates=None, hashes=None, priority=None, on_priority_ready=None, stop=None, plan=None,
+                    progress=None):
+    """Extract every member of the payload using a pool of threads.
+    
+    open_payload() must return a new seekable file object on the payload each
+    time it is called: every worker reads through its own handle, and zlib
+    releases the GIL while decompressing. In incremental mode, members whose
+    size and CRC32 match the manifest of the previous run are skipped.
+    duplicates maps extra paths to the member holding their contents; they are
+    hardlinked to it once it is written.
+    hashes maps members to their SHA-256, checked as each file streams to disk.
+    Files are then written beside their targets and only moved into place once
+    every one has passed; if any fails, they are all removed again and
+    IntegrityError is raised, leaving the folder as it was.
+    priority(name) picks members to extract before all others; once they are
+    in place (verified, with their duplicates linked), on_priority_ready() is
+    called while the rest carries on. Setting the stop event abandons the rest.
+    With the plan embedded at build time, members are read straight from their
+    offsets and the central directory is never parsed. Free space is checked
+    before anything is written. progress() is called on the worker threads
+    after each file is written.
+    Returns a dict of statistics (files, bytes, skipped, removed, linked,
+    stopped).
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    
+    infos = payload_members(open_payload, plan)
+    
+    # Files already in the folder may be hardlinked to each other by an earlier
+    # deduplicated extraction; those are unlinked before being rewritten
+    try:
+        replacing = any(os.scandir(extract_path))
+    except FileNotFoundError:
+        replacing = False
+    
+    # Create the whole directory tree up front, then only write files
+    directories = {extract_path}
+    files = []
+    for info in infos:
+        target = member_target(extract_path, info.filename)
+        if info.is_dir():
+            directories.add(target)
+        else:
+            directories.add(os.path.dirname(target))
+            files.append((info, target))
+    copies = duplicate_entries(extract_path, infos, duplicates or {})
+    for info, target, _ in copies:
+        directories.add(os.path.dirname(target))
+    
+    all_files = files + [(info, target) for info, target, _ in copies]
+    previous = {}
+    if incremental:
+        previous = load_extraction_manifest(extract_path)
+        files = [(info, target) for info, target in files
+                 if not is_unchanged(previous.get(info.filename), info, target)]
+        written = {target for _, target in files}
+        copies = [(info, target, source) for info, target, source in copies
+                  if source in written or not is_unchanged(previous.get(info.filename), info, target)]
+    
+    # Verified extraction keeps the old files until the new ones have passed
+    check_free_space(extract_path, files, replacing=replacing and not hashes)
+    created = [directory for directory in sorted(directories) if not os.path.isdir(directory)]
+    for directory in created:
+        os.makedirs(directory, exist_ok=True)
+    
+    # Priority members (and the members their duplicates copy) go in the first batches
+    first_copies = [copy for copy in copies if priority and priority(copy[0].filename)]
+    sources = {source for _, _, source in first_copies}
+    first_files = [(info, target) for info, target in files
+                   if priority and (priority(info.filename) or target in sources)]
+    first = {target for _, target in first_files}
+    rest_files = [item for item in files if item[1] not in first]
+    first_copy_targets = {target for _, target, _ in first_copies}
+    rest_copies = [copy for copy in copies if copy[1] not in first_copy_targets]
+    first_batches = plan_extraction_batches(first_files)
+    batches = first_batches + plan_extraction_batches(rest_files)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(batches) or 1))
+    uncommitted = files  # Written under PARTIAL_SUFFIX and not yet moved into place
+    
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+    failed = threading.Event()
+    
+    def worker_payload():
+        # With a plan, members are read from a plain handle; otherwise through a ZipFile
+        if not hasattr(local, 'payload'):
+            fp = open_payload()
+            local.payload = fp if plan else zipfile.ZipFile(fp, 'r')
+            with handles_lock:
+                handles.append((local.payload, fp))
+        return local.payload
+    
+    def extract_batch(batch):
+        payload = worker_payload()
+        written = 0
+        for info, target in batch:
+            if failed.is_set() or (stop is not None and stop.is_set()):
+                return written
+            if hashes:
+                path = target + PARTIAL_SUFFIX
+            else:
+                path = target
+                if replacing:
+                    unlink_quietly(target)
+            with open(path, 'wb') as f:
+                if info.file_size >= PREALLOCATE_MIN_SIZE:
+                    preallocate(f, info.file_size)
+                dest = HashingWriter(f) if hashes else f
+                if plan:
+                    copy_raw_member(payload, info, dest)
+                elif info.compress_type == ZIP_ZSTANDARD:
+                    copy_raw_member(payload.fp, info, dest)
+                else:
+                    with payload.open(info) as source:
+                        while True:
+                            chunk = source.read(WRITE_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dest.write(chunk)
+            if hashes and dest.hexdigest() != hashes.get(info.filename):
+                raise IntegrityError(f"{info.filename} is damaged: its contents don't match the "
+                                     f"SHA-256 recorded when the package was built")
+            written += info.file_size
+            if progress:
+                progress()
+        return written
+    
+    total_bytes = 0
+    linked = 0
+    ready = [priority is None]
+    
+    def link(copies):
+        # Duplicates go after the file they share contents with is in place
+        nonlocal linked, total_bytes
+        for _, target, source in copies:
+            if failed.is_set():
+                break
+            if link_or_copy(source, target):
+                linked += 1
+            else:
+                total_bytes += os.path.getsize(target)
+    
+    def priority_ready():
+        nonlocal uncommitted
+        ready[0] = True
+        if hashes:
+            for _, target in first_files:
+                os.replace(target + PARTIAL_SUFFIX, target)
+            uncommitted = rest_files
+        link(first_copies)
+        if on_priority_ready:
+            on_priority_ready()
+    
+    try:
+        if workers == 1:
+            for index, batch in enumerate(batches):
+                if index == len(first_batches) and not ready[0]:
+                    priority_ready()
+                total_bytes += extract_batch(batch)
+        else:
+            # Batches start in order, so the priority ones are taken first
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(extract_batch, batch) for batch in batches]
+                try:
+                    for index, future in enumerate(futures):
+                        if index == len(first_batches) and not ready[0]:
+                            priority_ready()
+                        total_bytes += future.result()
+                except BaseException:
+                    failed.set()
+                    raise
+        if not ready[0]:
+            priority_ready()
+        if stop is not None and stop.is_set():
+            raise ExtractionStopped()
+    except BaseException as e:
+        if hashes:
+            # Roll back: nothing has replaced an existing file yet, apart from
+            # priority files a launched program may already be using
+            for _, target in uncommitted:
+                unlink_quietly(target + PARTIAL_SUFFIX)
+            for directory in reversed(created):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+        if isinstance(e, ExtractionStopped):
+            return {'files': 0, 'bytes': total_bytes, 'skipped': 0, 'removed': 0, 'linked': linked,
+                    'stopped': True}
+        raise
+    finally:
+        for payload, fp in handles:
+            payload.close()
+            fp.close()
+    
+    if hashes:
+        # Renames replace the old directory entries, so earlier hardlinks are broken too
+        for _, target in uncommitted:
+            os.replace(target + PARTIAL_SUFFIX, target)
+    link(rest_copies)
+    
+    removed = 0
+    if incremental:
+        if remove_stale:
+            removed = remove_stale_files(extract_path, previous, {info.filename for info, _ in all_files})
+        write_extraction_manifest(extract_path, all_files)
+    
+    return {
+        'files': len(files) + len(copies),
+        'bytes': total_bytes,
+        'skipped': len(all_files) - len(files) - len(copies),
+        'removed': removed,
+        'linked': linked,
+        'stopped': False,
+    }
+
+def priority_matcher(patterns):
+    """Predicate for member names matching any of patterns: file or folder paths, or globs.
+    
+    Matching ignores case, as Windows does.
+    """
+    import fnmatch
+    patterns = [p.replace('\\\\', '/').strip().strip('/').lower() for p in patterns if p.strip()]
+    
+    def matches(name):
+        name = name.lower()
+        return any(name == p or name.startswith(p + '/') or fnmatch.fnmatchcase(name, p) for p in patterns)
+    return matches
+
+class BackgroundExtraction:
+    """Runs an extraction on its own thread, so the caller can go ahead once the priority files are in place.
+    
+    extract(on_priority_ready, stop) does the extraction (see extract_payload).
+    """
+    
+    def __init__(self, extract):
+        self.ready = threading.Event()
+        self.stop = threading.Event()
+        self.stats = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(extract,))
+        self.thread.start()
+    
+    def _run(self, extract):
+        try:
+            self.stats = extract(self.ready.set, self.stop)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.ready.set()
+    
+    def _raise_error(self):
+        # Each failure is raised once, by whichever of the calls below sees it first
+        error, self.error = self.error, None
+        if error:
+            raise error
+    
+    def wait_ready(self):
+        """Wait until the priority files are in place; raises if the extraction failed first"""
+        self.ready.wait()
+        self._raise_error()
+    
+    def finish(self, stop=False):
+        """Wait for the rest of the extraction, or abandon it with stop=True; returns its statistics"""
+        if stop:
+            self.stop.set()
+        self.thread.join()
+        self._raise_error()
+        return self.stats
+
+def file_crc32(path):
+    """Size and CRC32 of a file on disk"""
+    crc = size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(WRITE_CHUNK_SIZE)
+            if not chunk:
+                return size, crc
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+
+def verify_delta_base(extract_path, base, workers=0):
+    """Check that extract_path holds the release a delta package was built against.
+    
+    base maps each file the delta leaves alone to its [size, crc32]. Files the
+    previous extraction's manifest vouches for are trusted without reading them.
+    Returns a list of (name, problem) for the files that don't match.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    manifest = load_extraction_manifest(extract_path)
+    
+    def check(item):
+        name, (size, crc) = item
+        target = member_target(extract_path, name)
+        entry = manifest.get(name)
+        if entry and entry[:2] == [size, crc]:
+            try:
+                st = os.stat(target)
+                if st.st_size == entry[2] and st.st_mtime_ns == entry[3]:
+                    return None
+            except OSError:
+                pass
+        try:
+            if os.path.getsize(target) != size or file_crc32(target) != (size, crc):
+                return name, "modified"
+        except FileNotFoundError:
+            return name, "missing"
+        except OSError as e:
+            return name, f"unreadable ({e})"
+        return None
+    
+    workers = max(1, min(workers or os.cpu_count() or 1, len(base) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [problem for problem in pool.map(check, sorted(base.items())) if problem]
+
+def apply_delta(open_payload, extract_path, delta, workers=0, duplicates=None, hashes=None,
+                priority=None, on_priority_ready=None, stop=None, plan=None, progress=None):
+    """Update the release installed at extract_path in place from a delta payload.
+    
+    Raises if the installed files aren't the release the delta was built
+    against, before anything is changed. Returns the same statistics as
+    extract_payload, with 'removed' counting deleted files.
+    """
+    mismatched = verify_delta_base(extract_path, delta.get('base', {}), workers)
+    if mismatched:
+        examples = ', '.join(f"{name} ({problem})" for name, problem in mismatched[:5])
+        raise Exception(f"This is an update package for an earlier release, but the files in {extract_path} "
+                        f"don't match that release: {len(mismatched)} file(s) differ, e.g. {examples}. "
+                        f"Install the full package instead.")
+    
+    # Delete first, so a file renamed only in case isn't removed after it's written
+    removed = remove_stale_files(extract_path, delta.get('delete', []), set())
+    stats = extract_payload(open_payload, extract_path, workers, duplicates=duplicates, hashes=hashes,
+                            priority=priority, on_priority_ready=on_priority_ready, stop=stop, plan=plan,
+                            progress=progress)
+    if stats['stopped']:
+        return stats
+    stats['removed'] = removed
+    
+    # Keep the manifest describing the whole release, for incremental runs and the next delta
+    infos = payload_members(open_payload, plan)
+    files = [(info, member_target(extract_path, info.filename)) for info in infos if not info.is_dir()]
+    files += [(info, target) for info, target, _ in duplicate_entries(extract_path, infos, duplicates or {})]
+    for name, (size, crc) in delta.get('base', {}).items():
+        info = zipfile.ZipInfo(name)
+        info.file_size, info.CRC = size, crc
+        files.append((info, member_target(extract_path, name)))
+    write_extraction_manifest(extract_path, files)
+    return stats
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(WRITE_CHUNK_SIZE)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+def package_contents(open_payload, config):
+    """Map every file the package installs to its SHA-256, or to [size, crc32] if built without hashes"""
+    infos = payload_members(open_payload, config.get('plan'))
+    hashes = config.get('hashes') or {}
+    contents = {info.filename: hashes.get(info.filename) or [info.file_size, info.CRC]
+                for info in infos if not info.is_dir()}
+    for name, source in (config.get('duplicates') or {}).items():
+        contents[name] = hashes.get(name) or contents[source]
+    # Files a delta package leaves alone are only known by size and CRC32
+    for name, size_crc in ((config.get('delta') or {}).get('base') or {}).items():
+        contents[name] = size_crc
+    return contents
+
+def verify_extraction(extract_path, contents, workers=0):
+    """Check the files at extract_path against contents (see package_contents), reading them in parallel.
+    
+    Returns a list of (name, problem) for the files that don't match.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def check(item):
+        name, expected = item
+        target = member_target(extract_path, name)
+        try:
+            if isinstance(expected, str):
+                matches = file_sha256(target) == expected
+            else:
+                matches = os.path.getsize(target) == expected[0] and file_crc32(target) == tuple(expected)
+        except FileNotFoundError:
+            return name, "missing"
+        except OSError as e:
+            return name, f"unreadable ({e})"
+        return None if matches else (name, "modified")
+    
+    # Largest files first, so one big file doesn't finish last on its own
+    def size(item):
+        try:
+            return -os.path.getsize(member_target(extract_path, item[0]))
+        except OSError:
+            return 0
+    
+    items = sorted(contents.items(), key=size)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(items) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [problem for problem in pool.map(check, items) if problem]
+
+def remove_with_retries(path, remove, retries=5, retry_delay=0.5):
+    """Call remove(path), retrying while the path is locked; True once it is gone"""
+    for attempt in range(retries + 1):
+        try:
+            remove(path)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError:
+            if attempt == retries:
+                return False
+            try:
+                import stat
+                os.chmod(path, stat.S_IWRITE)  # Windows won't delete read-only files
+            except OSError:
+                pass
+            time.sleep(retry_delay * (attempt + 1))
+
+def delete_tree(path, workers=0, retries=5, retry_delay=0.5):
+    """Delete a directory tree, removing its files on a pool of threads.
+    
+    Returns the paths that couldn't be removed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    files, directories = [], []
+    for root, dirnames, filenames in os.walk(path, topdown=False):
+        files.extend(os.path.join(root, name) for name in filenames)
+        for name in dirnames:
+            # Links to directories are removed like files, never followed
+            full_path = os.path.join(root, name)
+            (files if os.path.islink(full_path) else directories).append(full_path)
+    directories.append(path)
+    
+    def remove_batch(batch):
+        return [name for name in batch if not remove_with_retries(name, os.unlink, retries, retry_delay)]
+    
+    batches = [files[i:i + 256] for i in range(0, len(files), 256)]
+    failed = []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(batches) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch_failed in pool.map(remove_batch, batches):
+            failed.extend(batch_failed)
+    
+    # os.walk listed the directories deepest first
+    for directory in directories:
+        if not remove_with_retries(directory, os.rmdir, retries if not failed else 0, retry_delay):
+            failed.append(directory)
+    return failed
+
+def tombstone(path):
+    """Rename a tree aside so its name is free for the next run straight away.
+    
+    Returns the new path, or path itself if it can't be renamed (e.g. a file in
+    it is still open on Windows).
+    """
+    parent, name = os.path.split(os.path.normpath(path))
+    dead_path = os.path.join(parent, f".{name}.deleting-{os.getpid()}-{int(time.time() * 1000)}")
+    try:
+        os.rename(path, dead_path)
+        return dead_path
+    except OSError:
+        return path
+
+def spawn_cleanup_helper(paths, retries=5, retry_delay=0.5):
+    """Delete paths from a detached copy of this program, so this one can exit now"""
+    import subprocess
+    if getattr(sys, 'frozen', False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.abspath(__file__)]
+    env = dict(os.environ, XIP2EXE_CLEANUP=os.pathsep.join(paths),
+               XIP2EXE_CLEANUP_RETRIES=str(retries), XIP2EXE_CLEANUP_DELAY=str(retry_delay))
+    # Start as a separate instance rather than reusing this one's unpacked runtime,
+    # which the bootloader removes when this process exits
+    env['PYINSTALLER_RESET_ENVIRONMENT'] = '1'
+    env.pop('_MEIPASS2', None)
+    kwargs = {}
+    if sys.platform == 'win32':
+        kwargs['creationflags'] = 0x00000008 | 0x00000200  # DETACHED_PROCESS | CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen(command, env=env, cwd=os.path.dirname(paths[0]), stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, close_fds=True, **kwargs)
+
+def run_cleanup_helper():
+    """Body of the detached process started by spawn_cleanup_helper"""
+    retries = int(os.environ.get('XIP2EXE_CLEANUP_RETRIES', 5))
+    retry_delay = float(os.environ.get('XIP2EXE_CLEANUP_DELAY', 0.5))
+    for path in os.environ['XIP2EXE_CLEANUP'].split(os.pathsep):
+        delete_tree(path, retries=retries, retry_delay=retry_delay)
+
+def cleanup_extracted(extract_path, mode='parallel', workers=0, retries=5, retry_delay=0.5):
+    """Delete the extracted files, also sweeping up trees earlier runs left half-deleted.
+    
+    In 'background' mode a detached helper does the deleting and nothing is
+    waited for. Returns the paths that couldn't be removed.
+    """
+    dead_path = tombstone(extract_path)
+    parent, name = os.path.split(os.path.normpath(extract_path))
+    paths = [dead_path] + [os.path.join(parent, entry) for entry in os.listdir(parent)
+                           if entry.startswith(f".{name}.deleting-") and os.path.join(parent, entry) != dead_path]
+    if mode == 'background':
+        try:
+            spawn_cleanup_helper(paths, retries, retry_delay)
+            return []
+        except OSError:
+            pass  # Delete them here instead
+    failed = []
+    for path in paths:
+        failed.extend(delete_tree(path, workers, retries, retry_delay))
+    return failed
+
+class OutputCapture:
+    """Stream a launched program's output to a size-rotated log file.
+    
+    Only the last tail_lines lines are kept in memory, for error messages;
+    with echo the output is also passed through to the console.
+    """
+    
+    def __init__(self, log_path='', tail_lines=50, echo=False, max_bytes=10 * 1024 * 1024, backups=3):
+        import collections
+        import threading
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.echo = echo
+        self.tail = collections.deque(maxlen=max(tail_lines, 0))
+        self.lock = threading.Lock()
+        self.threads = []
+        self.log = None
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self.log = open(log_path, 'ab')
+    
+    def start(self, stream):
+        import threading
+        thread = threading.Thread(target=self._pump, args=(stream,), daemon=True)
+        thread.start()
+        self.threads.append(thread)
+    
+    def _pump(self, stream):
+        with stream:
+            for line in iter(stream.readline, b''):
+                with self.lock:
+                    self.tail.append(line.decode('utf-8', errors='replace').rstrip('\\r\\n'))
+                    if self.log:
+                        self._write_log(line)
+                if self.echo:
+                    sys.stdout.buffer.write(line)
+                    sys.stdout.flush()
+    
+    def _write_log(self, line):
+        if self.log.tell() + len(line) > self.max_bytes and self.log.tell() > 0:
+            self.log.close()
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.log_path}.{i}"):
+                    os.replace(f"{self.log_path}.{i}", f"{self.log_path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.log_path, f"{self.log_path}.1")
+            self.log = open(self.log_path, 'wb')
+        self.log.write(line)
+        self.log.flush()
+    
+    def finish(self, timeout=5):
+        """Wait briefly for the readers; a grandchild may still hold the pipe open"""
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+    
+    def close(self):
+        self.finish()
+        with self.lock:
+            if self.log:
+                self.log.close()
+                self.log = None
+    
+    def tail_text(self):
+        with self.lock:
+            return '\\n'.join(self.tail)
+
+def start_program(cmd_args, cwd, show_console, shell=False, capture=None, job=False):
+    """Launch a program, streaming its output into capture if one is given.
+    
+    Without a capture the output goes to the console when it is shown and is
+    discarded otherwise. With job=True the program is put in a Windows job
+    object (see create_job) for wait_for_process_tree to wait on.
+    """
+    import subprocess
+    if capture:
+        proc = subprocess.Popen(cmd_args, cwd=cwd, shell=shell,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        capture.start(proc.stdout)
+    else:
+        output = None if show_console else subprocess.DEVNULL
+        proc = subprocess.Popen(cmd_args, cwd=cwd, shell=shell, stdout=output, stderr=output)
+    proc.job = create_job(proc) if job and sys.platform == 'win32' else None
+    return proc
+
+def create_job(proc):
+    """Put a launched program in a job object whose events go to an I/O completion port.
+    
+    Every process the program starts joins the job too, so the port reports
+    when the last of them exits. Returns (job, port) handles, or None if the
+    job can't be set up (wait_for_process_tree then scans for processes instead).
+    """
+    import ctypes
+    from ctypes import wintypes
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    kernel32.CreateIoCompletionPort.restype = wintypes.HANDLE
+    
+    class JOBOBJECT_ASSOCIATE_COMPLETION_PORT(ctypes.Structure):
+        _fields_ = [('CompletionKey', ctypes.c_void_p), ('CompletionPort', wintypes.HANDLE)]
+    
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        return None
+    port = kernel32.CreateIoCompletionPort(wintypes.HANDLE(-1), None, None, 1)  # INVALID_HANDLE_VALUE
+    if port:
+        # The port has to be associated before the program joins, or its first events are lost
+        info = JOBOBJECT_ASSOCIATE_COMPLETION_PORT(job, port)
+        if (kernel32.SetInformationJobObject(wintypes.HANDLE(job), 7, ctypes.byref(info),  # JobObjectAssociateCompletionPortInformation
+                                             ctypes.sizeof(info))
+                and kernel32.AssignProcessToJobObject(wintypes.HANDLE(job), wintypes.HANDLE(int(proc._handle)))):
+            return job, port
+        kernel32.CloseHandle(wintypes.HANDLE(port))
+    kernel32.CloseHandle(wintypes.HANDLE(job))
+    return None
+
+def wait_for_job(job, timeout=None, pids=None):
+    """Block on a job's completion port until no process in it is left running.
+    
+    The PIDs of processes that join the job are added to pids. Returns False
+    if the timeout passes first. The job's handles are closed either way; the
+    processes in it keep running.
+    """
+    import ctypes
+    from ctypes import wintypes
+    kernel32 = ctypes.windll.kernel32
+    job, port = job
+    
+    class JOBOBJECT_BASIC_ACCOUNTING_INFORMATION(ctypes.Structure):
+        _fields_ = [('TotalUserTime', ctypes.c_int64), ('TotalKernelTime', ctypes.c_int64),
+                    ('ThisPeriodTotalUserTime', ctypes.c_int64), ('ThisPeriodTotalKernelTime', ctypes.c_int64),
+                    ('TotalPageFaultCount', wintypes.DWORD), ('TotalProcesses', wintypes.DWORD),
+                    ('ActiveProcesses', wintypes.DWORD), ('TotalTerminatedProcesses', wintypes.DWORD)]
+    
+    deadline = None if timeout is None else time.monotonic() + timeout
+    code, key, overlapped = wintypes.DWORD(), ctypes.c_void_p(), ctypes.c_void_p()
+    try:
+        # Everything may have exited before the port was waited on
+        accounting = JOBOBJECT_BASIC_ACCOUNTING_INFORMATION()
+        if (kernel32.QueryInformationJobObject(wintypes.HANDLE(job), 1, ctypes.byref(accounting),  # JobObjectBasicAccountingInformation
+                                               ctypes.sizeof(accounting), None)
+                and accounting.ActiveProcesses == 0):
+            return True
+        while True:
+            wait_ms = 0xFFFFFFFF if deadline is None else max(0, int((deadline - time.monotonic()) * 1000))  # INFINITE
+            if not kernel32.GetQueuedCompletionStatus(wintypes.HANDLE(port), ctypes.byref(code), ctypes.byref(key),
+                                                      ctypes.byref(overlapped), wintypes.DWORD(wait_ms)):
+                return False
+            if key.value != job:
+                continue
+            if code.value == 6 and pids is not None:  # JOB_OBJECT_MSG_NEW_PROCESS; the PID comes in overlapped
+                pids.add(overlapped.value)
+            elif code.value == 4:  # JOB_OBJECT_MSG_ACTIVE_PROCESS_ZERO
+                return True
+    finally:
+        kernel32.CloseHandle(wintypes.HANDLE(port))
+        kernel32.CloseHandle(wintypes.HANDLE(job))
+
+def wait_for_program(proc, timeout=None):
+    """Wait for a launched program, killing it if it overruns the timeout"""
+    import subprocess
+    try:
+        return proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        raise
+
+def wait_for_process_tree(proc, timeout=None):
+    """Wait for a launched program and every process it starts.
+    
+    Nothing is polled: the wait blocks on the program itself (or on its job
+    object, on Windows), then on a snapshot of the processes left behind in
+    psutil.wait_procs. Only when those have all exited is the process table
+    scanned again, for processes they started in the meantime. A batch file
+    that relaunches itself elevated and returns straight away is found by
+    parent PID, as UAC keeps the requesting process as the parent.
+    On Linux, orphans are only found if this process is a child subreaper;
+    otherwise they are re-parented to init.
+    Returns (finished, descendant_count); raises ImportError without psutil.
+    """
+    import psutil
+    import subprocess
+    
+    deadline = None if timeout is None else time.monotonic() + timeout
+    
+    def remaining():
+        return None if deadline is None else max(0, deadline - time.monotonic())
+    
+    try:
+        started = psutil.Process(proc.pid).create_time()
+    except psutil.Error:
+        started = 0
+    known_pids = {proc.pid}
+    
+    def find_descendants():
+        # One pass over the process table for anything started by a process we know of
+        by_parent = {}
+        for p in psutil.process_iter(['ppid', 'create_time', 'status']):
+            by_parent.setdefault(p.info['ppid'], []).append(p)
+        found = []
+        pending = list(known_pids) + [os.getpid()]
+        while pending:
+            for child in by_parent.get(pending.pop(), ()):
+                # Skip unrelated processes that reused a dead parent's PID
+                if child.pid in known_pids or (child.info['create_time'] or 0) < started:
+                    continue
+                known_pids.add(child.pid)
+                pending.append(child.pid)
+                # A zombie has exited; it is only waiting for its parent to reap it
+                if child.info['status'] != psutil.STATUS_ZOMBIE:
+                    found.append(child)
+        return found
+    
+    job, proc.job = getattr(proc, 'job', None), None  # Its handles are closed by wait_for_job
+    if job:
+        finished = wait_for_job(job, remaining(), known_pids)
+        if not finished:
+            proc.kill()
+            proc.wait()
+            return False, len(known_pids) - 1
+        proc.wait()
+    else:
+        try:
+            proc.wait(timeout=remaining())
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            return False, 0
+    
+    # Whatever outlived the program, or was never in its job
+    alive = find_descendants()
+    while alive:
+        _, alive = psutil.wait_procs(alive, timeout=remaining())
+        if alive:
+            return False, len(known_pids) - 1
+        alive = find_descendants()
+    return True, len(known_pids) - 1
+
+def get_process_start_time(pid):
+    """Creation time of a process as a Unix timestamp, or None if it can't be read"""
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+            if not handle:
+                return None
+            try:
+                times = [wintypes.FILETIME() for _ in range(4)]
+                if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+                    return None
+                created = times[0].dwHighDateTime << 32 | times[0].dwLowDateTime
+                return created / 10 ** 7 - 11644473600  # 100 ns ticks since 1601 -> Unix time
+            finally:
+                kernel32.CloseHandle(handle)
+        with open(f'/proc/{pid}/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except Exception:
+        return None
+
+# Least seconds between free-space samples taken while extracting
+DISK_SAMPLE_INTERVAL = 0.25
+
+class Telemetry:
+    """Structured timings for one run of the package.
+    
+    Appended as one JSON object per line to telemetry_file and/or POSTed to
+    telemetry_url, both from the embedded config. Sending never interrupts the run.
+    """
+    
+    def __init__(self):
+        self.file = ''
+        self.url = ''
+        self.report = {
+            'started_at': SCRIPT_STARTED_AT,
+            'exe': os.path.basename(sys.executable),
+            'platform': sys.platform,
+            'cpu_count': os.cpu_count(),
+            'phases': {},  # Seconds spent in each phase
+            'outcome': 'ok',
+        }
+        self.disk_path = None
+        self.free_at_start = None
+        self.free_lowest = None
+        self.sampled_at = 0
+        self.disk_lock = threading.Lock()
         
+        # A onefile EXE runs in a child of the bootloader, which unpacks the
+        # Python runtime first; count from the bootloader's start
+        onefile = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS') and \\
+            os.path.dirname(os.path.abspath(sys.executable)) != os.path.abspath(sys._MEIPASS)
+        process_started = get_process_start_time(os.getppid() if onefile else os.getpid())
+        if process_started:
+            self.report['phases']['startup'] = round(max(SCRIPT_STARTED_AT - process_started, 0), 3)
+        self.report['phases']['imports'] = round(time.time() - SCRIPT_STARTED_AT, 3)
+    
+    def configure(self, config, base_dir):
+        telemetry_file = config.get('telemetry_file', '')
+        self.file = os.path.join(base_dir, os.path.expandvars(telemetry_file)) if telemetry_file else ''
+        self.url = config.get('telemetry_url', '')
+    
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the with-block to the named phase"""
+        started = time.perf_counter()
         try:
-            self._build_in_directory(temp_dir)
+            yield
         finally:
-            # Clean up
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            phases = self.report['phases']
+            phases[name] = round(phases.get(name, 0) + time.perf_counter() - started, 3)
     
-    def _build_in_desktop(self):
-        """Build using desktop directory"""
-        desktop = os.path.join(os.path.expanduser("~"), "Desktop")
-        temp_dir = os.path.join(desktop, f"SelfExtractingEXE_Build_{os.getpid()}")
-        os.makedirs(temp_dir, exist_ok=True)
+    def watch_disk(self, path):
+        """Track free space on path's volume to estimate peak temp-space use"""
+        self.disk_path = path
+        self.free_at_start = self.free_lowest = None
+        self.sample_disk()
+    
+    def sample_disk(self, interval=0):
+        """Note the free space now; with interval, only if the last sample is that many seconds old.
         
-        try:
-            self._build_in_directory(temp_dir)
-        finally:
-            # Clean up
+        Safe to call from several threads, e.g. the extraction workers.
+        """
+        if not self.disk_path or not (self.file or self.url):
+            return
+        with self.disk_lock:
+            now = time.perf_counter()
+            if interval and now - self.sampled_at < interval:
+                return
+            self.sampled_at = now
             try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+                import shutil
+                free = shutil.disk_usage(self.disk_path).free
+            except OSError:
+                return
+            if self.free_at_start is None:
+                self.free_at_start = free
+            self.free_lowest = free if self.free_lowest is None else min(self.free_lowest, free)
     
-    def _build_in_custom_temp(self):
-        """Build using Python's tempfile with custom prefix"""
-        with tempfile.TemporaryDirectory(prefix="SFX_", suffix="_build") as temp_dir:
-            self._build_in_directory(temp_dir)
-    
-    def _build_in_directory(self, temp_dir):
-        """Build the extractor in the specified directory"""
-        # Create the extractor script
-        extractor_script = self._generate_extractor_script()
-        script_path = os.path.join(temp_dir, "extractor.py")
-        
-        with open(script_path, 'w', encoding='utf-8') as f:
-            f.write(extractor_script)
-        
-        # Copy the ZIP file to temp directory
-        zip_dest = os.path.join(temp_dir, "payload.zip")
-        shutil.copy2(self.zip_file_path.get(), zip_dest)
-        
-        # Create config file
-        config = {
-            'extract_folder': self.extract_folder.get(),
-            'run_after_extract': self.run_after_extract.get(),
-            'delete_after_run': self.delete_after_run.get(),
-            'show_console': self.show_console.get(),
-            'require_admin': self.require_admin.get(),
-            'inherit_admin': self.inherit_admin.get()
-        }
-        
-        config_path = os.path.join(temp_dir, "config.json")
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
-        
-        # Use PyInstaller to create the EXE
-        self._build_with_pyinstaller(temp_dir, script_path, zip_dest, config_path)
+    def fail(self, error):
+        self.report['outcome'] = 'error'
+        self.report['error'] = str(error)
     
-    def _generate_extractor_script(self):
-        """Generate the Python script that will be embedded in the EXE"""
-        return '''#!/usr/bin/env python3
-"""
-Self-Extracting Archive
-This script extracts embedded files and optionally runs a program.
-"""
-
-import os
-import sys
-import zipfile
-import json
-import subprocess
-import tempfile
-import shutil
-from pathlib import Path
-import tkinter as tk
-from tkinter import messagebox
+    def emit(self):
+        if not (self.file or self.url):
+            return
+        self.report['phases']['total'] = round(time.time() - SCRIPT_STARTED_AT, 3)
+        if self.free_at_start is not None:
+            self.report['peak_temp_bytes'] = max(self.free_at_start - self.free_lowest, 0)
+        data = json.dumps(self.report)
+        
+        if self.file:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.file)), exist_ok=True)
+                with open(self.file, 'a', encoding='utf-8') as f:
+                    f.write(data + '\\n')
+            except OSError:
+                pass
+        if self.url:
+            try:
+                import urllib.request
+                request = urllib.request.Request(self.url, data=data.encode('utf-8'), method='POST',
+                                                 headers={'Content-Type': 'application/json'})
+                urllib.request.urlopen(request, timeout=2).close()
+            except Exception:
+                pass
 
-def get_resource_path(relative_path):
-    """Get absolute path to resource, works for dev and for PyInstaller"""
+def show_message(title, message, error=False):
+    """Show a message box: the native Windows one if possible, else Tk, else print"""
     try:
-        # PyInstaller creates a temp folder and stores path in _MEIPASS
-        base_path = sys._MEIPASS
+        import ctypes
+        MB_ICONERROR, MB_ICONINFORMATION = 0x10, 0x40
+        ctypes.windll.user32.MessageBoxW(None, message, title, MB_ICONERROR if error else MB_ICONINFORMATION)
+        return
     except Exception:
-        base_path = os.path.abspath(".")
-    
-    return os.path.join(base_path, relative_path)
-
-def show_error(message):
-    """Show error message"""
+        pass
     try:
+        import tkinter as tk
+        from tkinter import messagebox
         root = tk.Tk()
         root.withdraw()
-        messagebox.showerror("Extraction Error", message)
+        if error:
+            messagebox.showerror(title, message)
+        else:
+            messagebox.showinfo(title, message)
         root.destroy()
-    except:
-        print(f"ERROR: {message}")
+    except Exception:
+        print(f"{'ERROR' if error else 'INFO'}: {message}")
+
+def show_error(message):
+    """Show error message"""
+    show_message("Extraction Error", message, error=True)
 
 def show_info(message):
     """Show info message"""
-    try:
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showinfo("Self-Extracting Archive", message)
-        root.destroy()
-    except:
-        print(f"INFO: {message}")
+    show_message("Self-Extracting Archive", message)
 
 def main():
+    telemetry = Telemetry()
+    volumes = None
+    background = None
+    delete_after_run = False
     try:
         # Load configuration
-        config_path = get_resource_path("config.json")
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        with telemetry.phase('config_load'):
+            appended = find_appended_payload()
+            if not appended:
+                raise Exception("No package data found: this extractor has no payload appended")
+            exe_path, payload_offset, payload_size, config_offset, config_size, plan_offset, plan_size = appended
+            with open(exe_path, 'rb') as f:
+                f.seek(config_offset)
+                config = json.loads(f.read(config_size).decode('utf-8'))
+                f.seek(plan_offset)
+                plan, hashes, duplicates = unpack_extraction_plan(f.read(plan_size))
+            config.update(plan=plan, hashes=hashes, duplicates=duplicates)
+        telemetry.configure(config, os.getcwd())
         
         extract_folder = config.get('extract_folder', '.')
         run_after_extract = config.get('run_after_extract', '')
@@ -402,6 +2653,15 @@ def main():
         show_console = config.get('show_console', True)
         require_admin = config.get('require_admin', False)
         inherit_admin = config.get('inherit_admin', True)
+        extract_workers = config.get('extract_workers', 0)  # 0 = one per CPU
+        incremental_extract = config.get('incremental_extract', False)
+        remove_stale_files_enabled = config.get('remove_stale_files', False)
+        run_timeout = config.get('run_timeout', 300) or None  # Seconds; 0 = no limit
+        run_log = config.get('run_log', '')
+        run_log_tail = config.get('run_log_tail', 50)
+        cleanup_mode = config.get('cleanup_mode', 'parallel')
+        cleanup_retries = config.get('cleanup_retries', 5)
+        cleanup_retry_delay = config.get('cleanup_retry_delay', 0.5)
         
         # Determine extraction path
         if extract_folder == '.':
@@ -416,20 +2676,95 @@ def main():
         else:
             extract_path = os.path.join(os.getcwd(), extract_folder)
         
+        if config.get('volumes'):
+            # Split package: the rest of the payload is in volume files next to the EXE
+            exe_dir = os.path.dirname(os.path.abspath(exe_path))
+            volumes = PayloadVolumes([(exe_path, payload_offset, payload_size)] +
+                                     [(os.path.join(exe_dir, name), 0, size) for name, size in config['volumes']])
+            open_payload = volumes.open
+        else:
+            open_payload = lambda: PayloadSegment(exe_path, payload_offset, payload_size)
+        
+        # --verify [folder]: check an existing extraction instead of extracting
+        if len(sys.argv) > 1 and sys.argv[1] == '--verify':
+            if len(sys.argv) > 2:
+                extract_path = os.path.abspath(sys.argv[2])
+            with telemetry.phase('verify'):
+                contents = package_contents(open_payload, config)
+                problems = verify_extraction(extract_path, contents, extract_workers)
+            method = "SHA-256" if config.get('hashes') else "CRC-32"
+            if problems:
+                examples = '\\n'.join(f"{name}: {problem}" for name, problem in problems[:20])
+                more = f"\\n...and {len(problems) - 20} more" if len(problems) > 20 else ""
+                message = (f"{len(problems)} of {len(contents)} file(s) in {extract_path} "
+                           f"don't match the package ({method}):\\n{examples}{more}")
+                telemetry.fail(message)
+                if show_console:
+                    print(message)
+                else:
+                    show_error(message)
+                sys.exit(1)
+            message = f"All {len(contents)} file(s) in {extract_path} match the package ({method})"
+            if show_console:
+                print(message)
+            else:
+                show_info(message)
+            return
+        
         # Create extraction directory if it doesn't exist
         os.makedirs(extract_path, exist_ok=True)
-        
-        # Extract the ZIP file
-        zip_path = get_resource_path("payload.zip")
+        telemetry.watch_disk(extract_path)
         
         if show_console:
             print(f"Extracting to: {extract_path}")
         
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
+        def sample_disk():
+            # Extraction is where the temp space goes, so peaks show up mid-phase too
+            telemetry.sample_disk(interval=DISK_SAMPLE_INTERVAL)
         
-        if show_console:
-            print("Extraction completed successfully!")
+        def extract(priority=None, on_priority_ready=None, stop=None):
+            if config.get('delta'):
+                # Update package: only the files changed since the release it was built against
+                return apply_delta(open_payload, extract_path, config['delta'], extract_workers,
+                                   duplicates=config.get('duplicates'), hashes=config.get('hashes'),
+                                   priority=priority, on_priority_ready=on_priority_ready, stop=stop,
+                                   plan=config.get('plan'), progress=sample_disk)
+            return extract_payload(open_payload, extract_path, extract_workers,
+                                   incremental=incremental_extract, remove_stale=remove_stale_files_enabled,
+                                   duplicates=config.get('duplicates'), hashes=config.get('hashes'),
+                                   priority=priority, on_priority_ready=on_priority_ready, stop=stop,
+                                   plan=config.get('plan'), progress=sample_disk)
+        
+        def report_extraction(stats):
+            seconds = max(time.perf_counter() - started, 1e-6)
+            telemetry.report['extract'] = dict(stats, mb_per_s=round(stats['bytes'] / (1024 * 1024) / seconds, 1),
+                                               files_per_s=round(stats['files'] / seconds, 1))
+            telemetry.sample_disk()
+            
+            if show_console:
+                print(f"Extraction completed successfully! ({stats['files']} files, "
+                      f"{stats['bytes'] / (1024 * 1024):.1f} MB)")
+                if stats['linked']:
+                    print(f"Linked {stats['linked']} duplicate file(s) instead of writing them again")
+                if config.get('delta'):
+                    print(f"Updated {stats['files']} file(s), removed {stats['removed']} file(s)")
+                elif incremental_extract:
+                    print(f"Skipped {stats['skipped']} unchanged file(s), removed {stats['removed']} stale file(s)")
+        
+        started = time.perf_counter()
+        if run_after_extract and config.get('launch_early'):
+            # Extract the program and the files it needs first, and the rest while it runs
+            priority = priority_matcher([run_after_extract] + list(config.get('priority_paths') or []))
+            with telemetry.phase('extract_priority'):
+                background = BackgroundExtraction(
+                    lambda on_priority_ready, stop: extract(priority, on_priority_ready, stop))
+                background.wait_ready()
+            if show_console:
+                print("Required files extracted; the rest continues in the background")
+        else:
+            with telemetry.phase('extract'):
+                stats = extract()
+            report_extraction(stats)
         
         # Run the specified file if provided
         if run_after_extract:
@@ -443,7 +2778,17 @@ def main():
                 original_cwd = os.getcwd()
                 os.chdir(extract_path)
                 
+                capture = None
+                program_started = time.perf_counter()
                 try:
+                    import subprocess
+                    
+                    # Stream the program's output to the log, keeping only its last
+                    # lines for error messages, instead of buffering all of it
+                    if run_log or not show_console:
+                        log_path = os.path.join(original_cwd, os.path.expandvars(run_log)) if run_log else ''
+                        capture = OutputCapture(log_path, run_log_tail, echo=show_console)
+                    
                     # Check if we're already running as admin
                     import ctypes
                     is_admin = ctypes.windll.shell32.IsUserAnAdmin() != 0
@@ -502,7 +2847,7 @@ def main():
                             methods.append(("cmd /c", ['cmd', '/c', f'cd /d "{extract_path}" && "{run_path}"']))
                         
                         # Try each method until one works or we run out
-                        result = None
+                        exit_code = None
                         for method_name, cmd_args in methods:
                             try:
                                 if show_console:
@@ -513,77 +2858,41 @@ def main():
                                 if has_uac_elevation and show_console:
                                     print("🔄 UAC elevation detected - waiting for elevated process...")
                                 
-                                result = subprocess.run(cmd_args,
-                                                      capture_output=not show_console,
-                                                      text=True,
-                                                      cwd=extract_path,
-                                                      shell=True if 'runas' in cmd_args[0] else False,
-                                                      timeout=300)  # 5 minute timeout
-                                
-                                if show_console:
-                                    print(f"Method '{method_name}' completed with exit code: {result.returncode}")
+                                with telemetry.phase('launch'):
+                                    proc = start_program(cmd_args, extract_path, show_console,
+                                                         shell=True if 'runas' in cmd_args[0] else False,
+                                                         capture=capture, job=has_uac_elevation)
                                 
-                                # For UAC elevation batch files, exit code 0 might mean it launched elevated process
-                                if has_uac_elevation and result.returncode == 0:
-                                    if show_console:
-                                        print("✅ Batch file with UAC elevation completed (may have launched elevated process)")
-                                        print("   Waiting additional time for elevated process to complete...")
-                                    
-                                    # Wait a bit more for the elevated process to do its work
-                                    import time
-                                    time.sleep(5)
-                                    
-                                    # Check if any processes are still running from the batch file
+                                if has_uac_elevation:
+                                    # The batch file may relaunch itself elevated and exit straight
+                                    # away, so wait for everything it started, not just the batch
                                     try:
-                                        # Look for common processes that might be launched
-                                        import psutil
-                                        batch_name = os.path.splitext(os.path.basename(run_path))[0]
-                                        
-                                        if show_console:
-                                            print(f"   Checking for processes related to '{batch_name}'...")
-                                        
-                                        # Wait up to 30 seconds for related processes to complete
-                                        for i in range(30):
-                                            related_processes = []
-                                            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                                                try:
-                                                    if proc.info['cmdline']:
-                                                        cmdline = ' '.join(proc.info['cmdline']).lower()
-                                                        if (batch_name.lower() in cmdline or 
-                                                            extract_path.lower() in cmdline or
-                                                            'getadmin.vbs' in cmdline):
-                                                            related_processes.append(proc.info['name'])
-                                                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                                                    continue
-                                            
-                                            if not related_processes:
-                                                if show_console and i > 0:
-                                                    print(f"   All related processes completed after {i} seconds")
-                                                break
-                                            elif i == 0 and show_console:
-                                                print(f"   Found related processes: {', '.join(set(related_processes))}")
-                                            
-                                            time.sleep(1)
-                                        
-                                        if related_processes and show_console:
-                                            print(f"   Some processes may still be running: {', '.join(set(related_processes))}")
-                                            
+                                        finished, descendants = wait_for_process_tree(proc, timeout=run_timeout)
+                                        exit_code = proc.returncode
+                                        if show_console and not finished:
+                                            print(f"   Some processes started by the batch file are still running after {run_timeout} seconds")
+                                        elif show_console and descendants:
+                                            print(f"   Waited for {descendants} process(es) started by the batch file")
                                     except ImportError:
                                         # psutil not available, just wait a fixed time
-                                        if show_console:
-                                            print("   Waiting 10 seconds for elevated process to complete...")
-                                        time.sleep(10)
-                                    except Exception as e:
-                                        if show_console:
-                                            print(f"   Error checking processes: {e}")
+                                        exit_code = wait_for_program(proc, timeout=run_timeout)
+                                        if exit_code == 0:
+                                            if show_console:
+                                                print("   Waiting 10 seconds for elevated process to complete...")
+                                            time.sleep(10)
+                                else:
+                                    exit_code = wait_for_program(proc, timeout=run_timeout)
+                                
+                                if show_console:
+                                    print(f"Method '{method_name}' completed with exit code: {exit_code}")
                                 
                                 # If successful or if this is our last method, break
-                                if result.returncode == 0 or method_name == methods[-1][0]:
+                                if exit_code == 0 or method_name == methods[-1][0]:
                                     break
                                     
                             except subprocess.TimeoutExpired:
                                 if show_console:
-                                    print(f"Method '{method_name}' timed out after 5 minutes")
+                                    print(f"Method '{method_name}' timed out after {run_timeout} seconds")
                                 continue
                             except Exception as e:
                                 if show_console:
@@ -593,79 +2902,130 @@ def main():
                         # For other executables, run directly
                         if is_admin and not inherit_admin and show_console:
                             print("Note: Running executable with inherited admin privileges")
-                        result = subprocess.run([run_path], 
-                                              capture_output=not show_console,
-                                              text=True,
-                                              cwd=extract_path,
-                                              timeout=300)
+                        with telemetry.phase('launch'):
+                            proc = start_program([run_path], extract_path, show_console, capture=capture)
+                        exit_code = wait_for_program(proc, timeout=run_timeout)
                     
-                    if show_console and result.returncode != 0:
-                        print(f"Program exited with code: {result.returncode}")
+                    if capture:
+                        capture.finish()
+                    telemetry.report['exit_code'] = exit_code
+                    if exit_code is None:
+                        raise Exception("None of the launch methods could run the batch file")
+                    if show_console and exit_code != 0:
+                        print(f"Program exited with code: {exit_code}")
                     elif show_console:
-                        print(f"Program completed successfully (exit code: {result.returncode})")
+                        print(f"Program completed successfully (exit code: {exit_code})")
+                    elif exit_code != 0 and capture.tail:
+                        show_error(f"{run_after_extract} exited with code {exit_code}:\\n\\n{capture.tail_text()}")
                 
                 except Exception as e:
-                    show_error(f"Failed to run {run_after_extract}:\\n{str(e)}")
+                    output = f"\\n\\nLast output:\\n{capture.tail_text()}" if capture and capture.tail else ""
+                    telemetry.fail(e)
+                    show_error(f"Failed to run {run_after_extract}:\\n{str(e)}{output}")
                     return
                 finally:
+                    if capture:
+                        capture.close()
                     os.chdir(original_cwd)
+                    # Launch plus run time, including any processes it started
+                    telemetry.report['phases']['program'] = round(time.perf_counter() - program_started, 3)
+                    telemetry.sample_disk()
+                
+                if background is not None:
+                    # Only now is the rest of the payload needed, unless it's about to be deleted
+                    with telemetry.phase('extract'):
+                        stats = background.finish(stop=delete_after_run)
+                    background = None
+                    if not stats['stopped']:
+                        report_extraction(stats)
                 
                 # Delete extracted files if requested
                 if delete_after_run:
                     if show_console:
                         print("Cleaning up extracted files...")
                     try:
-                        shutil.rmtree(extract_path)
+                        with telemetry.phase('cleanup'):
+                            leftovers = cleanup_extracted(extract_path, cleanup_mode, extract_workers,
+                                                          cleanup_retries, cleanup_retry_delay)
+                        if leftovers:
+                            raise Exception(f"{len(leftovers)} item(s) are still in use, e.g. {leftovers[0]}")
                         if show_console:
-                            print("Cleanup completed!")
+                            print("Cleanup completed!" if cleanup_mode != 'background' else
+                                  "Cleanup continues in the background")
                     except Exception as e:
                         if show_console:
                             print(f"Warning: Could not clean up files: {e}")
             else:
+                telemetry.fail(f"File to run not found: {run_after_extract}")
                 show_error(f"File to run not found: {run_after_extract}")
         else:
             if not show_console:
                 show_info(f"Files extracted successfully to:\\n{extract_path}")
     
     except Exception as e:
+        telemetry.fail(e)
         show_error(f"Extraction failed:\\n{str(e)}")
         sys.exit(1)
+    finally:
+        if background is not None:
+            # Returning early: don't leave the rest half-written, unless it's going to be deleted anyway
+            try:
+                background.finish(stop=delete_after_run)
+            except Exception as e:
+                print(f"Warning: background extraction failed: {e}")
+        if volumes is not None:
+            volumes.close()
+        telemetry.emit()
 
 if __name__ == "__main__":
+    # Used by the builder to time the stub's cold start: exit once the
+    # bootloader and module imports are done
+    if os.environ.get('XIP2EXE_STARTUP_PROBE'):
+        sys.exit(0)
+    # Relaunched by spawn_cleanup_helper to delete the extracted files
+    if os.environ.get('XIP2EXE_CLEANUP'):
+        run_cleanup_helper()
+        sys.exit(0)
     main()
 '''
     
-    def _build_with_pyinstaller(self, temp_dir, script_path, zip_path, config_path):
-        """Build the EXE using PyInstaller"""
+    def _build_with_pyinstaller(self, temp_dir, script_path, dist_dir, name='extractor', cache_dir=None):
+        """Build the payload-less extractor EXE using PyInstaller.
+        
+        The payload is never passed to PyInstaller: bundling it with --add-data
+        made the bootloader unpack the whole ZIP to a temp folder before the
+        extractor unpacked it again. It is appended to the EXE afterwards instead.
+        With a cache_dir, PyInstaller keeps its spec and work files there between
+        builds instead of starting from a clean slate.
+        """
         try:
             import PyInstaller.__main__
         except ImportError:
             raise Exception("PyInstaller is required. Install it with: pip install pyinstaller")
         
         # Create a custom build directory to avoid permission issues
-        build_dir = os.path.join(temp_dir, 'build')
-        work_dir = os.path.join(temp_dir, 'work')
-        os.makedirs(build_dir, exist_ok=True)
+        spec_dir = cache_dir or temp_dir
+        work_dir = os.path.join(spec_dir, 'work')
         os.makedirs(work_dir, exist_ok=True)
         
         # PyInstaller arguments
         args = [
             '--onefile',  # Create a single executable
-            '--windowed' if not self.show_console.get() else '--console',  # Window mode
-            '--add-data', f'{zip_path};.',  # Add ZIP file
-            '--add-data', f'{config_path};.',  # Add config file
-            '--distpath', os.path.dirname(self.output_exe_path.get()),  # Output directory
+            '--windowed' if not self.options['show_console'] else '--console',  # Window mode
+            '--distpath', dist_dir,  # Output directory
             '--workpath', work_dir,  # Custom work directory
-            '--specpath', temp_dir,  # Spec file location
-            '--name', os.path.splitext(os.path.basename(self.output_exe_path.get()))[0],  # EXE name
-            '--clean',  # Clean cache
+            '--specpath', spec_dir,  # Spec file location
+            '--name', name,  # EXE name
             '--noconfirm',  # Don't ask for confirmation
         ]
         
+        if not cache_dir:
+            args.append('--clean')  # Clean cache
+        
         # Add icon if specified
-        if self.icon_file_path.get() and os.path.exists(self.icon_file_path.get()):
+        if self.options['icon_file'] and os.path.exists(self.options['icon_file']):
             # Copy icon to temp directory to avoid path issues
-            icon_source = self.icon_file_path.get()
+            icon_source = self.options['icon_file']
             icon_name = os.path.basename(icon_source)
             icon_dest = os.path.join(temp_dir, icon_name)
             
@@ -690,43 +3050,33 @@ if __name__ == "__main__":
                 
                 args.extend(['--icon', icon_path])
                 
-                if hasattr(self, 'status_label'):
-                    self.status_label.config(text=f"Using icon: {icon_name}")
-                    self.root.update()
+                self._report(f"Using icon: {icon_name}")
                     
             except Exception as e:
                 # If icon fails, continue without it but warn user
                 error_msg = f"Warning: Could not use icon file: {str(e)}"
-                if hasattr(self, 'status_label'):
-                    self.status_label.config(text=error_msg)
-                    self.root.update()
+                self._report(error_msg)
                 print(f"Icon Error: {error_msg}")
         
         # Add UPX compression if enabled
-        if self.upx_enabled_var.get():
-            upx_dir = self.upx_path_var.get()
+        if self.options['upx_enabled']:
+            upx_dir = self.options['upx_dir']
             if upx_dir and os.path.isdir(upx_dir):
                 upx_executable = os.path.join(upx_dir, "upx.exe") if sys.platform == "win32" else os.path.join(upx_dir, "upx")
                 if os.path.exists(upx_executable):
                     args.extend(['--upx-dir', upx_dir])
-                    if hasattr(self, 'status_label'):
-                        self.status_label.config(text="UPX compression enabled.")
-                        self.root.update()
+                    self._report("UPX compression enabled.")
                 else:
                     error_msg = f"Warning: upx.exe not found in '{upx_dir}'. Continuing without compression."
-                    if hasattr(self, 'status_label'):
-                        self.status_label.config(text=error_msg)
-                        self.root.update()
+                    self._report(error_msg)
                     print(f"UPX Error: {error_msg}")
             else:
                 error_msg = "Warning: UPX directory not specified or invalid. Continuing without compression."
-                if hasattr(self, 'status_label'):
-                    self.status_label.config(text=error_msg)
-                    self.root.update()
+                self._report(error_msg)
                 print(f"UPX Error: {error_msg}")
         
         # Add admin privileges if requested
-        if self.require_admin.get():
+        if self.options['require_admin']:
             # Create a manifest file for admin privileges
             manifest_content = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <assembly xmlns="urn:schemas-microsoft-com:asm.v1" manifestVersion="1.0">
@@ -752,12 +3102,31 @@ if __name__ == "__main__":
             
             args.extend(['--manifest', manifest_path])
         
+        if self.options['recompress'] == 'zstd':
+            # The extractor imports zstandard dynamically so other packages don't carry it
+            args.extend(['--hidden-import', 'zstandard'])
+        
+        if self.options['slim_stub']:
+            for module in SLIM_EXCLUDES:
+                args.extend(['--exclude-module', module])
+        
         args.append(script_path)  # Script to build
         
+        self._check_cancelled()
+        start, end = getattr(self, '_pyinstaller_progress', (0, 100))
+        progress_handler = PyInstallerProgressHandler(self, start, end)
+        pyinstaller_logger = logging.getLogger('PyInstaller')
+        pyinstaller_logger.addHandler(progress_handler)
         try:
             # Run PyInstaller
-            PyInstaller.__main__.run(args)
-        except Exception as e:
+            with self._timed('pyinstaller'):
+                PyInstaller.__main__.run(args)
+        except (Exception, SystemExit) as e:
+            if cache_dir:
+                # Don't let a failed build leave half-written state for the next one
+                shutil.rmtree(work_dir, ignore_errors=True)
+            if isinstance(e, BuildCancelled) or self.cancel_event.is_set():
+                raise BuildCancelled("Build cancelled")
             error_msg = str(e)
             if "Access is denied" in error_msg or "WinError 5" in error_msg:
                 # Provide specific guidance for permission errors
@@ -776,11 +3145,1260 @@ if __name__ == "__main__":
                 )
             else:
                 raise Exception(f"PyInstaller build failed: {error_msg}")
+        finally:
+            progress_handler.finish()
+            pyinstaller_logger.removeHandler(progress_handler)
+
+def make_compressor(method, level):
+    """Streaming compressor (compress()/flush()) producing a ZIP member's data"""
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(level, zlib.DEFLATED, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(level)
+    if method == zipfile.ZIP_LZMA:
+        return zipfile.LZMACompressor()
+    if method == ZIP_ZSTANDARD:
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("zstd recompression requires the 'zstandard' package: pip install zstandard")
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unsupported compression method: {method}")
+
+def plan_recompress_batches(infos):
+    """Group members into batches in archive order; big members get their own batch"""
+    batches = []
+    current, current_size = [], 0
+    for info in infos:
+        if info.file_size >= RECOMPRESS_BATCH_BYTES:
+            if current:
+                batches.append(current)
+                current, current_size = [], 0
+            batches.append([info])
+            continue
+        current.append(info)
+        current_size += info.file_size
+        if current_size >= RECOMPRESS_BATCH_BYTES or len(current) >= RECOMPRESS_BATCH_FILES:
+            batches.append(current)
+            current, current_size = [], 0
+    if current:
+        batches.append(current)
+    return batches
+
+def write_zip_entry(out, info, src, method, level, descriptor=False):
+    """Write one member of src as a local ZIP entry at out's position, compressed with method.
+    
+    Returns the ZipInfo describing the new entry, with header_offset relative to out.
+    Members that don't get smaller are stored instead. The member is read only
+    once: one that fits in a single chunk is compressed in memory and compared,
+    and a bigger one is judged by how well its first COMPRESS_SAMPLE_BYTES compress.
+    The CRC and sizes are filled into the local header afterwards, or with
+    descriptor=True written in a data descriptor after the data, for an out
+    that can't seek.
+    """
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    entry.external_attr = info.external_attr
+    entry.create_system = info.create_system
+    entry.comment = info.comment
+    entry.header_offset = out.tell()
+    if info.is_dir():
+        entry.compress_type = zipfile.ZIP_STORED
+        entry.CRC = entry.compress_size = entry.file_size = 0
+        out.write(entry.FileHeader(False))
+        return entry
+    
+    # Decide on ZIP64 up front, the way zipfile does, so the header can be
+    # rewritten in place once the sizes are known
+    zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    with src.open(info) as member:
+        chunk = member.read(COPY_CHUNK_SIZE)
+        compressor = compressed = None
+        if method != zipfile.ZIP_STORED and chunk:
+            compressor = make_compressor(method, level)
+            if len(chunk) < COPY_CHUNK_SIZE:
+                # The whole member is in hand
+                compressed = compressor.compress(chunk) + compressor.flush()
+                if len(compressed) >= len(chunk):
+                    compressor = compressed = None
+            else:
+                sample = make_compressor(method, level)
+                sample_size = len(sample.compress(chunk[:COMPRESS_SAMPLE_BYTES])) + len(sample.flush())
+                if sample_size >= min(len(chunk), COMPRESS_SAMPLE_BYTES):
+                    compressor = None
+        
+        entry.compress_type = method if compressor else zipfile.ZIP_STORED
+        if descriptor:
+            entry.flag_bits |= 0x08  # FileHeader then leaves the CRC and sizes zero
+        # FileHeader raises this for ZIP64, bzip2 and LZMA; zipfile doesn't know Zstandard
+        entry.extract_version = 63 if entry.compress_type == ZIP_ZSTANDARD else zipfile.DEFAULT_VERSION
+        entry.file_size = entry.compress_size = entry.CRC = 0
+        out.write(entry.FileHeader(zip64))
+        data_start = out.tell()
+        
+        crc = 0
+        while chunk:
+            crc = zlib.crc32(chunk, crc)
+            if compressed is None:
+                out.write(compressor.compress(chunk) if compressor else chunk)
+            chunk = member.read(COPY_CHUNK_SIZE)
+    if compressed is not None:
+        out.write(compressed)
+    elif compressor:
+        out.write(compressor.flush())
+    
+    entry.CRC = crc
+    entry.file_size = info.file_size
+    entry.compress_size = out.tell() - data_start
+    if descriptor:
+        out.write(struct.pack('<4sLQQ' if zip64 else '<4sLLL', b'PK\x07\x08',
+                              entry.CRC, entry.compress_size, entry.file_size))
+        return entry
+    end = out.tell()
+    out.seek(entry.header_offset)
+    out.write(entry.FileHeader(zip64))
+    out.seek(end)
+    return entry
+
+def copy_zip_entry(out, fp, info):
+    """Copy one member's compressed data from the ZIP open as fp to out, without recompressing.
+    
+    Returns the ZipInfo describing the new entry, with header_offset relative to out.
+    """
+    if info.flag_bits & 0x1:
+        raise ValueError(f"Encrypted ZIP members are not supported: {info.filename}")
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename!r}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    data_start = info.header_offset + 30 + name_length + extra_length
+    
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    entry.external_attr = info.external_attr
+    entry.create_system = info.create_system
+    entry.comment = info.comment
+    entry.compress_type = info.compress_type
+    entry.extract_version = max(info.extract_version, entry.extract_version)
+    entry.flag_bits = info.flag_bits & 0x800  # Sizes go in the header, so no data descriptor
+    entry.CRC = info.CRC
+    entry.file_size = info.file_size
+    entry.compress_size = info.compress_size
+    entry.header_offset = out.tell()
+    out.write(entry.FileHeader(info.file_size > zipfile.ZIP64_LIMIT or info.compress_size > zipfile.ZIP64_LIMIT))
+    
+    remaining = info.compress_size
+    fp.seek(data_start)
+    while remaining:
+        chunk = fp.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename!r}")
+        out.write(chunk)
+        remaining -= len(chunk)
+    return entry
+
+def source_path_matcher(patterns):
+    """Predicate for relative paths matching any of patterns: file or folder paths, or globs.
+    
+    Matching ignores case, like the extractor's priority_paths.
+    """
+    patterns = [p.replace('\\', '/').strip().strip('/').lower() for p in patterns if p.strip()]
+    
+    def matches(name):
+        name = name.lower()
+        return any(name == p or name.startswith(p + '/') or fnmatch.fnmatchcase(name, p) for p in patterns)
+    return matches
+
+def scan_source_folder(folder, include=None, exclude=None):
+    """ZipInfos for the files (and empty folders) under folder to pack, sorted by path.
+    
+    With include, only matching paths are packed; matching exclude leaves a
+    path out, and excluded folders aren't walked. The fixed order keeps builds
+    of the same tree reproducible.
+    """
+    included = source_path_matcher(include) if include else None
+    excluded = source_path_matcher(exclude or [])
+    infos = []
+    for root, dirs, files in os.walk(folder):
+        prefix = os.path.relpath(root, folder).replace(os.sep, '/') + '/'
+        if prefix == './':
+            prefix = ''
+        if prefix and not dirs and not files and (included is None or included(prefix[:-1])):
+            infos.append(zipfile.ZipInfo.from_file(root, prefix, strict_timestamps=False))
+        dirs[:] = [name for name in dirs if not excluded(prefix + name)]
+        for name in files:
+            path = prefix + name
+            if not excluded(path) and (included is None or included(path)):
+                infos.append(zipfile.ZipInfo.from_file(os.path.join(root, name), path, strict_timestamps=False))
+    infos.sort(key=lambda info: info.filename)
+    return infos
+
+class FolderSource:
+    """Opens a source folder's files by ZipInfo, standing in for the ZipFile write_zip_entry reads from.
+    
+    With hashes (a dict), the SHA-256 of each file read to the end is stored there by path.
+    """
+    
+    def __init__(self, folder, hashes=None):
+        self.folder = folder
+        self.hashes = hashes
+    
+    def open(self, info):
+        return SourceFile(os.path.join(self.folder, info.filename), info, self.hashes)
+
+class SourceFile:
+    """A source folder file being read for packing; fails if it isn't the size it was scanned at"""
+    
+    def __init__(self, path, info, hashes=None):
+        self.file = open(path, 'rb')
+        self.info = info
+        self.hashes = hashes
+        self.digest = hashlib.sha256() if hashes is not None else None
+        self.size = 0
+    
+    def read(self, n=-1):
+        data = self.file.read(n)
+        self.size += len(data)
+        if self.digest is not None:
+            self.digest.update(data)
+        if not data or n is None or n < 0:
+            if self.size != self.info.file_size:
+                raise Exception(f"{self.info.filename} changed while it was being packed")
+            if self.digest is not None:
+                self.hashes[self.info.filename] = self.digest.hexdigest()
+        return data
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+class VolumeWriter:
+    """Sequential writer putting the first volume_size bytes in out and the rest in
+    root.001, root.002... volumes of volume_size bytes.
+    
+    Volumes are written as <path>.partial; paths lists their final names and
+    sizes their lengths. A volume_size of 0 keeps everything in out.
+    """
+    
+    def __init__(self, out, root, volume_size=0):
+        self.out = out
+        self.root = root
+        self.volume_size = volume_size
+        self.first_size = 0
+        self.paths = []
+        self.sizes = []
+        self._file = out
+        self._room = volume_size or None
+    
+    def tell(self):
+        return self.first_size + sum(self.sizes)
+    
+    def write(self, data):
+        view = memoryview(data).cast('B')
+        while len(view):
+            if self._room == 0:
+                self._next_volume()
+            n = len(view) if self._room is None else min(len(view), self._room)
+            self._file.write(view[:n])
+            view = view[n:]
+            if self._room is not None:
+                self._room -= n
+            if self._file is self.out:
+                self.first_size += n
+            else:
+                self.sizes[-1] += n
+        return len(data)
+    
+    def _next_volume(self):
+        self.close()
+        path = f"{self.root}.{len(self.paths) + 1:03d}"
+        self.paths.append(path)
+        self.sizes.append(0)
+        self._file = open(path + '.partial', 'wb')
+        self._room = self.volume_size
+    
+    def close(self):
+        """Close the volume being written; out is left open"""
+        if self._file is not self.out:
+            self._file.close()
+
+def read_zip_names(zip_path):
+    """Member names of a ZIP, read straight from its central directory.
+    
+    Only the name fields are decoded, so this is much faster and lighter than
+    ZipFile.infolist() on archives with hundreds of thousands of entries.
+    """
+    with open(zip_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell()
+        tail_size = min(file_size, 22 + 0xFFFF)  # End record plus the longest comment
+        f.seek(file_size - tail_size)
+        tail = f.read(tail_size)
+        pos = tail.rfind(b'PK\x05\x06')
+        if pos < 0 or len(tail) - pos < 22:
+            raise zipfile.BadZipFile(f"Not a ZIP file: {zip_path}")
+        _, _, _, _, count, cd_size, _, _ = struct.unpack('<4sHHHHIIH', tail[pos:pos + 22])
+        cd_end = file_size - tail_size + pos
+        # Look for the ZIP64 locator itself: a central directory past 4 GB needs
+        # the ZIP64 records even when the count and size in this one still fit
+        f.seek(max(0, cd_end - 20))
+        if cd_end >= 20 + 56 and f.read(4) == b'PK\x06\x07':
+            # ZIP64: the real counts are in the record before the locator
+            f.seek(cd_end - 20 - 56)
+            record = f.read(56)
+            if record[:4] != b'PK\x06\x06':
+                raise zipfile.BadZipFile(f"Bad ZIP64 end record: {zip_path}")
+            count, cd_size = struct.unpack('<QQ', record[32:48])
+            cd_end -= 20 + 56
+        # Measured back from the end record, so data prepended to the ZIP doesn't matter
+        f.seek(cd_end - cd_size)
+        cd = f.read(cd_size)
+    
+    names = []
+    pos = 0
+    for _ in range(count):
+        if cd[pos:pos + 4] != b'PK\x01\x02':
+            raise zipfile.BadZipFile(f"Bad central directory: {zip_path}")
+        flags, = struct.unpack_from('<H', cd, pos + 8)
+        name_length, extra_length, comment_length = struct.unpack_from('<HHH', cd, pos + 28)
+        raw = cd[pos + 46:pos + 46 + name_length]
+        names.append(raw.decode('utf-8' if flags & 0x800 else 'cp437'))
+        pos += 46 + name_length + extra_length + comment_length
+    return names
+
+class ZipIndex:
+    """The paths in a ZIP, for browsing folder by folder and searching.
+    
+    The per-folder listing is only built the first time a folder is listed,
+    and searches run over one lowercased string of all paths.
+    """
+    
+    def __init__(self, names):
+        self.files = [name for name in names if not name.endswith('/')]
+        self.folders = {name.rstrip('/') for name in names if name.endswith('/')}
+        self._file_set = set(self.files)
+        self._children = None
+        self._search_text = None
+        self._search_starts = None
+    
+    def find(self, path):
+        """The member path refers to, matched case-insensitively like Windows does; None if it isn't a file"""
+        name = path.replace('\\', '/').lstrip('/')
+        while name.startswith('./'):
+            name = name[2:]
+        if name in self._file_set:
+            return name
+        lowered = name.lower()
+        return next((f for f in self.files if f.lower() == lowered), None)
+    
+    def list_folder(self, folder=''):
+        """(name, is_folder) for the entries directly inside folder ('' = the root), folders first"""
+        if self._children is None:
+            children = {'': {}}
+            
+            def add_folder(path):
+                # Folders may only appear in the paths of the files inside them
+                if path not in children:
+                    parent, _, base = path.rpartition('/')
+                    add_folder(parent)
+                    children[parent][base] = True
+                    children[path] = {}
+            
+            for name in self.folders:
+                add_folder(name)
+            for name in self.files:
+                parent, _, base = name.rpartition('/')
+                add_folder(parent)
+                children[parent][base] = False
+            self._children = children
+        entries = self._children.get(folder, {})
+        return sorted(entries.items(), key=lambda item: (not item[1], item[0].lower()))
+    
+    def search(self, text, limit=1000):
+        """Files whose path contains text (case-insensitive), in archive order; at most limit of them"""
+        if self._search_text is None:
+            # Lowercasing can change a string's length, so each path is lowered on its own
+            lowered = [name.lower() for name in self.files]
+            starts, offset = [], 0
+            for name in lowered:
+                starts.append(offset)
+                offset += len(name) + 1
+            self._search_text = '\n'.join(lowered) + '\n'
+            self._search_starts = starts
+        needle = text.replace('\\', '/').lower().strip()
+        if not needle or '\n' in needle:
+            return []
+        results = []
+        pos = 0
+        while len(results) < limit:
+            pos = self._search_text.find(needle, pos)
+            if pos < 0:
+                break
+            index = bisect.bisect_right(self._search_starts, pos) - 1
+            results.append(self.files[index])
+            # Skip to the next path, so each one is listed once
+            pos = self._search_text.index('\n', pos) + 1
+        return results
+
+_zip_index_cache = {}
+_zip_index_lock = threading.Lock()
+
+def load_zip_index(zip_path):
+    """ZipIndex for zip_path, reused until the file's size or modification time changes"""
+    path = os.path.abspath(zip_path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    with _zip_index_lock:
+        cached = _zip_index_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    index = ZipIndex(read_zip_names(path))
+    with _zip_index_lock:
+        _zip_index_cache.pop(path, None)
+        _zip_index_cache[path] = (key, index)
+        while len(_zip_index_cache) > ZIP_INDEX_CACHE_SIZE:
+            del _zip_index_cache[next(iter(_zip_index_cache))]
+    return index
+
+def load_release_manifest(path):
+    """Size and CRC32 of every file in a release, from its ZIP or a saved release manifest"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zip_ref:
+            return {info.filename: [info.file_size, info.CRC] for info in zip_ref.infolist() if not info.is_dir()}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('files'), dict):
+        raise ValueError(f"Not a ZIP file or release manifest: {path}")
+    return manifest['files']
+
+def write_release_manifest(zip_path, manifest_path):
+    """Save what a later delta build needs to know about this release, without keeping its ZIP"""
+    files = load_release_manifest(zip_path)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': files}, f, separators=(',', ':'))
+    print(f"Wrote release manifest for {len(files)} files to {manifest_path}")
+
+def write_zip_central_directory(out, entries):
+    """Write the central directory and end records for entries already written to out"""
+    cd_start = out.tell()
+    for entry in entries:
+        dt = entry.date_time
+        dosdate = (dt[0] - 1980) << 9 | dt[1] << 5 | dt[2]
+        dostime = dt[3] << 11 | dt[4] << 5 | (dt[5] // 2)
+        
+        zip64_fields = []
+        file_size, compress_size, header_offset = entry.file_size, entry.compress_size, entry.header_offset
+        if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+            zip64_fields += [file_size, compress_size]
+            file_size = compress_size = 0xFFFFFFFF
+        if header_offset > zipfile.ZIP64_LIMIT:
+            zip64_fields.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = b''
+        min_version = 0
+        if zip64_fields:
+            extra = struct.pack(f'<HH{len(zip64_fields)}Q', 1, 8 * len(zip64_fields), *zip64_fields)
+            min_version = zipfile.ZIP64_VERSION
+        
+        try:
+            filename = entry.filename.encode('ascii')
+            flag_bits = entry.flag_bits
+        except UnicodeEncodeError:
+            filename = entry.filename.encode('utf-8')
+            flag_bits = entry.flag_bits | 0x800
+        
+        out.write(struct.pack('<4s4B4HL2L5H2L', b'PK\x01\x02',
+                              max(min_version, entry.create_version), entry.create_system,
+                              max(min_version, entry.extract_version), entry.reserved, flag_bits,
+                              entry.compress_type, dostime, dosdate, entry.CRC, compress_size, file_size,
+                              len(filename), len(extra), len(entry.comment), 0, entry.internal_attr,
+                              entry.external_attr, header_offset))
+        out.write(filename)
+        out.write(extra)
+        out.write(entry.comment)
+    
+    cd_end = out.tell()
+    count, size, offset = len(entries), cd_end - cd_start, cd_start
+    if count >= 0xFFFF or size > zipfile.ZIP64_LIMIT or offset > zipfile.ZIP64_LIMIT:
+        out.write(struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, size, offset))
+        out.write(struct.pack('<4sLQL', b'PK\x06\x07', 0, cd_end, 1))
+        count, size, offset = min(count, 0xFFFF), min(size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF)
+    out.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, count, count, size, offset, 0))
+
+def make_extraction_plan(infos):
+    """What the extractor needs to unpack a payload without reading its central directory.
+    
+    Holds the total and largest file size, every directory, and each file's
+    [name, header offset, compressed size, size, method, CRC32] in the order
+    the files are stored. None if a member is encrypted, which only zipfile
+    can report properly.
+    """
+    if any(info.flag_bits & 0x1 for info in infos):
+        return None
+    files = sorted((info for info in infos if not info.is_dir()), key=lambda info: info.header_offset)
+    directories = set()
+    for info in infos:
+        path = info.filename.rstrip('/') if info.is_dir() else info.filename.rpartition('/')[0]
+        while path and path not in directories:
+            directories.add(path)
+            path = path.rpartition('/')[0]
+    return {
+        'total_size': sum(info.file_size for info in files),
+        'largest_file': max((info.file_size for info in files), default=0),
+        'directories': sorted(directories),
+        'members': [[info.filename, info.header_offset, info.compress_size, info.file_size, info.compress_type,
+                     info.CRC] for info in files],
+    }
+
+def pack_extraction_plan(plan, hashes=None, duplicates=None):
+    """Pack the extraction plan (see make_extraction_plan), the path -> SHA-256
+    hashes and the path -> stored path duplicates into the blob appended after the config"""
+    members = plan['members'] if plan else []
+    directories = plan['directories'] if plan else []
+    hashes = hashes or {}
+    duplicates = duplicates or {}
+    header = PLAN_HEADER.pack(PLAN_MAGIC, plan is not None, plan['total_size'] if plan else 0,
+                              plan['largest_file'] if plan else 0, len(members), len(directories),
+                              len(hashes), len(duplicates))
+    names = [member[0] for member in members] + directories + list(hashes) + list(duplicates)
+    names += duplicates.values()
+    body = b''.join([b''.join(PLAN_MEMBER.pack(*member[1:]) for member in members),
+                     b''.join(bytes.fromhex(digest) for digest in hashes.values()),
+                     '\0'.join(names).encode('utf-8')])
+    return header + zlib.compress(body)
+
+def iter_member_data(zip_ref, info):
+    """Yield the decompressed data of a member, including Zstandard members zipfile can't open"""
+    if info.compress_type != ZIP_ZSTANDARD:
+        with zip_ref.open(info) as member:
+            while True:
+                chunk = member.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+    
+    import zstandard
+    fp = zip_ref.fp
+    fp.seek(info.header_offset)
+    name_length, extra_length = struct.unpack('<HH', fp.read(30)[26:30])
+    position = info.header_offset + 30 + name_length + extra_length
+    remaining = info.compress_size
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    while remaining:
+        fp.seek(position)
+        chunk = fp.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename!r}")
+        position += len(chunk)
+        remaining -= len(chunk)
+        yield decompressor.decompress(chunk)
+
+def measure_payload(original_path, payload_path, sample_bytes=64 * 1024 * 1024):
+    """Sizes of the original and repacked payload, plus decompression speed
+    measured on up to sample_bytes of the repacked members"""
+    with zipfile.ZipFile(payload_path) as payload:
+        infos = [info for info in payload.infolist() if not info.is_dir()]
+        uncompressed = sum(info.file_size for info in infos)
+        
+        sampled = 0
+        started = time.perf_counter()
+        for info in infos:
+            for chunk in iter_member_data(payload, info):
+                sampled += len(chunk)
+                if sampled >= sample_bytes:
+                    break
+            if sampled >= sample_bytes:
+                break
+        elapsed = max(time.perf_counter() - started, 1e-6)
+    
+    throughput = sampled / elapsed / (1024 * 1024) if sampled else 0.0
+    return {
+        'original_size': os.path.getsize(original_path),
+        'payload_size': os.path.getsize(payload_path),
+        'uncompressed_size': uncompressed,
+        'decompress_mb_per_s': round(throughput, 1),
+        'estimated_extract_seconds': round(uncompressed / (1024 * 1024) / throughput, 2) if throughput else None,
+    }
+
+def format_stub_report(report):
+    line = f"Extractor stub: {report['stub_size'] / (1024 * 1024):.1f} MB"
+    if report.get('slim'):
+        line += " (slim)"
+    if report.get('startup_ms') is not None:
+        line += f", cold start {report['startup_ms']:.0f} ms"
+    return line
+
+def format_payload_report(report):
+    mb = 1024 * 1024
+    line = (f"Payload {report['original_size'] / mb:.1f} MB -> {report['payload_size'] / mb:.1f} MB "
+            f"({report['payload_size'] / max(1, report['original_size']):.0%})")
+    if report.get('decompress_mb_per_s'):
+        line += (f", decompresses at ~{report['decompress_mb_per_s']} MB/s "
+                 f"(~{report['estimated_extract_seconds']}s for {report['uncompressed_size'] / mb:.1f} MB)")
+    return line
+
+def compare_codecs(zip_path, levels=None):
+    """Repack zip_path with every available codec and print size against decompression speed"""
+    candidates = levels or [('deflate', 1), ('deflate', 6), ('deflate', 9), ('bzip2', 9), ('lzma', None),
+                            ('zstd', 3), ('zstd', 10)]
+    print(f"{'Codec':<12} {'Size (MB)':>10} {'Ratio':>7} {'Decomp MB/s':>12} {'Est. extract s':>15} {'Build s':>8}")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="SFX_", suffix="_codecs") as work_dir:
+        for codec, level in candidates:
+            builder = SFXBuilder({'zip_file': zip_path, 'recompress': codec, 'recompress_level': level},
+                                 status_callback=lambda text, percent: None)
+            label = codec if level is None else f"{codec}-{level}"
+            dest = os.path.join(work_dir, f"{label}.zip")
+            try:
+                builder._recompress_payload(zip_path, dest, work_dir)
+            except Exception as e:
+                print(f"{label:<12} unavailable: {e}")
+                continue
+            finally:
+                if os.path.exists(dest):
+                    os.remove(dest)
+            r = builder.payload_report
+            results.append(r)
+            print(f"{label:<12} {r['payload_size'] / (1024 * 1024):>10.1f} "
+                  f"{r['payload_size'] / max(1, r['original_size']):>7.0%} {r['decompress_mb_per_s']:>12} "
+                  f"{str(r['estimated_extract_seconds']):>15} {r['seconds']:>8}")
+    return results
+
+def load_manifest(manifest_path):
+    """Read a batch manifest (JSON, or TOML on Python 3.11+) into a list of job option dicts.
+    
+    The manifest holds an optional "defaults" table and a "jobs" list; each job
+    may also set a "name". Relative paths are resolved against the manifest's folder.
+    """
+    if manifest_path.lower().endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("TOML manifests require Python 3.11 or newer; use JSON instead")
+        with open(manifest_path, 'rb') as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get('defaults', {})
+    jobs = []
+    for index, job in enumerate(manifest.get('jobs', [])):
+        options = dict(defaults)
+        options.update(job)
+        name = options.pop('name', None) or os.path.splitext(os.path.basename(options.get('output_exe', '')))[0] \
+            or f"job{index + 1}"
+        for key in ('zip_file', 'source_folder', 'output_exe', 'icon_file', 'upx_dir', 'delta_base'):
+            if options.get(key):
+                options[key] = os.path.join(base_dir, os.path.expanduser(options[key]))
+        jobs.append((name, options))
+    if not jobs:
+        raise ValueError(f"No jobs found in manifest: {manifest_path}")
+    return jobs
+
+def _run_batch_job(name, options, status_callback=None, cancel_event=None, index=None):
+    """Build one manifest job; runs in a worker process.
+    
+    Status goes to status_callback, or is printed prefixed with the job name.
+    index, the job's position in the manifest, is passed through to the result.
+    """
+    started = time.time()
+    last_status = [None]
+    
+    def status(text, percent):
+        if text != last_status[0]:
+            last_status[0] = text
+            print(f"[{name}] {text}", flush=True)
+    
+    result = {'name': name, 'zip_file': options.get('zip_file') or options.get('source_folder'),
+              'output_exe': options.get('output_exe')}
+    if index is not None:
+        result['index'] = index
+    try:
+        builder = SFXBuilder(options, status_callback=status_callback or status, cancel_event=cancel_event)
+        builder.validate()
+        builder.build()
+        result['status'] = 'ok'
+        result['size'] = os.path.getsize(builder.options['output_exe'])
+        if builder.payload_report:
+            result['payload'] = builder.payload_report
+        if builder.stub_report:
+            result['stub'] = builder.stub_report
+        if builder.delta_report:
+            result['delta'] = builder.delta_report
+        if builder.dedupe_report:
+            result['dedupe'] = builder.dedupe_report
+        if builder.volumes:
+            result['volumes'] = [os.path.basename(path) for path in builder.volumes]
+        result['timings'] = {phase: round(seconds, 3) for phase, seconds in builder.timings.items()}
+    except BuildCancelled:
+        result['status'] = 'cancelled'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['seconds'] = round(time.time() - started, 2)
+    return result
+
+def run_batch(manifest_path, workers=None, report_path=None, server=None):
+    """Build every job in a manifest on a process pool and print a summary.
+    
+    With a server URL, the jobs are submitted to a running build server
+    instead (see BuildServer). Jobs may set a "priority"; higher runs first.
+    Returns the number of failed jobs.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    jobs = load_manifest(manifest_path)
+    # Keyed by position in the manifest, as job names needn't be unique
+    priorities = [options.pop('priority', 0) for _, options in jobs]
+    queued = sorted(range(len(jobs)), key=lambda index: -priorities[index])
+    
+    def report(result):
+        results.append(result)
+        print(f"[{result['name']}] {result['status']} in {result['seconds']}s"
+              + (f": {result['error']}" if result.get('error') else ""), flush=True)
+    
+    started = time.time()
+    results = []
+    if server:
+        client = BuildServerClient(server)
+        workers = None
+        print(f"Submitting {len(jobs)} package(s) to the build server at {server}...")
+        submitted = []
+        for index in queued:
+            name, options = jobs[index]
+            try:
+                submitted.append((index, client.submit(options, name, priorities[index])))
+            except ValueError as e:
+                # Rejected by the server's validation, as the job would fail locally
+                report({'name': name, 'index': index, 'status': 'failed', 'error': str(e), 'seconds': 0})
+        for index, job_id in submitted:
+            report(dict(client.wait(job_id), index=index))
+    else:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        print(f"Building {len(jobs)} package(s) with {workers} worker(s)...")
+        # Each job runs in its own process, so PyInstaller's global state and the
+        # per-process build folders never overlap
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_batch_job, *jobs[index], index=index) for index in queued]
+            for future in as_completed(futures):
+                report(future.result())
+    
+    results.sort(key=lambda r: r['index'])
+    failed = [r for r in results if r['status'] != 'ok']
+    elapsed = round(time.time() - started, 2)
+    
+    print()
+    print(f"{'Package':<30} {'Status':<8} {'Seconds':>8} {'Size (MB)':>10}")
+    for r in results:
+        size = f"{r['size'] / (1024 * 1024):.1f}" if 'size' in r else '-'
+        print(f"{r['name'][:30]:<30} {r['status']:<8} {r['seconds']:>8} {size:>10}")
+    print(f"\n{len(results) - len(failed)} succeeded, {len(failed)} failed in {elapsed}s")
+    
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({'manifest': os.path.abspath(manifest_path), 'workers': workers,
+                       'seconds': elapsed, 'results': results}, f, indent=2)
+    return len(failed)
+
+class _EventLogHandler(logging.Handler):
+    """Forwards PyInstaller's log records from a build worker to the server as job log lines"""
+    
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+        self.job_id = None
+        self.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    
+    def emit(self, record):
+        if self.job_id is not None:
+            self.events.put(('log', self.job_id, self.format(record)))
+
+def _build_worker_main(jobs, events, cancel_event):
+    """Body of a build server worker process: import PyInstaller once, then build jobs as they arrive"""
+    try:
+        import PyInstaller.__main__  # noqa: F401  Imported up front so every build finds it warm
+    except ImportError:
+        pass  # Reported by the builds that need it
+    handler = _EventLogHandler(events)
+    logging.getLogger('PyInstaller').addHandler(handler)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, name, options = job
+        handler.job_id = job_id
+        status = lambda text, percent: events.put(('status', job_id, (text, percent)))
+        result = _run_batch_job(name, options, status_callback=status, cancel_event=cancel_event)
+        handler.job_id = None
+        events.put(('done', job_id, result))
+
+class BuildWorker:
+    """The server's handle on one warm worker process"""
+    
+    def __init__(self, context, events):
+        self.jobs = context.Queue()
+        self.cancel_event = context.Event()
+        self.process = context.Process(target=_build_worker_main, args=(self.jobs, events, self.cancel_event),
+                                       daemon=True)
+        self.process.start()
+        self.job_id = None  # Job being built, if any
+        self.builds = 0
+
+class BuildServer:
+    """A local build service: a priority queue of jobs served by warm worker processes.
+    
+    Each worker imports PyInstaller once and then takes one job at a time, so
+    at most `workers` builds run at once. A worker is replaced after
+    max_jobs_per_worker builds, and straight after any build that doesn't
+    succeed, so a failed PyInstaller run never leaves its state to the next job.
+    Job records are plain dicts; see job_view() for what clients see.
+    """
+    
+    def __init__(self, workers=None, max_jobs_per_worker=BUILD_WORKER_MAX_JOBS):
+        # spawn on every platform: workers never inherit the server's threads or sockets
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.jobs = {}
+        self.pending = []  # Heap of (-priority, sequence, job id)
+        self.sequence = 0
+        self.cond = threading.Condition()
+        self.closed = False
+        self.workers = [BuildWorker(self.context, self.events) for _ in range(max(1, workers or os.cpu_count() or 1))]
+        threading.Thread(target=self._pump_events, daemon=True).start()
+        threading.Thread(target=self._watch_workers, daemon=True).start()
+    
+    def submit(self, options, name=None, priority=0):
+        """Queue a build; raises ValueError if the options can't produce one. Returns the job id."""
+        SFXBuilder(options).validate()
+        with self.cond:
+            self.sequence += 1
+            job_id = str(self.sequence)
+            self.jobs[job_id] = {
+                'id': job_id,
+                'name': name or os.path.splitext(os.path.basename(options.get('output_exe', '')))[0] or f"job{job_id}",
+                'priority': priority,
+                'state': 'queued',
+                'status': "Queued",
+                'percent': 0,
+                'submitted': time.time(),
+                'started': None,
+                'finished': None,
+                'worker': None,
+                'result': None,
+                'options': options,
+                'log': [],
+            }
+            heapq.heappush(self.pending, (-priority, self.sequence, job_id))
+            self._dispatch()
+        return job_id
+    
+    def cancel(self, job_id):
+        """Cancel a queued or running job; False if it has already finished"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job['state'] not in ('queued', 'running'):
+                return False
+            if job['state'] == 'queued':
+                # Left in the heap; _dispatch skips jobs that are no longer queued
+                self._finish(job, {'name': job['name'], 'status': 'cancelled', 'seconds': 0})
+            else:
+                for worker in self.workers:
+                    if worker.job_id == job_id:
+                        worker.cancel_event.set()
+                job['status'] = "Cancelling..."
+            self.cond.notify_all()
+            return True
+    
+    def job_view(self, job_id, with_options=False):
+        """A job's record without its log, or None"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            view = {key: value for key, value in job.items() if key not in ('log', 'options')}
+            view['log_lines'] = len(job['log'])
+            if job['state'] == 'queued':
+                order = lambda other: (-other['priority'], int(other['id']))
+                view['queue_position'] = sum(1 for other in self.jobs.values()
+                                             if other['state'] == 'queued' and order(other) < order(job))
+            if with_options:
+                view['options'] = job['options']
+            return view
+    
+    def summary(self):
+        with self.cond:
+            states = [job['state'] for job in self.jobs.values()]
+            return {
+                'workers': [{'pid': worker.process.pid, 'job': worker.job_id, 'builds': worker.builds}
+                            for worker in self.workers],
+                'max_jobs_per_worker': self.max_jobs_per_worker,
+                'queued': states.count('queued'),
+                'running': states.count('running'),
+            }
+    
+    def read_log(self, job_id, since=0, timeout=None):
+        """(lines from index since, finished) for a job, waiting up to timeout seconds for new lines"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None, True
+            deadline = time.time() + (timeout or 0)
+            while len(job['log']) <= since and job['state'] in ('queued', 'running') and time.time() < deadline:
+                self.cond.wait(deadline - time.time())
+            return job['log'][since:], job['state'] not in ('queued', 'running')
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            for worker in self.workers:
+                worker.cancel_event.set()
+                worker.jobs.put(None)
+        for worker in self.workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+    
+    def _dispatch(self):
+        # Called with self.cond held: hand queued jobs to idle workers, highest priority first
+        for worker in self.workers:
+            if worker.job_id is not None:
+                continue
+            job = None
+            while self.pending and job is None:
+                _, _, job_id = heapq.heappop(self.pending)
+                if self.jobs.get(job_id, {}).get('state') == 'queued':
+                    job = self.jobs[job_id]
+            if job is None:
+                return
+            worker.cancel_event.clear()
+            worker.job_id = job['id']
+            job.update(state='running', status="Starting...", started=time.time(), worker=worker.process.pid)
+            worker.jobs.put((job['id'], job['name'], job['options']))
+    
+    def _finish(self, job, result):
+        # Called with self.cond held
+        job.update(state=result['status'], status=result.get('error') or result['status'].capitalize(),
+                   finished=time.time(), result=result)
+        job['log'].append(f"Finished: {result['status']}" + (f": {result['error']}" if result.get('error') else ""))
+        finished = [other for other in self.jobs.values() if other['finished']]
+        for old in sorted(finished, key=lambda other: other['finished'])[:max(0, len(finished) - BUILD_SERVER_KEEP_JOBS)]:
+            del self.jobs[old['id']]
+    
+    def _replace_worker(self, worker):
+        # Called with self.cond held
+        if not self.closed:
+            self.workers[self.workers.index(worker)] = BuildWorker(self.context, self.events)
+    
+    def _pump_events(self):
+        """Apply status, log and completion messages from the workers"""
+        while True:
+            kind, job_id, data = self.events.get()
+            with self.cond:
+                job = self.jobs.get(job_id)
+                if job is None or job['state'] != 'running':
+                    continue
+                if kind == 'status':
+                    text, percent = data
+                    if text != job['status']:
+                        job['log'].append(text)
+                    job['status'] = text
+                    if percent is not None:
+                        job['percent'] = percent
+                elif kind == 'log':
+                    job['log'].append(data)
+                elif kind == 'done':
+                    self._finish(job, data)
+                    worker = next((w for w in self.workers if w.job_id == job_id), None)
+                    if worker:
+                        worker.job_id = None
+                        worker.builds += 1
+                        if worker.builds >= self.max_jobs_per_worker or data['status'] != 'ok':
+                            worker.jobs.put(None)
+                            self._replace_worker(worker)
+                    self._dispatch()
+                self.cond.notify_all()
+    
+    def _watch_workers(self):
+        """Replace workers that died, failing the job they were building"""
+        while not self.closed:
+            time.sleep(1)
+            with self.cond:
+                for worker in list(self.workers):
+                    if worker.process.is_alive() or self.closed:
+                        continue
+                    job = self.jobs.get(worker.job_id)
+                    if job is not None and job['state'] == 'running':
+                        self._finish(job, {'name': job['name'], 'status': 'failed', 'seconds': 0,
+                                           'error': f"Build worker exited unexpectedly (exit code {worker.process.exitcode})"})
+                    self._replace_worker(worker)
+                self._dispatch()
+                self.cond.notify_all()
+
+class BuildServerHandler(BaseHTTPRequestHandler):
+    """HTTP API of the build server; JSON in and out.
+    
+    GET /                    server summary
+    GET /jobs                all jobs
+    POST /jobs               {"options": {...}, "name": ..., "priority": 0} -> {"id": ...}
+    GET /jobs/ID             one job, with its options
+    GET /jobs/ID/log?since=N the job's log from line N as text, streamed until it finishes
+    DELETE /jobs/ID          cancel the job
+    
+    Every request needs an "Authorization: Bearer TOKEN" header with the
+    server's access token (see write_build_server_token()).
+    """
+    
+    def _authorized(self):
+        """Check the request's access token; answers 401 and returns False if it's wrong"""
+        supplied = self.headers.get('Authorization', '').encode('utf-8')
+        if hmac.compare_digest(supplied, f"Bearer {self.server.token}".encode('utf-8')):
+            return True
+        self._send_json({'error': "Missing or wrong access token"}, 401)
+        return False
+    
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _parts(self):
+        path, _, query = self.path.partition('?')
+        params = dict(pair.partition('=')[::2] for pair in query.split('&') if pair)
+        return [part for part in path.split('/') if part], params
+    
+    def do_GET(self):
+        if not self._authorized():
+            return
+        server = self.server.build_server
+        parts, params = self._parts()
+        if not parts:
+            return self._send_json(server.summary())
+        if parts == ['jobs']:
+            views = [server.job_view(job_id) for job_id in list(server.jobs)]
+            return self._send_json([view for view in views if view])
+        if len(parts) == 2 and parts[0] == 'jobs':
+            view = server.job_view(parts[1], with_options=True)
+            return self._send_json(view) if view else self._send_json({'error': "No such job"}, 404)
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'log':
+            if server.job_view(parts[1]) is None:
+                return self._send_json({'error': "No such job"}, 404)
+            try:
+                since = int(params.get('since') or 0)
+            except ValueError:
+                since = -1
+            if since < 0:
+                return self._send_json({'error': "since must be a line number of 0 or more"}, 400)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.end_headers()
+            try:
+                while True:
+                    lines, finished = server.read_log(parts[1], since, timeout=1)
+                    if lines:
+                        self.wfile.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+                        self.wfile.flush()
+                        since += len(lines)
+                    elif finished:
+                        return
+            except (BrokenPipeError, ConnectionResetError):
+                return
+        self._send_json({'error': "Not found"}, 404)
+    
+    def do_POST(self):
+        if not self._authorized():
+            return
+        parts, _ = self._parts()
+        if parts != ['jobs']:
+            return self._send_json({'error': "Not found"}, 404)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            job_id = self.server.build_server.submit(request.get('options') or {}, request.get('name'),
+                                                     int(request.get('priority') or 0))
+        except (ValueError, TypeError, AttributeError) as e:
+            return self._send_json({'error': str(e)}, 400)
+        self._send_json({'id': job_id}, 201)
+    
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        parts, _ = self._parts()
+        if len(parts) != 2 or parts[0] != 'jobs':
+            return self._send_json({'error': "Not found"}, 404)
+        if self.server.build_server.cancel(parts[1]):
+            return self._send_json({'id': parts[1], 'cancelled': True})
+        self._send_json({'error': "No such job, or it has already finished"}, 409)
+    
+    def log_message(self, format, *args):
+        pass  # Keep the console for the server's own messages
+
+def build_server_token_path(port):
+    """Where the build server on `port` keeps its access token"""
+    return os.path.join(SFXBuilder({})._get_cache_root(), f"build_server_{port}.token")
+
+def write_build_server_token(port):
+    """Generate a fresh access token and save it where only the current user can read it.
+    
+    The file is created with mode 0600; on Windows it inherits the ACL of the
+    user's own LOCALAPPDATA folder instead.
+    """
+    token = secrets.token_urlsafe(32)
+    path = build_server_token_path(port)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.lexists(path):
+        os.remove(path)  # Recreate it rather than trust an old file's permissions
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as f:
+        f.write(token)
+    return token
+
+def serve_builds(port=BUILD_SERVER_PORT, workers=None, max_jobs_per_worker=BUILD_WORKER_MAX_JOBS):
+    """Run the build server on localhost until interrupted"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', port), BuildServerHandler)
+    httpd.daemon_threads = True
+    # Builds run as this user, so only clients that can read the token file may submit them
+    httpd.token = write_build_server_token(port)
+    build_server = BuildServer(workers, max_jobs_per_worker)
+    httpd.build_server = build_server
+    print(f"Build server listening on http://127.0.0.1:{port} with {len(build_server.workers)} worker(s); "
+          f"Ctrl+C to stop")
+    print(f"Access token saved to {build_server_token_path(port)}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        build_server.close()
+        try:
+            os.remove(build_server_token_path(port))
+        except OSError:
+            pass
+
+class BuildServerClient:
+    """Submits builds to a running build server over HTTP.
+    
+    The access token is taken from `token`, then $XIP2EXE_BUILD_SERVER_TOKEN,
+    then the token file the server wrote for the URL's port.
+    """
+    
+    def __init__(self, url, token=None):
+        self.url = url.rstrip('/')
+        self.token = token or os.environ.get('XIP2EXE_BUILD_SERVER_TOKEN') or self._read_token()
+    
+    def _read_token(self):
+        try:
+            port = urllib.parse.urlsplit(self.url).port or 80
+            with open(build_server_token_path(port), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except (OSError, ValueError):
+            return None
+    
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url + path, data=data, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error') or str(e)
+            except ValueError:
+                message = str(e)
+            raise ValueError(f"Build server: {message}")
+        except urllib.error.URLError as e:
+            raise OSError(f"Can't reach the build server at {self.url}: {e.reason}")
+    
+    def submit(self, options, name=None, priority=0):
+        """Queue a build; returns its job id"""
+        return self._request('POST', '/jobs', {'options': options, 'name': name, 'priority': priority})['id']
+    
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+    
+    def cancel(self, job_id):
+        try:
+            self._request('DELETE', f'/jobs/{job_id}')
+        except ValueError:
+            pass  # Already finished
+    
+    def wait(self, job_id, status_callback=None, cancel_event=None, poll_interval=0.5):
+        """Wait for a job, passing its progress to status_callback(text, percent); returns its result.
+        
+        Setting cancel_event cancels the job on the server.
+        """
+        last = None
+        cancelled = False
+        while True:
+            job = self.job(job_id)
+            if status_callback and (job['status'], job['percent']) != last:
+                last = (job['status'], job['percent'])
+                status_callback(job['status'], job['percent'])
+            if job['state'] not in ('queued', 'running'):
+                return job['result']
+            if cancel_event is not None and cancel_event.is_set() and not cancelled:
+                self.cancel(job_id)
+                cancelled = True
+            time.sleep(poll_interval)
 
 def main():
-    root = tk.Tk()
-    app = SelfExtractingEXECreator(root)
-    root.mainloop()
+    import argparse
+    parser = argparse.ArgumentParser(description="Create self-extracting executables from ZIP files.")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="build all jobs in a JSON/TOML manifest without the GUI")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of parallel build processes (default: CPU count)")
+    parser.add_argument('--report', metavar='FILE', help="write a JSON summary of the batch to FILE")
+    parser.add_argument('--compare-codecs', metavar='ZIP',
+                        help="repack ZIP with each payload codec and compare size and decompression speed")
+    parser.add_argument('--release-manifest', nargs=2, metavar=('ZIP', 'OUT'),
+                        help="save the file list of a release ZIP to OUT, for later delta builds")
+    parser.add_argument('--serve', action='store_true',
+                        help="run a local build server with warm PyInstaller workers (--workers of them)")
+    parser.add_argument('--port', type=int, default=BUILD_SERVER_PORT,
+                        help=f"port for --serve (default: {BUILD_SERVER_PORT})")
+    parser.add_argument('--max-jobs-per-worker', type=int, default=BUILD_WORKER_MAX_JOBS,
+                        help=f"builds before a server worker is replaced (default: {BUILD_WORKER_MAX_JOBS})")
+    parser.add_argument('--server', metavar='URL', default=os.environ.get('XIP2EXE_BUILD_SERVER'),
+                        help="submit --batch jobs to this build server (default: $XIP2EXE_BUILD_SERVER)")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve_builds(args.port, args.workers, args.max_jobs_per_worker)
+        return
+    
+    if args.compare_codecs:
+        compare_codecs(args.compare_codecs)
+        return
+    
+    if args.release_manifest:
+        write_release_manifest(*args.release_manifest)
+        return
+    
+    if args.batch:
+        try:
+            sys.exit(1 if run_batch(args.batch, args.workers, args.report, args.server) else 0)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: {e}")
+            sys.exit(2)
+    
+    # The window is in gui.py, which imports tkinter, so the headless modes run
+    # on hosts without Tk. gui.py imports this module by name; register it so
+    # running main.py as a script doesn't load it a second time
+    sys.modules.setdefault('main', sys.modules[__name__])
+    import gui
+    gui.run()
 
 if __name__ == "__main__":
     main()
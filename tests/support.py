@@ -0,0 +1,79 @@
+"""
+Helpers shared by the tests.
+
+Builds never run PyInstaller here: seed_stub() puts a stand-in stub into the
+stub cache, so a build only has to append the payload to it.
+"""
+
+import os
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+_extractor = None
+
+def load_extractor():
+    """The extractor script SFXBuilder embeds in generated EXEs, imported as a module"""
+    global _extractor
+    if _extractor is None:
+        folder = tempfile.mkdtemp(prefix="xip2exe_test_")
+        try:
+            path = os.path.join(folder, "extractor.py")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(main.SFXBuilder({})._generate_extractor_script())
+            spec = importlib.util.spec_from_file_location("xip2exe_extractor", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        _extractor = module
+    return _extractor
+
+def make_zip(path, files, compression=zipfile.ZIP_DEFLATED):
+    """Write files ({name: bytes}; names ending in / are folders) to a ZIP at path"""
+    with zipfile.ZipFile(path, 'w', compression) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return path
+
+def read_tree(root):
+    """{relative path: contents} of the files under root, leaving out the extractor's own manifest"""
+    tree = {}
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name == '.xip2exe_manifest.json':
+                continue
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as f:
+                tree[os.path.relpath(path, root).replace(os.sep, '/')] = f.read()
+    return tree
+
+def seed_stub(options):
+    """Put a stand-in extractor stub in the stub cache for builds with these options"""
+    builder = main.SFXBuilder(options)
+    exe_suffix = '.exe' if sys.platform == 'win32' else ''
+    path = os.path.join(builder._get_cache_root(), "stubs", f"stub-{builder._get_stub_key()}{exe_suffix}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'MZ' + b'stub' * 1024)
+    return path
+
+class TempDirTestCase(unittest.TestCase):
+    """Gives each test a temporary folder in self.dir, also used as the build cache"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="xip2exe_test_")
+        environ = mock.patch.dict(os.environ, {'LOCALAPPDATA': os.path.join(self.dir, "cache")})
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.addCleanup(shutil.rmtree, self.dir, True)
+
+    def path(self, *parts):
+        return os.path.join(self.dir, *parts)
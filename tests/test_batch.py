@@ -0,0 +1,113 @@
+"""
+Tests for headless batch builds from a manifest.
+"""
+
+import io
+import os
+import sys
+import json
+import unittest
+import subprocess
+import contextlib
+
+from support import TempDirTestCase, make_zip, seed_stub
+import main
+
+class LoadManifestTests(TempDirTestCase):
+
+    def write_manifest(self, manifest, name="batch.json"):
+        path = self.path(name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        return path
+
+    def test_defaults_names_and_relative_paths(self):
+        path = self.write_manifest({
+            'defaults': {'show_console': False, 'zip_file': 'shared.zip'},
+            'jobs': [
+                {'output_exe': 'out/first.exe'},
+                {'name': 'second', 'zip_file': 'other.zip', 'output_exe': '/abs/second.exe', 'show_console': True},
+                {},
+            ],
+        })
+        jobs = main.load_manifest(path)
+        self.assertEqual([name for name, _ in jobs], ['first', 'second', 'job3'])
+        first, second, third = [options for _, options in jobs]
+        self.assertEqual(first['zip_file'], os.path.join(self.dir, 'shared.zip'))
+        self.assertEqual(first['output_exe'], os.path.join(self.dir, 'out/first.exe'))
+        self.assertFalse(first['show_console'])
+        self.assertEqual(second['zip_file'], os.path.join(self.dir, 'other.zip'))
+        self.assertEqual(second['output_exe'], os.path.abspath('/abs/second.exe'))
+        self.assertTrue(second['show_console'])
+        self.assertEqual(third, {'show_console': False, 'zip_file': os.path.join(self.dir, 'shared.zip')})
+
+    def test_empty_manifest(self):
+        with self.assertRaises(ValueError):
+            main.load_manifest(self.write_manifest({'jobs': []}))
+
+class RunBatchTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        make_zip(self.path("app.zip"), {'app.exe': b'program'})
+        seed_stub({})
+
+    def run_manifest(self, jobs, workers=1):
+        manifest = self.path("batch.json")
+        with open(manifest, 'w', encoding='utf-8') as f:
+            json.dump({'defaults': {'zip_file': 'app.zip'}, 'jobs': jobs}, f)
+        report = self.path("report.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            failed = main.run_batch(manifest, workers, report)
+        with open(report, encoding='utf-8') as f:
+            return failed, json.load(f)['results']
+
+    def test_builds_every_job_and_reports_failures(self):
+        failed, results = self.run_manifest([
+            {'output_exe': 'a.exe'},
+            {'output_exe': 'b.exe', 'zip_file': 'missing.zip'},
+            {'output_exe': 'c.exe'},
+        ], workers=2)
+        self.assertEqual(failed, 1)
+        self.assertEqual([(r['name'], r['status']) for r in results], [('a', 'ok'), ('b', 'failed'), ('c', 'ok')])
+        self.assertIn('missing.zip', results[1]['error'])
+        self.assertTrue(os.path.isfile(self.path("a.exe")))
+        self.assertTrue(os.path.isfile(self.path("c.exe")))
+
+    def test_higher_priority_builds_first(self):
+        failed, results = self.run_manifest([
+            {'output_exe': 'low.exe'},
+            {'output_exe': 'high.exe', 'priority': 5},
+            {'output_exe': 'middle.exe', 'priority': 1},
+        ])
+        self.assertEqual(failed, 0)
+        self.assertEqual([r['name'] for r in results], ['low', 'high', 'middle'])
+        built = sorted(['low', 'high', 'middle'], key=lambda name: os.stat(self.path(name + ".exe")).st_mtime_ns)
+        self.assertEqual(built, ['high', 'middle', 'low'])
+
+    def test_duplicate_names_keep_manifest_order(self):
+        failed, results = self.run_manifest([
+            {'name': 'app', 'output_exe': 'one.exe'},
+            {'name': 'app', 'output_exe': 'two.exe', 'priority': 1},
+            {'name': 'app', 'output_exe': 'three.exe', 'priority': 2},
+        ])
+        self.assertEqual(failed, 0)
+        self.assertEqual([os.path.basename(r['output_exe']) for r in results], ['one.exe', 'two.exe', 'three.exe'])
+
+class HeadlessTests(unittest.TestCase):
+
+    def test_main_does_not_import_tkinter(self):
+        code = "import sys, main; sys.exit('tkinter' in sys.modules)"
+        subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(main.__file__), check=True)
+
+    def test_gui_module_binds_tk_on_import(self):
+        try:
+            import tkinter
+        except ImportError:
+            self.skipTest("tkinter is not installed")
+        import gui
+        self.assertIs(gui.SelfExtractingEXECreator.__init__.__globals__['tk'], tkinter)
+        self.assertIs(gui.SFXBuilder, main.SFXBuilder)
+
+if __name__ == "__main__":
+    unittest.main()
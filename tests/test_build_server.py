@@ -0,0 +1,128 @@
+"""
+Tests for the build server: its job queue, its worker processes and its HTTP API.
+"""
+
+import os
+import time
+import json
+import threading
+import unittest
+import urllib.request
+import urllib.error
+
+from support import TempDirTestCase, make_zip, seed_stub
+import main
+
+class BuildServerTestCase(TempDirTestCase):
+    """Runs a BuildServer with seeded stubs, so builds only append the payload"""
+
+    workers = 1
+    max_jobs_per_worker = main.BUILD_WORKER_MAX_JOBS
+
+    def setUp(self):
+        super().setUp()
+        make_zip(self.path("app.zip"), {'app.exe': b'program'})
+        seed_stub({})
+        self.server = main.BuildServer(self.workers, self.max_jobs_per_worker)
+        self.addCleanup(self.server.close)
+
+    def submit(self, name, zip_name="app.zip", priority=0):
+        options = {'zip_file': self.path(zip_name), 'output_exe': self.path(name + ".exe")}
+        return self.server.submit(options, name, priority)
+
+    def wait(self, job_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            view = self.server.job_view(job_id)
+            if view['state'] not in ('queued', 'running'):
+                return view
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} didn't finish")
+
+class BuildServerTests(BuildServerTestCase):
+
+    def test_builds_a_job(self):
+        view = self.wait(self.submit("app"))
+        self.assertEqual(view['state'], 'ok')
+        self.assertEqual(view['result']['size'], os.path.getsize(self.path("app.exe")))
+        lines, finished = self.server.read_log(view['id'])
+        self.assertTrue(finished)
+        self.assertEqual(lines[-1], "Finished: ok")
+
+    def test_invalid_options_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.submit("missing", "missing.zip")
+
+    def test_higher_priority_runs_first(self):
+        first = self.submit("first")  # Takes the only worker straight away
+        low = self.submit("low")
+        high = self.submit("high", priority=5)
+        self.assertEqual(self.server.job_view(high)['queue_position'], 0)
+        self.assertEqual(self.server.job_view(low)['queue_position'], 1)
+        views = [self.wait(job_id) for job_id in (first, low, high)]
+        self.assertEqual([view['state'] for view in views], ['ok'] * 3)
+        self.assertLess(views[2]['started'], views[1]['started'])
+
+    def test_worker_is_replaced_after_a_failure(self):
+        # The output's folder is a file, so the build fails after validation
+        options = {'zip_file': self.path("app.zip"), 'output_exe': self.path("app.zip", "bad.exe")}
+        failed = self.wait(self.server.submit(options, "bad"))
+        self.assertEqual(failed['state'], 'failed')
+        self.assertTrue(failed['result']['error'])
+        ok = self.wait(self.submit("app"))
+        self.assertEqual(ok['state'], 'ok')
+        self.assertNotEqual(ok['worker'], failed['worker'])
+
+class WorkerRecyclingTests(BuildServerTestCase):
+
+    max_jobs_per_worker = 1
+
+    def test_worker_is_replaced_after_max_jobs(self):
+        views = [self.wait(self.submit(name)) for name in ("one", "two")]
+        self.assertEqual([view['state'] for view in views], ['ok', 'ok'])
+        self.assertNotEqual(views[0]['worker'], views[1]['worker'])
+
+class HttpApiTests(BuildServerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.httpd = main.ThreadingHTTPServer(('127.0.0.1', 0), main.BuildServerHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.token = "secret"
+        self.httpd.build_server = self.server
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.addCleanup(self.httpd.server_close)
+        self.addCleanup(self.httpd.shutdown)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def test_client_submits_and_waits(self):
+        client = main.BuildServerClient(self.url, token="secret")
+        result = client.wait(client.submit({'zip_file': self.path("app.zip"), 'output_exe': self.path("app.exe")}))
+        self.assertEqual(result['status'], 'ok')
+        with self.assertRaises(ValueError):
+            client.submit({'zip_file': self.path("missing.zip"), 'output_exe': self.path("missing.exe")})
+
+    def test_requests_without_the_token_are_refused(self):
+        for token in (None, "wrong"):
+            headers = {'Authorization': f"Bearer {token}"} if token else {}
+            request = urllib.request.Request(self.url + "/jobs", data=b'{}', method='POST', headers=headers)
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(request, timeout=10)
+            self.assertEqual(raised.exception.code, 401)
+            self.assertIn('error', json.loads(raised.exception.read()))
+        self.assertEqual(self.server.jobs, {})
+
+    def test_bad_log_offset_is_refused(self):
+        client = main.BuildServerClient(self.url, token="secret")
+        job_id = client.submit({'zip_file': self.path("app.zip"), 'output_exe': self.path("app.exe")})
+        for since in ("abc", "-1"):
+            request = urllib.request.Request(f"{self.url}/jobs/{job_id}/log?since={since}",
+                                             headers={'Authorization': "Bearer secret"})
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(request, timeout=10)
+            self.assertEqual(raised.exception.code, 400)
+            self.assertIn('since', json.loads(raised.exception.read())['error'])
+        client.wait(job_id)
+
+if __name__ == "__main__":
+    unittest.main()
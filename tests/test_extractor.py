@@ -0,0 +1,330 @@
+"""
+Tests for the extractor script that SFXBuilder embeds in generated EXEs.
+
+The script only exists as a template inside main.py, so support.load_extractor()
+writes it out and imports it. Payloads are plain ZIP files, and launched
+programs are Python child processes, so everything here runs on Linux too.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import unittest
+from unittest import mock
+
+from support import TempDirTestCase, load_extractor, make_zip, read_tree
+import main
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def setUpModule():
+    global extractor
+    extractor = load_extractor()
+
+FILES = {
+    'app.exe': b'program',
+    'lib/a.dll': b'a' * 5000,
+    'lib/b.dll': os.urandom(3 * 1024 * 1024),
+    'data/deep/c.txt': b'c' * 100,
+    'empty.txt': b'',
+}
+
+def sha256_hashes(files):
+    return {name: hashlib.sha256(data).hexdigest() for name, data in files.items()}
+
+class PayloadTestCase(TempDirTestCase):
+    """Extracts ZIP payloads into self.out"""
+
+    def setUp(self):
+        super().setUp()
+        self.out = self.path("out")
+
+    def opener(self, zip_path):
+        return lambda: open(zip_path, 'rb')
+
+    def make_payload(self, files=FILES, name="payload.zip"):
+        return self.opener(make_zip(self.path(name), files))
+
+class ExtractPayloadTests(PayloadTestCase):
+
+    def test_extracts_every_file(self):
+        stats = extractor.extract_payload(self.make_payload(), self.out, workers=4)
+        self.assertEqual(read_tree(self.out), FILES)
+        self.assertEqual(stats['files'], len(FILES))
+        self.assertEqual(stats['bytes'], sum(len(data) for data in FILES.values()))
+
+    def test_single_worker_and_folders(self):
+        files = dict(FILES, **{'empty folder/': b''})
+        extractor.extract_payload(self.make_payload(files), self.out, workers=1)
+        self.assertEqual(read_tree(self.out), FILES)
+        self.assertTrue(os.path.isdir(os.path.join(self.out, 'empty folder')))
+
+    def test_names_cannot_escape_the_folder(self):
+        extractor.extract_payload(self.make_payload({'../evil.txt': b'x', '/abs.txt': b'y'}), self.out)
+        self.assertEqual(read_tree(self.out), {'evil.txt': b'x', 'abs.txt': b'y'})
+
+class IncrementalExtractionTests(PayloadTestCase):
+
+    def test_rerun_skips_unchanged_files(self):
+        opener = self.make_payload()
+        extractor.extract_payload(opener, self.out, incremental=True)
+        with open(os.path.join(self.out, 'app.exe'), 'wb') as f:
+            f.write(b'modified')
+        stats = extractor.extract_payload(opener, self.out, incremental=True)
+        self.assertEqual(stats['files'], 1)
+        self.assertEqual(stats['skipped'], len(FILES) - 1)
+        self.assertEqual(read_tree(self.out), FILES)
+
+    def test_removes_only_files_it_extracted(self):
+        extractor.extract_payload(self.make_payload(), self.out, incremental=True)
+        with open(os.path.join(self.out, 'mine.txt'), 'wb') as f:
+            f.write(b'user file')
+        smaller = dict(FILES)
+        del smaller['lib/a.dll']
+        stats = extractor.extract_payload(self.make_payload(smaller, "smaller.zip"), self.out,
+                                          incremental=True, remove_stale=True)
+        self.assertEqual(stats['removed'], 1)
+        self.assertEqual(read_tree(self.out), dict(smaller, **{'mine.txt': b'user file'}))
+
+class DuplicateTests(PayloadTestCase):
+
+    def test_duplicates_are_linked(self):
+        stats = extractor.extract_payload(self.make_payload(), self.out, duplicates={'copy/a.dll': 'lib/a.dll'})
+        self.assertEqual(read_tree(self.out), dict(FILES, **{'copy/a.dll': FILES['lib/a.dll']}))
+        self.assertEqual(stats['linked'], 1)
+
+class DeltaTests(PayloadTestCase):
+
+    def setUp(self):
+        super().setUp()
+        base_zip = make_zip(self.path("base.zip"), FILES)
+        self.new_files = dict(FILES, **{'app.exe': b'program v2', 'new.txt': b'new'})
+        del self.new_files['data/deep/c.txt']
+        builder = main.SFXBuilder({}, status_callback=lambda text, percent: None)
+        self.delta_zip = self.path("delta.zip")
+        builder._make_delta_payload(base_zip, make_zip(self.path("new.zip"), self.new_files), self.delta_zip)
+        self.delta = builder.delta
+        extractor.extract_payload(self.opener(base_zip), self.out)
+
+    def test_updates_the_base_release(self):
+        stats = extractor.apply_delta(self.opener(self.delta_zip), self.out, self.delta)
+        self.assertEqual(read_tree(self.out), self.new_files)
+        self.assertEqual(stats['removed'], 1)
+
+    def test_refuses_a_different_base(self):
+        with open(os.path.join(self.out, 'lib', 'a.dll'), 'wb') as f:
+            f.write(b'something else')
+        with self.assertRaises(Exception) as raised:
+            extractor.apply_delta(self.opener(self.delta_zip), self.out, self.delta)
+        self.assertIn('lib/a.dll', str(raised.exception))
+        self.assertNotIn('new.txt', read_tree(self.out))
+
+class VerifyTests(PayloadTestCase):
+
+    def test_hash_mismatch_rolls_back(self):
+        hashes = sha256_hashes(FILES)
+        hashes['lib/a.dll'] = '0' * 64
+        with self.assertRaises(extractor.IntegrityError):
+            extractor.extract_payload(self.make_payload(), self.out, hashes=hashes)
+        self.assertEqual(read_tree(self.out), {})
+
+    def test_reports_modified_and_missing_files(self):
+        opener = self.make_payload()
+        extractor.extract_payload(opener, self.out)
+        contents = extractor.package_contents(opener, {})
+        self.assertEqual(extractor.verify_extraction(self.out, contents), [])
+
+        with open(os.path.join(self.out, 'lib', 'a.dll'), 'ab') as f:
+            f.write(b'!')
+        os.remove(os.path.join(self.out, 'app.exe'))
+        problems = dict(extractor.verify_extraction(self.out, contents))
+        self.assertEqual(problems, {'lib/a.dll': 'modified', 'app.exe': 'missing'})
+
+    def test_checks_sha256_when_embedded(self):
+        opener = self.make_payload()
+        hashes = sha256_hashes(FILES)
+        extractor.extract_payload(opener, self.out, hashes=hashes)
+        contents = extractor.package_contents(opener, {'hashes': hashes})
+        self.assertEqual(contents['app.exe'], hashes['app.exe'])
+        self.assertEqual(extractor.verify_extraction(self.out, contents), [])
+
+class ExtractionPlanTests(PayloadTestCase):
+
+    def test_plan_avoids_the_central_directory(self):
+        zip_path = make_zip(self.path("payload.zip"), dict(FILES, **{'empty folder/': b''}))
+        with main.zipfile.ZipFile(zip_path) as zf:
+            plan = main.make_extraction_plan(zf.infolist())
+        original = extractor.zipfile.ZipFile
+        extractor.zipfile.ZipFile = None  # Any use of ZipFile fails
+        try:
+            extractor.extract_payload(self.opener(zip_path), self.out, workers=2, plan=plan)
+        finally:
+            extractor.zipfile.ZipFile = original
+        self.assertEqual(read_tree(self.out), FILES)
+        self.assertTrue(os.path.isdir(os.path.join(self.out, 'empty folder')))
+
+    def test_not_enough_space_fails_before_writing(self):
+        zip_path = make_zip(self.path("payload.zip"), FILES)
+        with main.zipfile.ZipFile(zip_path) as zf:
+            plan = main.make_extraction_plan(zf.infolist())
+        with mock.patch('shutil.disk_usage', return_value=mock.Mock(free=1000)):
+            with self.assertRaises(Exception) as raised:
+                extractor.extract_payload(self.opener(zip_path), self.out, plan=plan)
+        self.assertIn('Not enough disk space', str(raised.exception))
+        self.assertEqual(read_tree(self.out) if os.path.isdir(self.out) else {}, {})
+
+class TelemetryTests(PayloadTestCase):
+
+    def test_free_space_is_sampled_while_extracting(self):
+        telemetry = extractor.Telemetry()
+        telemetry.file = self.path("telemetry.jsonl")
+        telemetry.watch_disk(self.dir)
+        payload = self.make_payload()
+        with mock.patch('shutil.disk_usage', wraps=main.shutil.disk_usage) as disk_usage:
+            extractor.extract_payload(payload, self.out, workers=2, progress=telemetry.sample_disk)
+        self.assertEqual(disk_usage.call_count, len(FILES) + 1)  # Plus the free-space check
+
+    def test_interval_limits_sampling(self):
+        telemetry = extractor.Telemetry()
+        telemetry.file = self.path("telemetry.jsonl")
+        usage = [mock.Mock(free=free) for free in (1000, 400, 900)]
+        with mock.patch('shutil.disk_usage', side_effect=usage) as disk_usage:
+            telemetry.watch_disk(self.dir)
+            telemetry.sample_disk()
+            telemetry.sample_disk(interval=60)  # Too soon after the last one
+            telemetry.sample_disk()
+        self.assertEqual(disk_usage.call_count, 3)
+        telemetry.emit()
+        self.assertEqual(telemetry.report['peak_temp_bytes'], 600)
+
+    def test_progress_is_called_for_every_file(self):
+        calls = []
+        extractor.extract_payload(self.make_payload(), self.out, workers=2, progress=lambda: calls.append(1))
+        self.assertEqual(len(calls), len(FILES))
+
+class OutputCaptureTests(TempDirTestCase):
+
+    def run_program(self, code, capture):
+        proc = extractor.start_program([sys.executable, '-c', code], self.dir, show_console=False, capture=capture)
+        proc.wait()
+        capture.close()
+
+    def test_keeps_the_tail_and_logs_everything(self):
+        log_path = self.path("logs", "run.log")
+        capture = extractor.OutputCapture(log_path, tail_lines=3)
+        self.run_program("for i in range(10): print(f'line {i}')", capture)
+        self.assertEqual(capture.tail_text(), "line 7\nline 8\nline 9")
+        with open(log_path, encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), [word for i in range(10) for word in ('line', str(i))])
+
+    def test_rotates_the_log(self):
+        log_path = self.path("run.log")
+        capture = extractor.OutputCapture(log_path, max_bytes=100, backups=2)
+        self.run_program("for i in range(40): print('x' * 20)", capture)
+        self.assertTrue(os.path.exists(log_path + ".1"))
+        self.assertTrue(os.path.exists(log_path + ".2"))
+        self.assertFalse(os.path.exists(log_path + ".3"))
+        self.assertLessEqual(os.path.getsize(log_path), 100)
+
+    def test_timeout_kills_the_program(self):
+        proc = extractor.start_program([sys.executable, '-c', 'import time; time.sleep(30)'], self.dir,
+                                       show_console=False)
+        started = time.monotonic()
+        with self.assertRaises(main.subprocess.TimeoutExpired):
+            extractor.wait_for_program(proc, timeout=0.5)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIsNotNone(proc.poll())
+
+# A child that starts grandchildren sleeping for the given seconds, then
+# waits for them itself or exits straight away and leaves them orphaned
+CHILD = """
+import subprocess, sys
+delays, wait = {delays!r}, {wait!r}
+children = [subprocess.Popen([sys.executable, '-c', f'import time; time.sleep({{d}})']) for d in delays]
+if wait:
+    for child in children:
+        child.wait()
+"""
+
+@unittest.skipIf(psutil is None, "psutil is not installed")
+class WaitForProcessTreeTests(TempDirTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if sys.platform.startswith('linux'):
+            # Orphans are re-parented to init otherwise, out of sight of the
+            # tracker; Windows keeps an orphan's parent PID instead
+            import ctypes
+            ctypes.CDLL(None).prctl(36, 1, 0, 0, 0)  # PR_SET_CHILD_SUBREAPER
+
+    def launch(self, delays, wait):
+        code = CHILD.format(delays=delays, wait=wait)
+        return extractor.start_program([sys.executable, '-c', code], self.dir, show_console=True)
+
+    def setUp(self):
+        super().setUp()
+        self.running = set(psutil.Process().children(recursive=True))
+
+    def tearDown(self):
+        # Kill whatever the test left running, but not the multiprocessing helpers of other tests
+        for p in set(psutil.Process().children(recursive=True)) - self.running:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        super().tearDown()
+
+    def test_returns_when_last_grandchild_exits(self):
+        proc = self.launch([0.2, 0.5, 1.0], wait=True)
+        started = time.monotonic()
+        finished, count = extractor.wait_for_process_tree(proc, timeout=30)
+        elapsed = time.monotonic() - started
+        self.assertTrue(finished)
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertLess(elapsed, 2.0)
+
+    def test_waits_for_orphaned_grandchildren(self):
+        # The child exits at once; its grandchildren are re-parented and still waited for
+        proc = self.launch([0.3, 1.0], wait=False)
+        started = time.monotonic()
+        finished, count = extractor.wait_for_process_tree(proc, timeout=30)
+        elapsed = time.monotonic() - started
+        self.assertTrue(finished)
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertLess(elapsed, 2.0)
+
+    def test_scans_only_when_processes_exit(self):
+        proc = self.launch([1.0], wait=False)
+        with mock.patch('psutil.process_iter', wraps=psutil.process_iter) as process_iter:
+            finished, count = extractor.wait_for_process_tree(proc, timeout=30)
+        self.assertEqual((finished, count), (True, 1))
+        # Once after the program exits, and once after its grandchild does
+        self.assertEqual(process_iter.call_count, 2)
+
+    def test_finds_processes_started_after_the_snapshot(self):
+        # The grandchild starts a great-grandchild after the first scan, then exits
+        code = ("import subprocess, sys; subprocess.Popen([sys.executable, '-c', "
+                "'import subprocess, sys, time; time.sleep(0.3); "
+                "subprocess.Popen([sys.executable, \"-c\", \"import time; time.sleep(0.7)\"])'])")
+        proc = extractor.start_program([sys.executable, '-c', code], self.dir, show_console=True)
+        started = time.monotonic()
+        finished, count = extractor.wait_for_process_tree(proc, timeout=30)
+        self.assertTrue(finished)
+        self.assertEqual(count, 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+
+    def test_timeout_returns_false(self):
+        proc = self.launch([30], wait=False)
+        started = time.monotonic()
+        finished, count = extractor.wait_for_process_tree(proc, timeout=0.5)
+        self.assertFalse(finished)
+        self.assertEqual(count, 1)
+        self.assertLess(time.monotonic() - started, 2.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,500 @@
+"""
+Tests for how the builder writes payloads: appending them to a stub,
+recompression, packing source folders, volumes and reading ZIP indexes.
+"""
+
+import io
+import os
+import sys
+import json
+import hashlib
+import struct
+import zipfile
+import tempfile
+import unittest
+from unittest import mock
+
+from support import TempDirTestCase, load_extractor, make_zip, read_tree
+import main
+
+def setUpModule():
+    global extractor
+    extractor = load_extractor()
+
+FILES = {
+    'app.exe': b'program' * 100,
+    'lib/a.dll': b'a' * 5000,
+    'lib/random.bin': os.urandom(200 * 1024),
+    'data/deep/c.txt': b'c' * 100,
+    'empty.txt': b'',
+    'empty folder/': b'',
+}
+
+def zip_contents(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        self_test = zf.testzip()
+        assert self_test is None, f"Bad member {self_test}"
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+def quiet_builder(options=None):
+    return main.SFXBuilder(options or {}, status_callback=lambda text, percent: None)
+
+class AppendOnly:
+    """A file-like object with only write() and tell(), like the volume writer"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def tell(self):
+        return self.buffer.tell()
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+class AssembleFromStubTests(TempDirTestCase):
+
+    def make_stub(self, cookie=True):
+        """A stand-in PyInstaller stub: some code, then an archive and its cookie at the very end"""
+        stub_path = self.path("stub.exe")
+        code, archive = b'MZ' + b'x' * 5000, b'archive' * 100
+        with open(stub_path, 'wb') as f:
+            f.write(code + archive)
+            if cookie:
+                f.write(main.PYI_COOKIE.pack(main.PYI_COOKIE_MAGIC, len(archive) + main.PYI_COOKIE.size,
+                                             1000, 0, 312, b'python312.dll'))
+        return stub_path, len(code)
+
+    def assemble(self, stub_path, config=None):
+        zip_path = make_zip(self.path("payload.zip"), FILES)
+        output = self.path("out.exe")
+        quiet_builder({'zip_file': zip_path, 'output_exe': output})._assemble_from_stub(
+            stub_path, zip_path, config or {'extract_folder': 'x'}, output)
+        return zip_path, output
+
+    def test_trailer_locates_payload_and_config(self):
+        stub_path, _ = self.make_stub()
+        zip_path, output = self.assemble(stub_path, {'extract_folder': 'here', 'show_console': False})
+        exe_path, payload_offset, payload_size, config_offset, config_size, plan_offset, plan_size = \
+            extractor.find_appended_payload(output)
+        with open(output, 'rb') as f, open(zip_path, 'rb') as z, open(stub_path, 'rb') as s:
+            data = f.read()
+            self.assertEqual(data[:payload_offset], s.read())
+            self.assertEqual(data[payload_offset:payload_offset + payload_size], z.read())
+        config = json.loads(data[config_offset:config_offset + config_size])
+        self.assertEqual(config['extract_folder'], 'here')
+        self.assertFalse(config['show_console'])
+        self.assertEqual(plan_offset, config_offset + config_size)
+        self.assertEqual(extractor.unpack_extraction_plan(data[plan_offset:plan_offset + plan_size]),
+                         (None, None, None))
+
+    def test_plan_is_kept_out_of_the_config(self):
+        stub_path, _ = self.make_stub()
+        zip_path = make_zip(self.path("payload.zip"), FILES)
+        output = self.path("out.exe")
+        builder = quiet_builder({'zip_file': zip_path, 'output_exe': output})
+        with zipfile.ZipFile(zip_path) as zf:
+            builder.plan = main.make_extraction_plan(zf.infolist())
+        builder.hashes = {name: hashlib.sha256(data).hexdigest() for name, data in FILES.items()
+                          if not name.endswith('/')}
+        builder.duplicates = {'data/copy of c.txt': 'data/deep/c.txt'}
+        builder._assemble_from_stub(stub_path, zip_path, builder._get_config(), output)
+        _, _, _, config_offset, config_size, plan_offset, plan_size = extractor.find_appended_payload(output)
+        with open(output, 'rb') as f:
+            data = f.read()
+        config = json.loads(data[config_offset:config_offset + config_size])
+        self.assertFalse({'plan', 'hashes', 'duplicates'} & set(config))
+        self.assertEqual(extractor.unpack_extraction_plan(data[plan_offset:plan_offset + plan_size]),
+                         (builder.plan, builder.hashes, builder.duplicates))
+
+    def test_cookie_is_reappended_over_the_payload(self):
+        stub_path, code_size = self.make_stub()
+        _, output = self.assemble(stub_path)
+        with open(output, 'rb') as f:
+            data = f.read()
+        magic, length, toc, toc_length, pyvers, pylib = main.PYI_COOKIE.unpack(data[-main.PYI_COOKIE.size:])
+        self.assertEqual(magic, main.PYI_COOKIE_MAGIC)
+        # The package now starts where the stub's archive did and runs to the end of the file
+        self.assertEqual(len(data) - length, code_size)
+        self.assertEqual((toc, toc_length, pyvers), (1000, 0, 312))
+        self.assertIsNotNone(extractor.find_appended_payload(output))
+
+    def test_stub_without_cookie(self):
+        stub_path, _ = self.make_stub(cookie=False)
+        zip_path, output = self.assemble(stub_path)
+        _, payload_offset, payload_size, *_ = extractor.find_appended_payload(output)
+        with open(output, 'rb') as f, open(zip_path, 'rb') as z:
+            f.seek(payload_offset)
+            self.assertEqual(f.read(payload_size), z.read())
+
+    def test_no_payload(self):
+        stub_path, _ = self.make_stub()
+        self.assertIsNone(extractor.find_appended_payload(stub_path))
+
+class WriteZipEntryTests(unittest.TestCase):
+
+    def write(self, files, method, level=None):
+        src_buffer = io.BytesIO()
+        with zipfile.ZipFile(src_buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for name, data in files.items():
+                zf.writestr(name, data)
+        out = io.BytesIO()
+        with zipfile.ZipFile(src_buffer) as src:
+            entries = [main.write_zip_entry(out, info, src, method, level) for info in src.infolist()]
+        main.write_zip_central_directory(out, entries)
+        return out, entries
+
+    def test_round_trip(self):
+        out, entries = self.write(FILES, zipfile.ZIP_DEFLATED, 6)
+        self.assertEqual(zip_contents(out), FILES)
+        by_name = {entry.filename: entry for entry in entries}
+        self.assertEqual(by_name['lib/a.dll'].compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_incompressible_members_are_stored(self):
+        for method, level in ((zipfile.ZIP_DEFLATED, 9), (zipfile.ZIP_BZIP2, 9), (zipfile.ZIP_LZMA, None)):
+            with self.subTest(method=method):
+                out, entries = self.write(FILES, method, level)
+                by_name = {entry.filename: entry for entry in entries}
+                stored = by_name['lib/random.bin']
+                self.assertEqual(stored.compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(stored.compress_size, stored.file_size)
+                self.assertEqual(zip_contents(out), FILES)
+
+    def test_members_are_read_once(self):
+        big = {'big.bin': os.urandom(main.COPY_CHUNK_SIZE + 1000), 'big.txt': b'text' * main.COPY_CHUNK_SIZE}
+        files = dict(FILES, **big)
+        src_buffer = io.BytesIO()
+        with zipfile.ZipFile(src_buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for name, data in files.items():
+                zf.writestr(name, data)
+        out = io.BytesIO()
+        with zipfile.ZipFile(src_buffer) as zf:
+            src = mock.Mock(wraps=zf)
+            entries = [main.write_zip_entry(out, info, src, zipfile.ZIP_DEFLATED, 6) for info in zf.infolist()]
+        self.assertEqual(src.open.call_count, len([name for name in files if not name.endswith('/')]))
+        main.write_zip_central_directory(out, entries)
+        self.assertEqual(zip_contents(out), files)
+        by_name = {entry.filename: entry for entry in entries}
+        self.assertEqual(by_name['big.bin'].compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(by_name['big.txt'].compress_type, zipfile.ZIP_DEFLATED)
+
+    def test_data_descriptors_need_no_seeking(self):
+        src_buffer = io.BytesIO()
+        with zipfile.ZipFile(src_buffer, 'w', zipfile.ZIP_STORED) as zf:
+            for name, data in FILES.items():
+                zf.writestr(name, data)
+        out = AppendOnly()
+        with zipfile.ZipFile(src_buffer) as src:
+            entries = [main.write_zip_entry(out, info, src, zipfile.ZIP_DEFLATED, 6, descriptor=True)
+                       for info in src.infolist()]
+        main.write_zip_central_directory(out, entries)
+        self.assertEqual(zip_contents(io.BytesIO(out.getvalue())), FILES)
+
+    def test_stored_members_need_no_zstandard(self):
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            self.skipTest("zstandard is not installed")
+        out, entries = self.write(FILES, main.ZIP_ZSTANDARD, 10)
+        by_name = {entry.filename: entry for entry in entries}
+        self.assertEqual(by_name['lib/a.dll'].extract_version, 63)
+        stored = by_name['lib/random.bin']
+        self.assertEqual((stored.compress_type, stored.extract_version), (zipfile.ZIP_STORED, 20))
+        header = out.getvalue()[stored.header_offset:stored.header_offset + 30]
+        self.assertEqual(struct.unpack('<H', header[4:6])[0], 20)
+
+    def test_non_ascii_names(self):
+        files = {'données/naïve.txt': b'caf\xc3\xa9', 'plain.txt': b'x'}
+        out, _ = self.write(files, zipfile.ZIP_DEFLATED, 6)
+        self.assertEqual(zip_contents(out), files)
+        self.assertEqual(main.read_zip_names(self.save(out)), list(files))
+
+    def test_zip64_end_records_for_many_entries(self):
+        # More entries than the classic end record can count
+        out = io.BytesIO()
+        entries = []
+        for i in range(0x10000 + 10):
+            info = zipfile.ZipInfo(f"d{i}/")
+            info.external_attr = 0o40755 << 16 | 0x10
+            entries.append(main.write_zip_entry(out, info, None, zipfile.ZIP_DEFLATED, 6))
+        main.write_zip_central_directory(out, entries)
+        with zipfile.ZipFile(out) as zf:
+            self.assertEqual(len(zf.infolist()), len(entries))
+        self.assertEqual(len(main.read_zip_names(self.save(out))), len(entries))
+
+    @unittest.skipIf(sys.platform == 'win32', "needs a sparse file")
+    def test_zip64_offsets(self):
+        # A member stored beyond 4 GB needs its offset in a ZIP64 extra field
+        path = self.save(io.BytesIO())
+        src_buffer = io.BytesIO()
+        with zipfile.ZipFile(src_buffer, 'w') as zf:
+            zf.writestr('late.txt', b'late' * 100)
+        with zipfile.ZipFile(src_buffer) as src, open(path, 'wb') as out:
+            out.seek(zipfile.ZIP64_LIMIT + 1024)
+            entry = main.write_zip_entry(out, src.infolist()[0], src, zipfile.ZIP_DEFLATED, 6)
+            main.write_zip_central_directory(out, [entry])
+        with zipfile.ZipFile(path) as zf:
+            info = zf.getinfo('late.txt')
+            self.assertEqual(info.header_offset, zipfile.ZIP64_LIMIT + 1024)
+            self.assertEqual(zf.read(info), b'late' * 100)
+        self.assertEqual(main.read_zip_names(path), ['late.txt'])
+
+    def test_zip64_local_header_for_huge_members(self):
+        # Sizes aren't known until the data is written, so members that may
+        # pass 4 GB get ZIP64 fields in their local header up front
+        info = zipfile.ZipInfo('huge.bin')
+        info.file_size = zipfile.ZIP64_LIMIT + 1
+        source = mock.Mock()
+        source.open.return_value = io.BytesIO(b'')
+        out = io.BytesIO()
+        entry = main.write_zip_entry(out, info, source, zipfile.ZIP_STORED, None)
+        header = out.getvalue()
+        compress_size, file_size, name_length, extra_length = struct.unpack('<IIHH', header[18:30])
+        self.assertEqual((compress_size, file_size), (0xFFFFFFFF, 0xFFFFFFFF))
+        extra = header[30 + name_length:30 + name_length + extra_length]
+        self.assertEqual(struct.unpack('<HHQQ', extra), (1, 16, entry.file_size, entry.compress_size))
+
+    def save(self, buffer):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+        self.addCleanup(os.remove, path)
+        return path
+
+class RecompressTests(TempDirTestCase):
+
+    def test_round_trip_for_every_codec(self):
+        src = make_zip(self.path("src.zip"), FILES, zipfile.ZIP_STORED)
+        for codec, (method, _) in main.PAYLOAD_CODECS.items():
+            if codec == 'zstd':
+                try:
+                    import zstandard  # noqa: F401
+                except ImportError:
+                    continue
+            with self.subTest(codec=codec):
+                dest = self.path(f"{codec}.zip")
+                builder = quiet_builder({'recompress': codec})
+                builder._recompress_payload(src, dest, self.dir)
+                out = self.path(f"out-{codec}")
+                extractor.extract_payload(lambda: open(dest, 'rb'), out)
+                self.assertEqual(read_tree(out), {name: data for name, data in FILES.items()
+                                                  if not name.endswith('/')})
+                with zipfile.ZipFile(dest) as zf:
+                    methods = {info.filename: info.compress_type for info in zf.infolist()}
+                self.assertEqual(methods['lib/a.dll'], method)
+                self.assertEqual(methods['lib/random.bin'], zipfile.ZIP_STORED)
+                self.assertLess(builder.payload_report['payload_size'], builder.payload_report['original_size'])
+                self.assertEqual(os.listdir(self.dir).count('part00000.bin'), 0)
+
+    def test_levels(self):
+        src = make_zip(self.path("src.zip"), FILES, zipfile.ZIP_STORED)
+        sizes = {}
+        for level in (1, 9):
+            dest = self.path(f"deflate{level}.zip")
+            quiet_builder({'recompress': 'deflate', 'recompress_level': level})._recompress_payload(src, dest, self.dir)
+            self.assertEqual(zip_contents(dest), FILES)
+            sizes[level] = os.path.getsize(dest)
+        self.assertLessEqual(sizes[9], sizes[1])
+
+    def test_levels_are_checked_against_the_codec(self):
+        zip_path = make_zip(self.path("src.zip"), FILES)
+        options = {'zip_file': zip_path, 'output_exe': self.path("out.exe")}
+        for codec, level in (('deflate', 10), ('bzip2', 0), ('zstd', 23), ('deflate', '6'), ('lzma', 6)):
+            with self.subTest(codec=codec, level=level):
+                with self.assertRaises(ValueError) as raised:
+                    main.SFXBuilder(dict(options, recompress=codec, recompress_level=level)).validate()
+                self.assertIn(codec, str(raised.exception))
+        main.SFXBuilder(dict(options, recompress='bzip2', recompress_level=9)).validate()
+        main.SFXBuilder(dict(options, recompress='lzma')).validate()
+        # Source folders are compressed with deflate unless a codec is chosen
+        folder = dict(options, zip_file='', source_folder=self.dir)
+        with self.assertRaises(ValueError):
+            main.SFXBuilder(dict(folder, recompress_level=10)).validate()
+
+class SourceFolderTests(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source = self.path("source")
+        for name, data in dict(FILES, **{'Build/Obj/x.pdb': b'pdb', 'tests/t.py': b'test',
+                                        'keep/T.PDB': b'upper'}).items():
+            path = os.path.join(self.source, name)
+            if name.endswith('/'):
+                os.makedirs(path, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def names(self, include=None, exclude=None):
+        return [info.filename for info in main.scan_source_folder(self.source, include, exclude)]
+
+    def test_scan_is_sorted_and_keeps_empty_folders(self):
+        names = self.names()
+        self.assertEqual(names, sorted(names))
+        self.assertIn('empty folder/', names)
+        self.assertIn('lib/a.dll', names)
+
+    def test_exclude_globs_and_folders_ignoring_case(self):
+        names = self.names(exclude=['*.pdb', 'TESTS', 'build'])
+        self.assertNotIn('tests/t.py', names)
+        self.assertNotIn('keep/T.PDB', names)
+        self.assertFalse([name for name in names if name.startswith('Build/')])
+        self.assertIn('lib/a.dll', names)
+
+    def test_include_limits_what_is_packed(self):
+        self.assertEqual(self.names(include=['lib', 'app.EXE']), ['app.exe', 'lib/a.dll', 'lib/random.bin'])
+        self.assertEqual(self.names(include=['lib\\'], exclude=['*.bin']), ['lib/a.dll'])
+
+    def pack(self, builder=None):
+        builder = builder or quiet_builder({'source_folder': self.source, 'exclude_patterns': ['tests']})
+        out = AppendOnly()
+        builder._pack_source_folder(out)
+        return out.getvalue()
+
+    def test_packing_round_trips_and_is_reproducible(self):
+        first, second = self.pack(), self.pack()
+        self.assertEqual(first, second)
+        contents = zip_contents(io.BytesIO(first))
+        self.assertNotIn('tests/t.py', contents)
+        self.assertEqual(contents['lib/random.bin'], FILES['lib/random.bin'])
+        self.assertEqual(contents['empty folder/'], b'')
+
+    def test_big_members_round_trip(self):
+        big = os.urandom(1024) * (main.RECOMPRESS_BATCH_BYTES // 1024 + 1)
+        with open(os.path.join(self.source, 'big.bin'), 'wb') as f:
+            f.write(big)
+        builder = quiet_builder({'source_folder': self.source, 'exclude_patterns': ['tests']})
+        with mock.patch('tempfile.TemporaryFile', side_effect=AssertionError("no temporary files")):
+            payload = self.pack(builder)
+        contents = zip_contents(io.BytesIO(payload))
+        self.assertEqual(contents['big.bin'], big)
+        self.assertEqual(contents['app.exe'], FILES['app.exe'])
+        with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+            self.assertTrue(zf.getinfo('big.bin').flag_bits & 0x08)
+            self.assertFalse(zf.getinfo('app.exe').flag_bits & 0x08)
+
+        # The extractor finds big.bin from the plan alone, past its data descriptor
+        self.assertIsNotNone(builder.plan)
+        zip_path = self.path("packed.zip")
+        with open(zip_path, 'wb') as f:
+            f.write(payload)
+        out = self.path("out")
+        extractor.extract_payload(lambda: open(zip_path, 'rb'), out, workers=2, plan=builder.plan)
+        self.assertEqual(read_tree(out), {name: data for name, data in contents.items() if not name.endswith('/')})
+
+class VolumeTests(TempDirTestCase):
+
+    def test_package_is_split_into_volumes(self):
+        files = dict(FILES, **{'big.bin': os.urandom(2500 * 1024)})
+        zip_path = make_zip(self.path("payload.zip"), files)
+        stub_path = self.path("stub.exe")
+        with open(stub_path, 'wb') as f:
+            f.write(b'stub' * 100)
+        output = self.path("package.exe")
+        quiet_builder({'zip_file': zip_path, 'output_exe': output, 'volume_size_mb': 1})._assemble_from_stub(
+            stub_path, zip_path, {'extract_folder': 'x'}, output)
+        _, payload_offset, first_size, config_offset, config_size, *_ = extractor.find_appended_payload(output)
+        with open(output, 'rb') as f:
+            f.seek(config_offset)
+            config = json.loads(f.read(config_size))
+        self.assertEqual(first_size, 1024 * 1024)
+        self.assertEqual([name for name, _ in config['volumes']], ["package.001", "package.002"])
+
+        with open(zip_path, 'rb') as f:
+            payload = f.read()
+        volumes = extractor.PayloadVolumes([(output, payload_offset, first_size)] +
+                                           [(self.path(name), 0, size) for name, size in config['volumes']])
+        try:
+            reader = volumes.open()
+            reader.seek(first_size - 10)
+            self.assertEqual(reader.read(20), payload[first_size - 10:first_size + 10])
+            out = self.path("out")
+            extractor.extract_payload(volumes.open, out, workers=4)
+        finally:
+            volumes.close()
+        self.assertEqual(read_tree(out), {name: data for name, data in files.items() if not name.endswith('/')})
+
+    def test_volume_writer_spans_boundaries(self):
+        zip_path = make_zip(self.path("payload.zip"), FILES)
+        with open(zip_path, 'rb') as f:
+            payload = f.read()
+        exe_path = self.path("package.exe")
+        with open(exe_path, 'wb') as out:
+            out.write(b'stub' * 100)
+            writer = main.VolumeWriter(out, self.path("package"), volume_size=64 * 1024)
+            for i in range(0, len(payload), 5000):
+                writer.write(payload[i:i + 5000])
+            writer.close()
+        for path in writer.paths:
+            os.replace(path + '.partial', path)
+        self.assertEqual(writer.first_size, 64 * 1024)
+        self.assertEqual(writer.tell(), len(payload))
+        self.assertEqual(len(writer.paths), (len(payload) - 1) // (64 * 1024))
+        self.assertEqual(os.path.basename(writer.paths[0]), "package.001")
+
+        volumes = extractor.PayloadVolumes([(exe_path, 400, writer.first_size)] +
+                                           [(path, 0, size) for path, size in zip(writer.paths, writer.sizes)])
+        try:
+            reader = volumes.open()
+            reader.seek(64 * 1024 - 10)
+            self.assertEqual(reader.read(20), payload[64 * 1024 - 10:64 * 1024 + 10])
+            out = self.path("out")
+            extractor.extract_payload(volumes.open, out, workers=4)
+        finally:
+            volumes.close()
+        self.assertEqual(read_tree(out), {name: data for name, data in FILES.items() if not name.endswith('/')})
+
+    def test_missing_volume(self):
+        exe_path = self.path("package.exe")
+        with open(exe_path, 'wb') as f:
+            f.write(b'x' * 100)
+        with self.assertRaises(Exception) as raised:
+            extractor.PayloadVolumes([(exe_path, 0, 100), (self.path("package.001"), 0, 100)])
+        self.assertIn('package.001', str(raised.exception))
+
+class ZipIndexTests(TempDirTestCase):
+
+    def test_read_zip_names_matches_zipfile(self):
+        zip_path = make_zip(self.path("payload.zip"), dict(FILES, **{'ünïcode/名前.txt': b'x'}))
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertEqual(main.read_zip_names(zip_path), zf.namelist())
+
+    def test_read_zip_names_with_data_before_the_zip(self):
+        zip_path = make_zip(self.path("payload.zip"), FILES)
+        with open(zip_path, 'rb') as f:
+            data = f.read()
+        prefixed = self.path("prefixed.exe")
+        with open(prefixed, 'wb') as f:
+            f.write(b'MZ' * 1000 + data)
+        self.assertEqual(main.read_zip_names(prefixed), list(FILES))
+
+    def test_not_a_zip(self):
+        path = self.path("not.zip")
+        with open(path, 'wb') as f:
+            f.write(b'nothing here')
+        with self.assertRaises(zipfile.BadZipFile):
+            main.read_zip_names(path)
+
+    def test_find_list_and_search(self):
+        index = main.ZipIndex(['bin/App.exe', 'bin/lib/x.dll', 'docs/', 'readme.txt', 'setup.bat'])
+        self.assertEqual(index.find('BIN\\app.EXE'), 'bin/App.exe')
+        self.assertEqual(index.find('./readme.txt'), 'readme.txt')
+        self.assertIsNone(index.find('bin'))
+        self.assertEqual(index.list_folder(), [('bin', True), ('docs', True), ('readme.txt', False),
+                                               ('setup.bat', False)])
+        self.assertEqual(index.list_folder('bin'), [('lib', True), ('App.exe', False)])
+        self.assertEqual(index.search('.EXE'), ['bin/App.exe'])
+        self.assertEqual(index.search('e', limit=2), ['bin/App.exe', 'readme.txt'])
+        self.assertEqual(index.search(''), [])
+
+    def test_load_zip_index_notices_changes(self):
+        zip_path = make_zip(self.path("payload.zip"), {'a.txt': b'a'})
+        self.assertEqual(main.load_zip_index(zip_path).files, ['a.txt'])
+        make_zip(zip_path, {'a.txt': b'a', 'b.txt': b'bb'})
+        self.assertEqual(main.load_zip_index(zip_path).files, ['a.txt', 'b.txt'])
+
+if __name__ == "__main__":
+    unittest.main()